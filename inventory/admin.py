@@ -1,9 +1,26 @@
 # inventory/admin.py
+from django.conf import settings
 from django.contrib import admin
-from .models import Supplier, Medicine, Customer, Invoice, InvoiceItem
+from .models import Supplier, Medicine, MedicineBarcode, Customer, Invoice, InvoiceItem
 
-admin.site.register(Supplier)
-admin.site.register(Medicine)
+admin.site.register(MedicineBarcode)
 admin.site.register(Customer)
 admin.site.register(Invoice)
-admin.site.register(InvoiceItem)
\ No newline at end of file
+admin.site.register(InvoiceItem)
+
+
+class CentralCatalogAdmin(admin.ModelAdmin):
+    # An offline store keeps the central ids of the catalog it pulls, so
+    # rows added here would collide with the central ones
+    def has_add_permission(self, request):
+        return not settings.OFFLINE_STORE and super().has_add_permission(request)
+
+
+admin.site.register(Supplier, CentralCatalogAdmin)
+
+
+@admin.register(Medicine)
+class MedicineAdmin(CentralCatalogAdmin):
+    # Stock only changes through sales, returns, receipts and imports, which
+    # record every change in the stock ledger
+    readonly_fields = ['in_stock_total']
@@ -0,0 +1,215 @@
+# inventory/autocomplete.py
+import bisect
+import logging
+import threading
+from decimal import Decimal
+
+from django.core.cache import cache, caches
+
+from .models import Customer, Medicine, normalize_name, prefix_filter
+
+logger = logging.getLogger(__name__)
+
+# Shared across processes when CACHES points at a shared backend; a catalog
+# change in one worker bumps it and the other workers rebuild on their next
+# lookup. Sales only update the stock in place, so they never bump it.
+VERSION_KEY = 'autocomplete:medicine:version'
+
+MAX_RESULTS = 20
+
+
+def _search_keys(name_normalized):
+    """
+    Every word start of a name, so "500" finds "paracetamol 500mg tablet".
+    """
+    words = name_normalized.split(' ')
+    return {' '.join(words[position:]) for position in range(len(words)) if words[position]}
+
+
+def _entry(medicine_id, name, mrp, stock):
+    return {'id': medicine_id, 'name': name, 'mrp': f'{Decimal(mrp):.2f}', 'stock': stock}
+
+
+class MedicinePrefixIndex:
+    """
+    Per-process sorted index of medicine names for the billing autocomplete.
+
+    Lookups are a binary search into a sorted list of (key, id) pairs, so
+    they never touch the database once the index is warm. Stock changes
+    made in this process are applied in place from the levels stock_changed
+    carries; other processes' sales show up at their next rebuild, and a
+    sale checks the stock itself in any case.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._entries = {}
+        self._version = None
+        self._loaded = False
+
+    def warm(self):
+        """
+        (Re)builds the index from the database in one query.
+        """
+        version = cache.get(VERSION_KEY)
+        rows = Medicine.objects.values_list('id', 'name', 'name_normalized', 'mrp', 'in_stock_total')
+        entries = {}
+        keys = []
+        for medicine_id, name, name_normalized, mrp, stock in rows.iterator(chunk_size=5000):
+            entries[medicine_id] = _entry(medicine_id, name, mrp, stock)
+            keys.extend((key, medicine_id) for key in _search_keys(name_normalized))
+        keys.sort()
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self._version = version
+            self._loaded = True
+
+    def _ensure_fresh(self):
+        if not self._loaded or cache.get(VERSION_KEY) != self._version:
+            self.warm()
+
+    def search(self, query, limit=10, in_stock_only=True):
+        """
+        Medicines with a word starting with `query`, with their stock.
+        """
+        self._ensure_fresh()
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+        limit = max(1, min(limit, MAX_RESULTS))
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect.bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, medicine_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                position += 1
+                entry = self._entries[medicine_id]
+                if medicine_id in seen or (in_stock_only and entry['stock'] <= 0):
+                    continue
+                seen.add(medicine_id)
+                results.append(dict(entry))
+        return results
+
+    def _drop_keys(self, medicine_id):
+        entry = self._entries.pop(medicine_id, None)
+        if entry is None:
+            return
+        for key in _search_keys(normalize_name(entry['name'])):
+            position = bisect.bisect_left(self._keys, (key, medicine_id))
+            if position < len(self._keys) and self._keys[position] == (key, medicine_id):
+                del self._keys[position]
+
+    def upsert(self, medicines):
+        """
+        Applies saved medicines to this process's index and tells the other
+        processes to rebuild theirs.
+        """
+        if not self._loaded:
+            bump_version()
+            return
+        with self._lock:
+            for medicine in medicines:
+                self._drop_keys(medicine.id)
+                self._entries[medicine.id] = _entry(medicine.id, medicine.name, medicine.mrp, medicine.in_stock_total)
+                for key in _search_keys(normalize_name(medicine.name)):
+                    bisect.insort(self._keys, (key, medicine.id))
+            self._advance_version()
+
+    def remove(self, medicine_ids):
+        if not self._loaded:
+            bump_version()
+            return
+        with self._lock:
+            for medicine_id in medicine_ids:
+                self._drop_keys(medicine_id)
+            self._advance_version()
+
+    def set_stock(self, levels):
+        """
+        Applies {medicine_id: stock} to this process's index. Stock is not
+        part of the shared version, so the other processes keep theirs.
+        """
+        with self._lock:
+            for medicine_id, stock in levels.items():
+                entry = self._entries.get(medicine_id)
+                if entry is not None:
+                    self._entries[medicine_id] = dict(entry, stock=stock)
+
+    def refresh_stock(self, medicine_ids):
+        """
+        Re-reads the stock of medicines changed without known levels.
+        """
+        if self._loaded:
+            self.set_stock(dict(Medicine.objects.filter(id__in=medicine_ids).values_list('id', 'in_stock_total')))
+
+    def _advance_version(self):
+        version = bump_version()
+        # If another process changed the catalog since our last rebuild, our
+        # copy is missing that change too: force a rebuild on the next lookup
+        self._version = version if version == (self._version or 0) + 1 else None
+
+    def invalidate(self):
+        """
+        Drops the index everywhere after bulk changes; it is rebuilt lazily.
+        """
+        with self._lock:
+            self._loaded = False
+        bump_version()
+
+
+def bump_version(using=None):
+    """
+    Makes every process sharing the cache (the `using` alias, or the default
+    cache) rebuild its index on the next lookup. Returns the new version.
+    """
+    store = caches[using] if using else cache
+    try:
+        return store.incr(VERSION_KEY)
+    except ValueError:
+        store.set(VERSION_KEY, 1, None)
+        return 1
+
+
+medicine_index = MedicinePrefixIndex()
+
+
+def warm_medicine_index():
+    """
+    Called at startup; a database that is not reachable yet only means the
+    index is built on the first lookup instead.
+    """
+    try:
+        medicine_index.warm()
+    except Exception:
+        logger.warning('Could not warm the medicine autocomplete index', exc_info=True)
+
+
+# --- Customers ---
+# Far too many walk-in customers to hold in memory, so customer lookups are
+# bounded range scans on the unique phone_number index or the
+# (is_active, name_normalized) index instead.
+
+CUSTOMER_FIELDS = ('id', 'name', 'phone_number', 'email', 'is_active')
+
+
+def search_customers(query, limit=10):
+    """
+    Active customers whose phone number (for a query of digits) or name
+    starts with `query`, at most `limit` of them, as dicts.
+    """
+    query = query.strip()
+    phone = query.replace(' ', '').replace('-', '')
+    limit = max(1, min(limit, MAX_RESULTS))
+    customers = Customer.objects.filter(is_active=True)
+    if phone.isdigit():
+        customers = customers.filter(prefix_filter('phone_number', phone)).order_by('phone_number')
+    else:
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+        customers = customers.filter(prefix_filter('name_normalized', prefix)).order_by('name_normalized')
+    return list(customers.values(*CUSTOMER_FIELDS)[:limit])
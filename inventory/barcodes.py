@@ -0,0 +1,60 @@
+# inventory/barcodes.py
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .models import MedicineBarcode, normalize_code
+
+VERSION_KEY = 'barcodes:version'
+
+# Codes kept per process; a store scans far fewer distinct codes in a day
+MAX_ENTRIES = 5000
+
+
+class BarcodeCache:
+    """
+    In-process LRU cache of code -> (medicine_id, medicine name), so a
+    repeated scan is a dict lookup instead of a query. Changes to codes or
+    medicines bump a version key in the shared cache, which makes every
+    process drop its copy on the next scan. Unknown codes are not cached.
+    """
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+
+    def lookup(self, code):
+        code = normalize_code(code)
+        if not code:
+            return None
+        version = cache.get(VERSION_KEY)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(code)
+            if entry is not None:
+                self._entries.move_to_end(code)
+                return entry
+
+        entry = MedicineBarcode.objects.filter(code=code).values_list('medicine_id', 'medicine__name').first()
+        if entry is None:
+            return None
+        with self._lock:
+            self._entries[code] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+
+
+barcode_cache = BarcodeCache()
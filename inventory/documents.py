@@ -0,0 +1,278 @@
+# inventory/documents.py
+import hashlib
+import json
+import os
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import InvoiceItem, ReturnInvoice, ReturnItem
+from .pdf import PAGE_HEIGHT, Document, fit_text
+
+# Bump when the layout changes so cached files are not served any more
+LAYOUT_VERSION = 1
+
+STORE_NAME = 'Medical Store'
+STORE_LINES = ['Bhopal, Madhya Pradesh', 'GSTIN: YOUR_GST_NUMBER_HERE']
+
+LEFT = 40
+RIGHT = 555
+TOP = PAGE_HEIGHT - 50
+BOTTOM = 70
+ROW = 16
+
+# (heading, x, align) for the line-item tables
+COLUMNS = [('#', LEFT + 4, 'left'), ('Medicine', LEFT + 30, 'left'), ('Qty', 380, 'right'),
+           ('Rate (Rs.)', 465, 'right'), ('Amount (Rs.)', RIGHT - 4, 'right')]
+
+
+def money(value):
+    return f'{Decimal(value):.2f}'
+
+
+def long_date(value):
+    value = timezone.localtime(value)
+    return f'{value:%B} {value.day}, {value.year}'
+
+
+# --- Document data ---
+# Everything a PDF shows is collected into a plain dict first. The dict is
+# both what gets rendered and what the cache key is a hash of, so any change
+# to an item, discount or return produces a different file.
+
+def invoice_data(invoice):
+    """
+    Collects what the invoice PDF shows. `invoice` should come with its
+    customer selected.
+    """
+    items = (
+        InvoiceItem.objects.filter(invoice=invoice).order_by('id')
+        .values_list('medicine__name', 'quantity', 'rate')
+    )
+    returns = (
+        ReturnInvoice.objects.filter(original_invoice=invoice).order_by('id')
+        .values_list('id', 'return_date', 'total_refund_amount')
+    )
+    customer = invoice.customer
+    return {
+        'id': invoice.id,
+        'date': long_date(invoice.invoice_date),
+        'customer': [customer.name, *(customer.address or '').splitlines(), f'Phone: {customer.phone_number}'],
+        'items': [[name, quantity, money(rate)] for name, quantity, rate in items],
+        'totals': {field: money(getattr(invoice, field)) for field in (
+            'sub_total', 'discount_percentage', 'discount_amount', 'taxable_total',
+            'cgst_percentage', 'cgst_amount', 'sgst_percentage', 'sgst_amount', 'grand_total',
+        )},
+        'returns': [[return_id, long_date(date), money(refund)] for return_id, date, refund in returns],
+    }
+
+
+def return_data(return_invoice):
+    """
+    Collects what the credit note PDF shows. `return_invoice` should come
+    with its original invoice and customer selected.
+    """
+    items = (
+        ReturnItem.objects.filter(return_invoice=return_invoice).order_by('id')
+        .values_list('medicine__name', 'quantity', 'rate')
+    )
+    invoice = return_invoice.original_invoice
+    return {
+        'id': return_invoice.id,
+        'date': long_date(return_invoice.return_date),
+        'invoice_id': invoice.id,
+        'customer': [invoice.customer.name, f'Phone: {invoice.customer.phone_number}'],
+        'items': [[name, quantity, money(rate)] for name, quantity, rate in items],
+        'total_refund_amount': money(return_invoice.total_refund_amount),
+    }
+
+
+def fingerprint(kind, data):
+    payload = json.dumps([LAYOUT_VERSION, kind, data], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+# --- Layout ---
+
+class _Layout:
+    """
+    Keeps track of the cursor and starts a new page (repeating the table
+    heading) when the next row would not fit.
+    """
+    def __init__(self, title, continued):
+        self.doc = Document(title)
+        self.continued = continued
+        self.y = TOP
+
+    def need(self, height, table=False):
+        if self.y - height >= BOTTOM:
+            return
+        self.doc.new_page()
+        self.y = TOP
+        self.doc.text(LEFT, self.y, self.continued, 10, 'bold')
+        self.y -= 2 * ROW
+        if table:
+            self.table_heading()
+
+    def table_heading(self):
+        self.doc.rect(LEFT, self.y - 5, RIGHT - LEFT, ROW + 2)
+        for heading, x, align in COLUMNS:
+            self.doc.text(x, self.y, heading, 9, 'bold', align)
+        self.y -= ROW + 2
+
+    def table(self, items):
+        self.need(3 * ROW)
+        self.table_heading()
+        for number, (name, quantity, rate) in enumerate(items, start=1):
+            self.need(ROW, table=True)
+            amount = money(Decimal(rate) * quantity)
+            name = fit_text(name, 380 - 40 - (LEFT + 30), 9)
+            for (_, x, align), value in zip(COLUMNS, [str(number), name, str(quantity), rate, amount]):
+                self.doc.text(x, self.y, value, 9, 'regular', align)
+            self.doc.line(LEFT, self.y - 5, RIGHT, self.y - 5, 0.3, 0.8)
+            self.y -= ROW
+        if not items:
+            self.doc.text((LEFT + RIGHT) / 2, self.y, 'No items.', 9, 'regular', 'center')
+            self.y -= ROW
+
+    def summary(self, rows):
+        """
+        Right-aligned label/value rows; a row's third element makes it bold.
+        """
+        self.need(len(rows) * ROW + ROW)
+        self.y -= ROW / 2
+        for label, value, *bold in rows:
+            font = 'bold' if bold else 'regular'
+            if bold:
+                self.doc.line(360, self.y + ROW - 4, RIGHT, self.y + ROW - 4, 0.8)
+            self.doc.text(460, self.y, label, 10, font, 'right')
+            self.doc.text(RIGHT - 4, self.y, value, 10, font, 'right')
+            self.y -= ROW
+
+    def header(self, heading, right_lines, left_heading, left_lines):
+        doc = self.doc
+        doc.text(LEFT, self.y, STORE_NAME, 18, 'bold')
+        doc.text(RIGHT, self.y, heading, 14, 'bold', 'right')
+        self.y -= 18
+        for index, line in enumerate(STORE_LINES):
+            doc.text(LEFT, self.y - index * 13, line, 10)
+        for index, line in enumerate(right_lines):
+            doc.text(RIGHT, self.y - index * 13, line, 10, 'regular', 'right')
+        self.y -= max(len(STORE_LINES), len(right_lines)) * 13 + 14
+        doc.text(LEFT, self.y, left_heading, 10, 'bold')
+        self.y -= 13
+        for line in left_lines:
+            if line:
+                doc.text(LEFT, self.y, fit_text(line, 300, 10), 10)
+                self.y -= 13
+        self.y -= ROW
+
+    def render(self):
+        pages = self.doc.pages
+        for number, ops in enumerate(pages, start=1):
+            self.doc.ops = ops
+            self.doc.text(RIGHT, BOTTOM - 30, f'Page {number} of {len(pages)}', 8, 'regular', 'right')
+        return self.doc.render()
+
+
+def render_invoice(data):
+    layout = _Layout(f'Invoice #{data["id"]}', f'Invoice #{data["id"]} (continued)')
+    layout.header(
+        'TAX INVOICE', [f'Invoice #{data["id"]}', f'Date: {data["date"]}'], 'Bill To:', data['customer'],
+    )
+    layout.table(data['items'])
+    totals = data['totals']
+    layout.summary([
+        ('Sub-Total:', totals['sub_total']),
+        (f'Discount ({totals["discount_percentage"]}%):', f'- {totals["discount_amount"]}'),
+        ('Taxable Value:', totals['taxable_total']),
+        (f'CGST ({totals["cgst_percentage"]}%):', f'+ {totals["cgst_amount"]}'),
+        (f'SGST ({totals["sgst_percentage"]}%):', f'+ {totals["sgst_amount"]}'),
+        ('Grand Total (Rs.):', totals['grand_total'], True),
+    ])
+    if data['returns']:
+        refunded = sum(Decimal(refund) for _, _, refund in data['returns'])
+        layout.summary(
+            [(f'Credit note #{return_id} ({date}):', f'- {refund}') for return_id, date, refund in data['returns']]
+            + [('Net after returns (Rs.):', money(Decimal(totals['grand_total']) - refunded), True)]
+        )
+    return layout.render()
+
+
+def render_return(data):
+    layout = _Layout(f'Credit Note #{data["id"]}', f'Credit Note #{data["id"]} (continued)')
+    layout.header(
+        'CREDIT NOTE',
+        [f'Credit Note #{data["id"]}', f'Date: {data["date"]}', f'Original Invoice #{data["invoice_id"]}'],
+        'Customer:', data['customer'],
+    )
+    layout.table(data['items'])
+    layout.summary([('Total Refund (Rs.):', data['total_refund_amount'], True)])
+    return layout.render()
+
+
+# --- Disk cache ---
+# Files are named <kind>-<id>-<fingerprint>.pdf. A changed invoice simply
+# gets a new name; older files for the same document are removed when the
+# new one is written, or straight away by discard().
+
+def cache_dir():
+    return Path(settings.INVOICE_PDF_CACHE_DIR)
+
+
+def _cached(kind, object_id, digest, render):
+    directory = cache_dir()
+    path = directory / f'{kind}-{object_id}-{digest}.pdf'
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    data = render()
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        # Written under a temporary name and renamed, so a concurrent
+        # request never reads a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+        discard(kind, object_id, keep=path.name)
+    except OSError:
+        # An unwritable cache only costs a re-render next time
+        pass
+    return data
+
+
+def discard(kind, object_id, keep=None):
+    """
+    Removes the cached files of one document.
+    """
+    for path in cache_dir().glob(f'{kind}-{object_id}-*.pdf'):
+        if path.name != keep:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def invoice_pdf(invoice):
+    """
+    Returns (pdf_bytes, fingerprint) for an invoice, rendering it only when
+    there is no cached file for its current contents.
+    """
+    data = invoice_data(invoice)
+    digest = fingerprint('invoice', data)
+    return _cached('invoice', invoice.id, digest, lambda: render_invoice(data)), digest
+
+
+def return_pdf(return_invoice):
+    """
+    Returns (pdf_bytes, fingerprint) for a credit note.
+    """
+    data = return_data(return_invoice)
+    digest = fingerprint('return', data)
+    return _cached('return', return_invoice.id, digest, lambda: render_return(data)), digest
@@ -0,0 +1,140 @@
+# inventory/exports.py
+import csv
+import json
+import zlib
+
+from django.db.models import Prefetch
+
+from .models import InvoiceItem
+
+# Invoices fetched per round-trip; each chunk costs one query for the
+# invoices and one for their items
+CHUNK_SIZE = 2000
+
+CSV_COLUMNS = [
+    'invoice_id', 'invoice_date', 'customer_id', 'customer_name', 'customer_phone',
+    'sub_total', 'discount_percentage', 'discount_amount', 'taxable_total',
+    'cgst_amount', 'sgst_amount', 'grand_total',
+    'item_id', 'medicine_id', 'medicine_name', 'quantity', 'rate', 'line_total',
+]
+
+# Spreadsheets run a cell starting with one of these as a formula, so text
+# typed in by users (customer and medicine names) could run on opening
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def with_items(invoices):
+    """
+    Adds what the export needs to an Invoice queryset and orders it stably.
+    """
+    return invoices.select_related('customer').prefetch_related(
+        Prefetch('items', queryset=InvoiceItem.objects.select_related('medicine').order_by('id'))
+    ).order_by('invoice_date', 'id')
+
+
+def _invoice_fields(invoice):
+    return [
+        invoice.id, invoice.invoice_date.isoformat(), invoice.customer_id,
+        invoice.customer.name, invoice.customer.phone_number,
+        invoice.sub_total, invoice.discount_percentage, invoice.discount_amount,
+        invoice.taxable_total, invoice.cgst_amount, invoice.sgst_amount, invoice.grand_total,
+    ]
+
+
+def _cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Line:
+    """
+    File-like object that hands back what csv.writer writes to it.
+    """
+    def write(self, value):
+        return value
+
+
+def _row(writer, values):
+    return writer.writerow([_cell(value) for value in values])
+
+
+def csv_lines(invoices):
+    """
+    Yields the export as CSV text, one row per invoice line. Invoices
+    without items get a single row with empty item columns.
+    """
+    writer = csv.writer(_Line())
+    yield writer.writerow(CSV_COLUMNS)
+    # Server-side cursor (on PostgreSQL) so only one chunk is in memory
+    for invoice in with_items(invoices).iterator(chunk_size=CHUNK_SIZE):
+        header = _invoice_fields(invoice)
+        items = invoice.items.all()
+        if not items:
+            yield _row(writer, header + [''] * 6)
+        for item in items:
+            yield _row(writer, header + [
+                item.id, item.medicine_id, item.medicine.name,
+                item.quantity, item.rate, item.quantity * item.rate,
+            ])
+
+
+def jsonl_lines(invoices):
+    """
+    Yields the export as JSON Lines, one invoice per line with its items nested.
+    """
+    keys = CSV_COLUMNS[:12]
+    for invoice in with_items(invoices).iterator(chunk_size=CHUNK_SIZE):
+        record = {key: value for key, value in zip(keys, _invoice_fields(invoice))}
+        record['items'] = [
+            {
+                'item_id': item.id,
+                'medicine_id': item.medicine_id,
+                'medicine_name': item.medicine.name,
+                'quantity': item.quantity,
+                'rate': str(item.rate),
+                'line_total': str(item.quantity * item.rate),
+            }
+            for item in invoice.items.all()
+        ]
+        yield json.dumps(record, default=str) + '\n'
+
+
+def encode(lines, buffer_size=64 * 1024):
+    """
+    Groups lines into ~64 KB byte chunks so the response is not written one
+    tiny row at a time.
+    """
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_stream(chunks, level=6):
+    """
+    Compresses a stream of byte strings into a gzip stream as it goes.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(invoices, export_format='csv', compress=False):
+    """
+    Returns an iterator of bytes for the given invoices.
+    """
+    lines = jsonl_lines(invoices) if export_format == 'jsonl' else csv_lines(invoices)
+    stream = encode(lines)
+    return gzip_stream(stream) if compress else stream
@@ -1,6 +1,9 @@
 from django import forms
 from .models import Customer
 
+# Most lines one API sale may have
+MAX_SALE_LINES = 200
+
 class CustomerForm(forms.ModelForm):
     class Meta:
         model = Customer
@@ -12,4 +15,43 @@ class CustomerForm(forms.ModelForm):
             # Add a widget for the new email field
             'email': forms.EmailInput(attrs={'class': 'form-control'}),
             'address': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
-        }
\ No newline at end of file
+        }
+
+class InvoiceFilterForm(forms.Form):
+    # Free-text box: "123" or "#123" finds an invoice number, anything else a customer
+    q = forms.CharField(required=False)
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    # Phone number prefix or customer name prefix
+    customer = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Phone or name'}))
+    min_total = forms.DecimalField(required=False, min_value=0, decimal_places=2, widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}))
+    max_total = forms.DecimalField(required=False, min_value=0, decimal_places=2, widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}))
+
+class SaleForm(forms.Form):
+    """
+    Validates the JSON body of the POS API: a customer, an optional discount
+    and a list of {"medicine": id, "quantity": n} lines.
+    """
+    customer = forms.ModelChoiceField(queryset=Customer.objects.filter(is_active=True))
+    discount = forms.DecimalField(required=False, min_value=0, max_value=100, decimal_places=2)
+    lines = forms.JSONField()
+
+    def clean_lines(self):
+        lines = self.cleaned_data['lines']
+        if not isinstance(lines, list) or not lines:
+            raise forms.ValidationError('Send a non-empty list of lines.')
+        if len(lines) > MAX_SALE_LINES:
+            raise forms.ValidationError(f'At most {MAX_SALE_LINES} lines per sale.')
+        # {medicine_id: quantity}, in the order the lines were sent; a
+        # medicine sent twice becomes one line
+        quantities = {}
+        for number, line in enumerate(lines, start=1):
+            try:
+                medicine_id = int(line['medicine'])
+                quantity = int(line['quantity'])
+            except (KeyError, TypeError, ValueError):
+                raise forms.ValidationError(f'Line {number} needs an integer medicine and quantity.')
+            if quantity <= 0:
+                raise forms.ValidationError(f'Line {number}: quantity must be at least 1.')
+            quantities[medicine_id] = quantities.get(medicine_id, 0) + quantity
+        return quantities
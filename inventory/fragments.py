@@ -0,0 +1,111 @@
+# inventory/fragments.py
+import hashlib
+import re
+import time
+
+from django.core.cache import caches
+from django.template.loader import get_template
+
+from .metrics import registry
+from .models import Medicine
+
+# Rendered HTML fragments of the list pages, cached in the 'fragments' cache.
+#
+# Every model a fragment shows has a version number, and the fragment's key
+# includes the versions of its models. Signals bump a model's version when
+# one of its rows changes, so the old fragments are never looked up again
+# and simply age out of the cache; nothing has to be deleted.
+
+CACHE_ALIAS = 'fragments'
+
+# What {% csrf_token %} renders inside a cached fragment; swapped for the
+# real token on every request, since tokens differ between sessions
+CSRF_PLACEHOLDER = 'csrf-token-placeholder'
+
+# What {% live_stock %} renders inside a cached fragment; filled in with the
+# medicine's current stock whenever the fragment is served, so a sale does
+# not make the whole list render again
+LIVE_STOCK = re.compile(r'live-stock:(badge|count):(\d+);')
+
+
+def fragment_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(model):
+    return f'fragments:version:{model}'
+
+
+def versions(models):
+    """
+    Returns the current version of each model name. A version that is not in
+    the cache (never set, or evicted) starts at the current time in ms, so it
+    can never match a version that fragments were stored under before.
+    """
+    cache = fragment_cache()
+    keys = [_version_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*models, using=CACHE_ALIAS):
+    cache = caches[using]
+    for model in models:
+        try:
+            cache.incr(_version_key(model))
+        except ValueError:
+            cache.add(_version_key(model), int(time.time() * 1000), timeout=None)
+
+
+def fragment_key(name, models, vary_on):
+    vary = hashlib.md5(repr([str(value) for value in vary_on]).encode()).hexdigest()
+    version = '.'.join(str(number) for number in versions(models))
+    return f'fragment:{name}:{version}:{vary}'
+
+
+def get_or_render(name, models, vary_on, render):
+    """
+    Returns the cached HTML of a fragment, calling render() to build and
+    store it on a miss. Hits and misses are counted in /metrics.
+    """
+    cache = fragment_cache()
+    key = fragment_key(name, models, vary_on)
+    html = cache.get(key)
+    if html is None:
+        registry.inc('fragment_cache_requests_total', (('fragment', name), ('result', 'miss')))
+        html = render()
+        cache.set(key, html)
+    else:
+        registry.inc('fragment_cache_requests_total', (('fragment', name), ('result', 'hit')))
+    return html
+
+
+def live_stock_marker(medicine_id, part):
+    return f'live-stock:{part}:{medicine_id};'
+
+
+def fill_live_stock(html, known=None):
+    """
+    Replaces the stock markers of a fragment with the current stock. Levels
+    not in `known` ({medicine_id: stock}, from a render that just happened)
+    are read in one query by primary key.
+    """
+    medicine_ids = {int(medicine_id) for _, medicine_id in LIVE_STOCK.findall(html)}
+    if not medicine_ids:
+        return html
+    stock = dict(known or {})
+    missing = medicine_ids - stock.keys()
+    if missing:
+        stock.update(Medicine.objects.filter(id__in=missing).values_list('id', 'in_stock_total'))
+    badge = get_template('inventory/stock_badge.html')
+
+    def replace(match):
+        part, medicine_id = match.groups()
+        level = stock.get(int(medicine_id), 0)
+        return str(level) if part == 'count' else badge.render({'stock': level})
+
+    return LIVE_STOCK.sub(replace, html)
@@ -0,0 +1,129 @@
+# inventory/history.py
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, IntegerField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Customer, Invoice, InvoiceItem, ReturnInvoice, ReturnItem
+
+# Purchase summaries of one customer, cached per customer.
+#
+# Every customer has a version number in the cache and their summary is
+# stored under it. Signals bump the version when one of the customer's
+# invoices or returns changes, so a summary computed from data read before
+# the change can never be served after it.
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+TOP_MEDICINES = 5
+
+# Summaries of customers who stop coming age out
+TIMEOUT = 7 * 24 * 60 * 60
+
+
+def _version_key(customer_id):
+    return f'customer_history:version:{customer_id}'
+
+
+def _version(customer_id):
+    key = _version_key(customer_id)
+    version = cache.get(key)
+    if version is None:
+        # Starts at the current time in ms, so an evicted version can never
+        # come back as one that summaries were stored under before
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(customer_id):
+    try:
+        cache.incr(_version_key(customer_id))
+    except ValueError:
+        cache.add(_version_key(customer_id), int(time.time() * 1000), timeout=None)
+
+
+def invalidate_for_invoice(invoice_id):
+    customer_id = Invoice.objects.filter(id=invoice_id).values_list('customer_id', flat=True).first()
+    if customer_id is not None:
+        invalidate(customer_id)
+
+
+def _per_customer(queryset, customer_field, aggregate):
+    """
+    A scalar subquery of `aggregate` over the rows of `queryset` that belong
+    to the outer customer.
+    """
+    return Subquery(
+        queryset.filter(**{customer_field: OuterRef('pk')})
+        .order_by()
+        .values(customer_field)
+        .annotate(value=aggregate)
+        .values('value')
+    )
+
+
+def compute_summary(customer_id):
+    """
+    Reads a customer's lifetime figures in one query (each figure is a
+    correlated subquery served by the invoice_customer_date_idx index) and
+    their most bought medicines, net of returns, in a second one.
+    """
+    zero = Value(0, output_field=MONEY)
+    totals = Customer.objects.filter(pk=customer_id).annotate(
+        spent=Coalesce(_per_customer(Invoice.objects, 'customer', Sum('grand_total')), zero, output_field=MONEY),
+        refunded=Coalesce(
+            _per_customer(ReturnInvoice.objects, 'original_invoice__customer', Sum('total_refund_amount')),
+            zero, output_field=MONEY,
+        ),
+        visits=Coalesce(_per_customer(Invoice.objects, 'customer', Count('id')), 0, output_field=IntegerField()),
+        first_visit=_per_customer(Invoice.objects, 'customer', Min('invoice_date')),
+        last_visit=_per_customer(Invoice.objects, 'customer', Max('invoice_date')),
+        returns=Coalesce(
+            _per_customer(ReturnInvoice.objects, 'original_invoice__customer', Count('id')), 0,
+            output_field=IntegerField(),
+        ),
+    ).values('spent', 'refunded', 'visits', 'first_visit', 'last_visit', 'returns').first()
+    if totals is None:
+        return None
+
+    returned = Subquery(
+        ReturnItem.objects.filter(
+            return_invoice__original_invoice__customer=customer_id, medicine=OuterRef('medicine')
+        ).order_by().values('medicine').annotate(quantity=Sum('quantity')).values('quantity')
+    )
+    top = (
+        InvoiceItem.objects.filter(invoice__customer=customer_id)
+        .values('medicine', 'medicine__name')
+        .annotate(bought=Sum('quantity'))
+        .annotate(returned=Coalesce(returned, 0, output_field=IntegerField()))
+        .annotate(kept=F('bought') - F('returned'))
+        .order_by('-kept', 'medicine')[:TOP_MEDICINES]
+    )
+    totals['net_spent'] = totals['spent'] - totals['refunded']
+    totals['top_medicines'] = [
+        {
+            'id': row['medicine'],
+            'name': row['medicine__name'],
+            'bought': row['bought'],
+            'returned': row['returned'],
+            'kept': row['kept'],
+        }
+        for row in top
+    ]
+    return totals
+
+
+def customer_summary(customer_id):
+    """
+    Returns the cached summary of a customer, computing it on a miss. None
+    if there is no such customer.
+    """
+    key = f'customer_history:{customer_id}:{_version(customer_id)}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_summary(customer_id)
+        if summary is not None:
+            cache.set(key, summary, TIMEOUT)
+    return summary
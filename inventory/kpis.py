@@ -0,0 +1,134 @@
+# inventory/kpis.py
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Customer, Invoice, Medicine, Supplier
+
+MEDICINES = 'kpi:medicines'
+CUSTOMERS = 'kpi:active_customers'
+SUPPLIERS = 'kpi:suppliers'
+LOW_STOCK = 'kpi:low_stock'
+
+DAILY_TIMEOUT = 2 * 24 * 60 * 60
+
+
+def sales_key(day):
+    # Stored in paise so it can be adjusted with cache.incr()
+    return f'kpi:sales_paise:{day.isoformat()}'
+
+
+def invoices_key(day):
+    return f'kpi:invoices:{day.isoformat()}'
+
+
+def low_stock_threshold():
+    return getattr(settings, 'LOW_STOCK_THRESHOLD', 10)
+
+
+def low_stock_delta(levels):
+    """
+    How much the low stock count changes when medicines go from one stock
+    level to another, given (before, after) pairs.
+    """
+    threshold = low_stock_threshold()
+    return sum((after <= threshold) - (before <= threshold) for before, after in levels)
+
+
+def day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def compute(keys, day):
+    """
+    Recomputes counters from the database. Only runs for cache misses.
+    """
+    values = {}
+    if MEDICINES in keys:
+        values[MEDICINES] = Medicine.objects.count()
+    if CUSTOMERS in keys:
+        values[CUSTOMERS] = Customer.objects.filter(is_active=True).count()
+    if SUPPLIERS in keys:
+        values[SUPPLIERS] = Supplier.objects.count()
+    if LOW_STOCK in keys:
+        values[LOW_STOCK] = Medicine.objects.filter(in_stock_total__lte=low_stock_threshold()).count()
+    if sales_key(day) in keys or invoices_key(day) in keys:
+        # One range scan on the invoice_date index covers both daily figures
+        start, end = day_range(day)
+        totals = Invoice.objects.filter(invoice_date__gte=start, invoice_date__lt=end).aggregate(
+            sales=Sum('grand_total'), invoices=Count('id')
+        )
+        values[sales_key(day)] = int((totals['sales'] or Decimal('0')) * 100)
+        values[invoices_key(day)] = totals['invoices']
+    return values
+
+
+def store(values, day):
+    daily = {sales_key(day), invoices_key(day)}
+    # Counters are adjusted in the cache of the worker that made the change.
+    # settings.KPI_CACHE_TIMEOUT bounds how long other workers keep theirs
+    # when the cache is not shared; daily counters age out regardless.
+    timeout = getattr(settings, 'KPI_CACHE_TIMEOUT', None)
+    cache.set_many({k: v for k, v in values.items() if k not in daily}, timeout=timeout)
+    cache.set_many(
+        {k: v for k, v in values.items() if k in daily},
+        timeout=DAILY_TIMEOUT if timeout is None else min(timeout, DAILY_TIMEOUT),
+    )
+
+
+def dashboard_kpis(day=None):
+    """
+    Returns the dashboard numbers, reading the database only for counters
+    that are missing from the cache.
+    """
+    day = day or timezone.localdate()
+    keys = [MEDICINES, CUSTOMERS, SUPPLIERS, LOW_STOCK, sales_key(day), invoices_key(day)]
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        computed = compute(missing, day)
+        store(computed, day)
+        values.update(computed)
+    return {
+        'total_medicines': values[MEDICINES],
+        'total_customers': values[CUSTOMERS],
+        'total_suppliers': values[SUPPLIERS],
+        'low_stock_count': values[LOW_STOCK],
+        'low_stock_threshold': low_stock_threshold(),
+        'sales_today': Decimal(values[sales_key(day)]) / 100,
+        'invoices_today': values[invoices_key(day)],
+    }
+
+
+def adjust(key, delta):
+    """
+    Applies a known change to a cached counter. A counter that is not cached
+    is left alone; it is recomputed on the next read.
+    """
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        pass
+
+
+def invalidate(*keys, using=None):
+    # `using` names another cache alias, e.g. the central site's
+    (caches[using] if using else cache).delete_many(keys)
+
+
+def rebuild(day=None):
+    """
+    Recomputes every counter from the database and stores it.
+    """
+    day = day or timezone.localdate()
+    keys = [MEDICINES, CUSTOMERS, SUPPLIERS, LOW_STOCK, sales_key(day), invoices_key(day)]
+    values = compute(keys, day)
+    store(values, day)
+    return values
@@ -0,0 +1,87 @@
+# inventory/ledger.py
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Medicine, StockMovement, StockSnapshot
+
+# Stock at any moment is the latest snapshot taken at or before it plus the
+# movements recorded since, so a query reads one snapshot set and a short
+# stretch of the ledger instead of replaying all history.
+
+# A movement's created_at is set before its transaction commits, so a
+# snapshot of the current moment could miss a movement dated just before it
+# that commits just after, and later lookups only replay what is newer than
+# the snapshot. Snapshots are therefore only taken this far in the past,
+# longer than any sale, return or import batch takes to commit.
+SNAPSHOT_MARGIN = timedelta(minutes=15)
+
+
+def latest_snapshot_allowed():
+    return timezone.now() - SNAPSHOT_MARGIN
+
+
+def latest_snapshot_time(when):
+    return StockSnapshot.objects.filter(taken_at__lte=when).aggregate(taken_at=Max('taken_at'))['taken_at']
+
+
+def stock_at(when, medicine_ids=None):
+    """
+    Returns {medicine_id: quantity} as of `when` for every medicine that had
+    stock then (or the given ones). Medicines with no stock are left out.
+    """
+    snapshot_time = latest_snapshot_time(when)
+    snapshots = StockSnapshot.objects.filter(taken_at=snapshot_time)
+    movements = StockMovement.objects.filter(created_at__lte=when)
+    if snapshot_time is not None:
+        movements = movements.filter(created_at__gt=snapshot_time)
+    if medicine_ids is not None:
+        snapshots = snapshots.filter(medicine_id__in=medicine_ids)
+        movements = movements.filter(medicine_id__in=medicine_ids)
+
+    stock = dict(snapshots.values_list('medicine_id', 'quantity')) if snapshot_time else {}
+    for medicine_id, change in movements.values('medicine_id').annotate(change=Sum('quantity')).values_list(
+        'medicine_id', 'change'
+    ):
+        stock[medicine_id] = stock.get(medicine_id, 0) + change
+    return {medicine_id: quantity for medicine_id, quantity in stock.items() if quantity}
+
+
+def take_snapshot(at=None):
+    """
+    Stores the stock of every medicine as of `at` (default: SNAPSHOT_MARGIN
+    ago), computed from the previous snapshot and the ledger. Taking a
+    snapshot at the same time again replaces it. Returns the number of rows
+    written.
+    """
+    at = at or latest_snapshot_allowed()
+    if at > latest_snapshot_allowed():
+        raise ValueError(f'Snapshots must be at least {SNAPSHOT_MARGIN} old, so every movement before them committed')
+    stock = stock_at(at)
+    with transaction.atomic():
+        StockSnapshot.objects.filter(taken_at=at).delete()
+        StockSnapshot.objects.bulk_create(
+            [
+                StockSnapshot(medicine_id=medicine_id, taken_at=at, quantity=quantity)
+                for medicine_id, quantity in stock.items()
+            ],
+            batch_size=1000,
+        )
+    return len(stock)
+
+
+def ledger_mismatches():
+    """
+    Medicines whose in_stock_total differs from the sum of their ledger,
+    found with one grouped query over the whole catalog. Each row has
+    id, name, in_stock_total and ledger_total.
+    """
+    return (
+        Medicine.objects.annotate(ledger_total=Coalesce(Sum('movements__quantity'), Value(0)))
+        .exclude(in_stock_total=F('ledger_total'))
+        .order_by('id')
+        .values('id', 'name', 'in_stock_total', 'ledger_total')
+    )
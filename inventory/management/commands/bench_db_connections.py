@@ -0,0 +1,195 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# Runs in a fresh process per connection mode: loads the WSGI application and
+# sends it requests from several threads, the way a threaded gunicorn worker
+# would. Requests go through the WSGI handler, so connections are opened and
+# closed exactly as they are when serving.
+CHILD = r'''
+import json, os, sys, threading, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_store.settings')
+module_name, attribute = sys.argv[1].rsplit('.', 1)
+application = getattr(__import__(module_name, fromlist=[attribute]), attribute)
+
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+path, _, query = sys.argv[2].partition('?')
+threads, requests = int(sys.argv[3]), int(sys.argv[4])
+opened = []
+connection_created.connect(lambda sender, connection, **kwargs: opened.append(1), weak=False)
+latencies, errors = [], []
+
+def call():
+    environ = {
+        'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': '127.0.0.1', 'SERVER_NAME': '127.0.0.1',
+        'wsgi.input': BytesIO(),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        # Sends request_finished, which closes or keeps the connection
+        response.close()
+    return statuses[0]
+
+def worker():
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            status = call()
+            if not status.startswith('200'):
+                errors.append(status)
+        except Exception as exc:
+            errors.append(f'{type(exc).__name__}: {exc}')
+        latencies.append((time.perf_counter() - start) * 1000)
+
+call()
+workers = [threading.Thread(target=worker) for _ in range(threads)]
+start = time.perf_counter()
+for thread in workers:
+    thread.start()
+for thread in workers:
+    thread.join()
+elapsed = time.perf_counter() - start
+
+latencies.sort()
+pool = getattr(connections['default'], 'pool', None)
+print(json.dumps({
+    'requests': len(latencies),
+    'seconds': elapsed,
+    'requests_per_second': len(latencies) / elapsed,
+    'p50_ms': latencies[len(latencies) // 2],
+    'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    'errors': len(errors),
+    'first_error': errors[0] if errors else None,
+    # With a pool, connection_created fires on every checkout; the pool
+    # counts the connections it really opened
+    'connections_opened': pool.get_stats().get('connections_num', 0) if pool else len(opened),
+}), flush=True)
+# Stay alive, holding whatever connections are still open, until the parent
+# has counted them
+sys.stdin.readline()
+'''
+
+# libpq reads PGAPPNAME, so the child's connections can be told apart from
+# everyone else's
+APPLICATION_NAME = 'bench_db_connections'
+
+COUNT_CONNECTIONS = 'SELECT count(*) FROM pg_stat_activity WHERE application_name = %s'
+
+
+class Command(BaseCommand):
+    help = (
+        'Loads the application with concurrent requests once per DB_CONNECTION_MODE and reports requests per '
+        'second, latency, the connections each mode opened, the most the server saw at once, and how many were '
+        'still open when the load stopped. Needs a PostgreSQL DATABASE_URL; the pool mode also needs '
+        'psycopg 3 (pip install -r requirements-pool.txt).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes', nargs='+', choices=settings.DB_CONNECTION_MODES, default=list(settings.DB_CONNECTION_MODES),
+            help='Connection modes to compare.',
+        )
+        parser.add_argument(
+            '--path', default='/api/customers/autocomplete/?q=9', help='URL to request (default: a one-query view).'
+        )
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent request threads.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per thread.')
+        parser.add_argument('--interval', type=float, default=0.02, help='Seconds between connection counts.')
+        parser.add_argument('-o', '--output', help='Also write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Connection counts come from pg_stat_activity: point DATABASE_URL at PostgreSQL.')
+
+        results = {}
+        for mode in options['modes']:
+            results[mode] = self.bench_mode(mode, options)
+            result = results[mode]
+            self.stdout.write(
+                f"{mode:<12} {result['requests_per_second']:>8.1f} req/s  p50 {result['p50_ms']:>7.2f} ms  "
+                f"p95 {result['p95_ms']:>7.2f} ms  opened {result['connections_opened']:>5}  "
+                f"peak {result['peak_connections']:>3}  left open {result['open_after']:>3}  "
+                f"errors {result['errors']}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump({
+                    'path': options['path'],
+                    'threads': options['threads'],
+                    'requests_per_thread': options['requests'],
+                    'modes': results,
+                }, handle, indent=2)
+                handle.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def count_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute(COUNT_CONNECTIONS, [APPLICATION_NAME])
+            return cursor.fetchone()[0]
+
+    def bench_mode(self, mode, options):
+        """
+        Runs the load in a child process with DB_CONNECTION_MODE=mode while
+        sampling how many connections it has open on the server.
+        """
+        env = dict(os.environ, DB_CONNECTION_MODE=mode, PGAPPNAME=APPLICATION_NAME)
+        command = [
+            sys.executable, '-c', CHILD, settings.WSGI_APPLICATION, options['path'],
+            str(options['threads']), str(options['requests']),
+        ]
+        # Errors are logged with tracebacks, so stderr goes to a file rather
+        # than a pipe nobody reads until the end
+        errors = tempfile.TemporaryFile(mode='w+')
+        child = subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=errors, text=True,
+        )
+
+        samples = []
+        done = threading.Event()
+
+        def sample():
+            # On its own connection: the main thread's may not be shared
+            try:
+                while not done.is_set():
+                    samples.append(self.count_connections())
+                    time.sleep(options['interval'])
+            finally:
+                connection.close()
+
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        try:
+            line = child.stdout.readline()
+        finally:
+            done.set()
+            sampler.join()
+        if not line:
+            child.kill()
+            errors.seek(0)
+            raise CommandError(f'The {mode} run failed:\n{errors.read()[-2000:]}')
+        errors.close()
+        result = json.loads(line)
+        # Counted while the child is still alive but idle, as a warm
+        # function instance or a worker between requests would be
+        result['open_after'] = self.count_connections()
+        child.communicate('\n')
+        result['peak_connections'] = max(samples + [result['open_after']])
+        return result
@@ -0,0 +1,70 @@
+import csv
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Generates CSV price lists of growing size and times import_catalog on them (all data is rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--suppliers', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--trace-memory', action='store_true',
+            help='Report peak Python allocations (tracemalloc slows the import down considerably).',
+        )
+
+    def handle(self, *args, **options):
+        trace = options['trace_memory']
+        self.stdout.write(f"{'rows':>8} {'seconds':>9} {'rows/s':>9} {'peak MB' if trace else '':>9}")
+        with tempfile.TemporaryDirectory() as directory:
+            for rows in options['rows']:
+                path = os.path.join(directory, f'catalog-{rows}.csv')
+                self.generate(path, rows, options['suppliers'])
+                elapsed, peak = self.run_import(path, options['batch_size'], trace)
+                memory = f'{peak / 1e6:>9.1f}' if trace else ''
+                self.stdout.write(f'{rows:>8} {elapsed:>9.2f} {rows / elapsed:>9.0f} {memory}')
+
+    def generate(self, path, rows, suppliers):
+        rng = random.Random(rows)
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['name', 'supplier', 'mrp', 'in_stock_total', 'description'])
+            for number in range(rows):
+                writer.writerow([
+                    f'Generic Medicine {number} {rng.choice(["Tablet", "Syrup", "Capsule"])}',
+                    f'Distributor {number % suppliers}',
+                    f'{rng.randint(100, 99999) / 100:.2f}',
+                    rng.randint(0, 500),
+                    '',
+                ])
+
+    def run_import(self, path, batch_size, trace):
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                call_command('import_catalog', path, batch_size=batch_size, stdout=StringIO(), stderr=StringIO())
+                elapsed = time.perf_counter() - start
+                raise _Rollback
+        except _Rollback:
+            pass
+        peak = 0
+        if trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return elapsed, peak
@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.models import Medicine, Supplier, normalize_name, prefix_filter
+from inventory.pagination import encode_cursor, keyset_paginate
+
+PREFIXES = ['para', 'amo', 'cet', 'azi', 'met', 'pan', 'ome', 'dol', 'ibu', 'lev']
+SUFFIXES = ['cetamol', 'xicillin', 'irizine', 'thromycin', 'formin', 'toprazole', 'prazole', 'o', 'profen', 'ocetirizine']
+FORMS = ['Tablet', 'Capsule', 'Syrup', 'Drops', 'Injection']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks medicine_list search and keyset pagination at growing catalog sizes (all data is rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 40000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(42)
+        supplier = Supplier.objects.create(
+            name='Bench Supplier', contact_person='Bench', phone_number='0000000000', address='-'
+        )
+        page_size = options['page_size']
+        created = 0
+
+        self.stdout.write(f"{'rows':>8} {'first page':>12} {'prefix':>12} {'deep page':>12} {'icontains':>12}  (median ms)")
+        for size in sorted(options['sizes']):
+            batch = []
+            while created < size:
+                name = f"{rng.choice(PREFIXES)}{rng.choice(SUFFIXES)} {rng.randint(5, 1000)}mg {rng.choice(FORMS)} {created}"
+                batch.append(Medicine(
+                    name=name,
+                    name_normalized=normalize_name(name),
+                    description='',
+                    supplier=supplier,
+                    in_stock_total=rng.randint(0, 500),
+                    mrp=rng.randint(100, 50000) / 100,
+                ))
+                created += 1
+            Medicine.objects.bulk_create(batch, batch_size=2000)
+
+            base = Medicine.objects.select_related('supplier')
+            middle = base.order_by('name_normalized', 'id')[size // 2]
+            deep_cursor = encode_cursor([middle.name_normalized, middle.id])
+
+            timings = {
+                'first': lambda: list(keyset_paginate(base, ['name_normalized', 'id'], page_size=page_size)),
+                'prefix': lambda: list(keyset_paginate(
+                    base.filter(prefix_filter('name_normalized', 'parac')), ['name_normalized', 'id'], page_size=page_size)),
+                'deep': lambda: list(keyset_paginate(
+                    base, ['name_normalized', 'id'], cursor=deep_cursor, page_size=page_size)),
+                # The old implementation, for comparison
+                'icontains': lambda: list(base.filter(name__icontains='cetamol')),
+            }
+            results = {key: self.measure(fn, options['repeat']) for key, fn in timings.items()}
+            self.stdout.write(
+                f"{size:>8} {results['first']:>12.2f} {results['prefix']:>12.2f} "
+                f"{results['deep']:>12.2f} {results['icontains']:>12.2f}"
+            )
+
+    def measure(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,147 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs as the offline store: pulls the catalog, bills with the tuned SQLite
+# settings and again with SQLite's defaults, then pushes everything to the
+# central database and pushes it a second time as if the positions had been
+# lost.
+CHILD = r'''
+import json, os, random, statistics, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_store.settings')
+import django
+django.setup()
+from django.core.management import call_command
+from django.db import connection
+from inventory import sync
+from inventory.ledger import ledger_mismatches
+from inventory.models import Customer, Invoice, Medicine, StockMovement, SyncState
+from inventory.stock import create_sale
+
+sales, lines, batch_size = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+results = {}
+call_command('migrate', verbosity=0)
+
+start = time.perf_counter()
+results['pulled'] = sync.pull(batch_size)
+results['pull_s'] = time.perf_counter() - start
+
+rng = random.Random(0)
+customers = list(Customer.objects.values_list('id', flat=True))
+medicines = list(Medicine.objects.order_by('-in_stock_total').values_list('id', flat=True)[:200])
+
+def bill():
+    samples = []
+    start = time.perf_counter()
+    for _ in range(sales):
+        quantities = {medicine_id: 1 for medicine_id in rng.sample(medicines, lines)}
+        sale_start = time.perf_counter()
+        create_sale(rng.choice(customers), quantities)
+        samples.append((time.perf_counter() - sale_start) * 1000)
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    return {
+        'sales_per_second': sales / elapsed,
+        'p50_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+results['billing_tuned'] = bill()
+with connection.cursor() as cursor:
+    for pragma in ('journal_mode=DELETE', 'synchronous=FULL', 'mmap_size=0', 'temp_store=DEFAULT', 'cache_size=-2000'):
+        cursor.execute(f'PRAGMA {pragma}')
+results['billing_sqlite_defaults'] = bill()
+# Reconnecting applies the tuned settings again
+connection.close()
+
+results['pending'] = sync.pending()
+central_before = Invoice.objects.using('central').count()
+start = time.perf_counter()
+results['pushed'] = sync.push(batch_size)
+results['oversold_units'] = sum(results['pushed'].pop('oversold').values())
+results['push_s'] = time.perf_counter() - start
+results['push_rows_per_second'] = sum(results['pushed'].values()) / results['push_s']
+
+SyncState.objects.all().delete()
+counts = Invoice.objects.using('central').count(), StockMovement.objects.using('central').count()
+start = time.perf_counter()
+sync.push(batch_size)
+results['resend_s'] = time.perf_counter() - start
+results['resend_added_rows'] = (
+    Invoice.objects.using('central').count() + StockMovement.objects.using('central').count() - sum(counts)
+)
+results['central_invoices_added'] = counts[0] - central_before
+results['central_ledger_mismatches'] = ledger_mismatches().using('central').count()
+print(json.dumps(results, default=str))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures an offline store end to end: seeds a central database (a temporary SQLite file unless --central '
+        'is given), pulls it into a fresh offline store, times billing with the tuned SQLite settings and with '
+        "SQLite's defaults, and times pushing the bills to the central database and re-sending them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1, help='seed_bench scale of the central database.')
+        parser.add_argument('--sales', type=int, default=500, help='Bills per SQLite configuration.')
+        parser.add_argument('--lines', type=int, default=3, help='Lines per bill.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per central transaction.')
+        parser.add_argument(
+            '--central', help='Database URL of a scratch central database to seed instead of a temporary file.'
+        )
+        parser.add_argument('-o', '--output', help='Also write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            central = options['central'] or f'sqlite:///{os.path.join(directory, "central.sqlite3")}'
+            env = dict(os.environ, DATABASE_URL=central)
+            env.pop('OFFLINE_STORE', None)
+            manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+            for step in (['migrate', '-v0'], ['seed_bench', '--scale', str(options['scale'])]):
+                self.run(manage + step, env)
+
+            env.update(OFFLINE_STORE='1', OFFLINE_DB_PATH=os.path.join(directory, 'store.sqlite3'))
+            child = self.run(
+                [sys.executable, '-c', CHILD, str(options['sales']), str(options['lines']), str(options['batch_size'])],
+                env,
+            )
+        results = json.loads(child.stdout.strip().splitlines()[-1])
+
+        self.stdout.write(
+            f"Pulled {results['pulled']['medicines']} medicines and {results['pulled']['customers']} customers "
+            f"in {results['pull_s']:.2f}s"
+        )
+        for key, label in (('billing_tuned', 'tuned SQLite'), ('billing_sqlite_defaults', 'SQLite defaults')):
+            billing = results[key]
+            self.stdout.write(
+                f"Billing, {label:<16} {billing['sales_per_second']:>8.1f} bills/s  "
+                f"p50 {billing['p50_ms']:>6.2f} ms  p95 {billing['p95_ms']:>6.2f} ms"
+            )
+        rows = sum(results['pushed'].values())
+        self.stdout.write(
+            f"Pushed {rows} rows in {results['push_s']:.2f}s ({results['push_rows_per_second']:.0f} rows/s); "
+            f"re-sent in {results['resend_s']:.2f}s, adding {results['resend_added_rows']} rows"
+        )
+        self.stdout.write(
+            f"Central database: {results['central_invoices_added']} invoices added, "
+            f"{results['central_ledger_mismatches']} stock/ledger mismatches"
+        )
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump({key: options[key] for key in ('scale', 'sales', 'lines', 'batch_size')} | results, handle, indent=2)
+                handle.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def run(self, command, env):
+        child = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if child.returncode:
+            raise CommandError(f'{" ".join(command[1:3])} failed:\n{child.stderr[-2000:]}')
+        return child
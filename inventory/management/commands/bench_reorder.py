@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.reorder import ReorderSettings, forecast, load_demand, require_numpy
+from inventory.rollups import update_sales_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the reorder engine on the current database: loading demand from the sales rollup and the '
+        'forecast, separately and end to end. --skus also times the forecast alone on synthetic catalogs. '
+        'Needs NumPy: pip install -r requirements-tools.txt.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--update-rollups', action='store_true', help='Bring the sales rollup up to date first, and time it.'
+        )
+        parser.add_argument(
+            '--skus', type=int, nargs='*', default=[],
+            help='Synthetic catalog sizes to time the forecast on, without the database (e.g. 1000 10000 50000).',
+        )
+        parser.add_argument('--days', type=int, default=730, help='Days of history per synthetic SKU.')
+
+    def handle(self, *args, **options):
+        try:
+            np = require_numpy()
+        except ImportError as exc:
+            raise CommandError(str(exc))
+        settings = ReorderSettings()
+
+        if options['update_rollups']:
+            start = time.perf_counter()
+            update_sales_rollups()
+            self.stdout.write(f'Rollup update: {time.perf_counter() - start:.2f}s')
+
+        best = {'load': float('inf'), 'forecast': float('inf'), 'total': float('inf')}
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            medicine_ids, _, stock, demand = load_demand(settings.window)
+            loaded = time.perf_counter()
+            forecast(stock, demand, settings)
+            done = time.perf_counter()
+            best['load'] = min(best['load'], loaded - start)
+            best['forecast'] = min(best['forecast'], done - loaded)
+            best['total'] = min(best['total'], done - start)
+        skus = len(medicine_ids)
+        self.stdout.write(
+            f"Database: {skus} medicines x {settings.window} days, best of {options['repeat']}: "
+            f"load {best['load']:.3f}s, forecast {best['forecast']:.3f}s, total {best['total']:.3f}s "
+            f"({skus / best['total'] if best['total'] else 0:.0f} SKUs/s)"
+        )
+
+        if not options['skus']:
+            return
+        rng = np.random.default_rng(0)
+        days = options['days']
+        self.stdout.write(f"{'skus':>8} {'days':>6} {'best s':>8} {'SKUs/s':>10} {'reorders':>9}  (forecast only)")
+        for skus in options['skus']:
+            # Poisson daily sales around a per-SKU rate, with some SKUs idle
+            rates = rng.gamma(0.6, 3.0, size=(skus, 1))
+            demand = rng.poisson(rates, size=(skus, days)).astype(np.float32)
+            stock = rng.integers(0, 200, size=skus)
+            fastest = float('inf')
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                result = forecast(stock, demand, settings)
+                fastest = min(fastest, time.perf_counter() - start)
+            reorders = int((result['quantity'] > 0).sum())
+            self.stdout.write(f'{skus:>8} {days:>6} {fastest:>8.3f} {skus / fastest:>10.0f} {reorders:>9}')
@@ -0,0 +1,236 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import NoReverseMatch, get_resolver, reverse
+from django.utils import timezone
+
+from inventory import kpis
+from inventory.autocomplete import medicine_index
+from inventory.models import (
+    CustomOrder, Customer, Invoice, InvoiceItem, Medicine, MedicineBarcode, ReturnInvoice, ReturnItem, Supplier,
+)
+from inventory.seeding import seed, volumes
+
+POST_VIEWS = {
+    'add_invoice_item', 'apply_discount', 'add_stock', 'process_return', 'update_custom_order_status', 'scan_barcode',
+}
+
+JSON_VIEWS = {'api_create_invoice', 'api_find_or_create_customer'}
+
+COUNTED_MODELS = [Supplier, Medicine, Customer, Invoice, InvoiceItem, ReturnInvoice, ReturnItem, CustomOrder]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Times every view in inventory/urls.py through the test client at growing dataset sizes and writes '
+        'p50/p95 latency, query count and response size as JSON. Seeded rows and whatever the views write '
+        'are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', type=float, nargs='+', default=[1, 5], help='Dataset sizes, as seed_bench --scale values.'
+        )
+        parser.add_argument(
+            '--current', action='store_true', help='Benchmark the data already in the database, without seeding.'
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per view.')
+        parser.add_argument('--views', nargs='+', help='Only these URL names.')
+        parser.add_argument('-o', '--output', help='Write the JSON results to this file instead of stdout.')
+        parser.add_argument('--baseline', help='An earlier results file to compare p50 latencies with.')
+
+    def handle(self, *args, **options):
+        names = [pattern.name for pattern in get_resolver('inventory.urls').url_patterns]
+        unknown = set(options['views'] or []) - set(names)
+        if unknown:
+            raise CommandError(f'Unknown view(s): {", ".join(sorted(unknown))}')
+        self.names = options['views'] or names
+        self.repeat = options['repeat']
+        self.runs = []
+        started_at = timezone.now()
+
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory() as pdf_dir, override_settings(INVOICE_PDF_CACHE_DIR=pdf_dir):
+                self.bench_scales([None] if options['current'] else sorted(options['scales']))
+        finally:
+            teardown_test_environment()
+            # Counters and the search index may have been filled from data
+            # that was rolled back
+            medicine_index.invalidate()
+            kpis.rebuild()
+
+        results = {
+            'started_at': started_at.isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'repeat': self.repeat,
+            'runs': self.runs,
+        }
+        payload = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(payload + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+        else:
+            self.stdout.write(payload)
+        if options['baseline']:
+            self.compare(options['baseline'])
+
+    def bench_scales(self, scales):
+        try:
+            with transaction.atomic():
+                seeded = 0
+                for scale in scales:
+                    if scale is not None:
+                        # Each size adds to the rows of the previous one
+                        seed(volumes(scale - seeded), random_seed=int(scale * 1000))
+                        seeded = scale
+                    self.runs.append(self.bench_dataset(scale))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def bench_dataset(self, scale):
+        counts = {model._meta.model_name: model.objects.count() for model in COUNTED_MODELS}
+        self.stderr.write(f'Scale {scale or "current"}: ' + ', '.join(f'{n} {name}' for name, n in counts.items()))
+        views = {}
+        for name in self.names:
+            views[name] = self.bench_view(name)
+            result = views[name]
+            if 'p50_ms' in result:
+                self.stderr.write(
+                    f"  {name:<28} p50 {result['p50_ms']:>8.2f} ms  p95 {result['p95_ms']:>8.2f} ms  "
+                    f"{result['queries']:>4} queries  {result['bytes']:>9} bytes"
+                )
+            else:
+                self.stderr.write(f"  {name:<28} {result.get('error', 'skipped')}")
+        return {'scale': scale, 'counts': counts, 'views': views}
+
+    def bench_view(self, name):
+        try:
+            method, url, params = self.request_for(name)
+        except (LookupError, NoReverseMatch) as exc:
+            return {'error': f'no sample request: {exc}'}
+
+        client = Client()
+        if method == 'json':
+            def send(url, params):
+                return client.post(url, json.dumps(params), content_type='application/json')
+        else:
+            send = getattr(client, method)
+        samples = []
+        try:
+            # One untimed request first, so caches and the search index are warm
+            send(url, params)
+            for _ in range(self.repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = send(url, params)
+                    body = b''.join(response.streaming_content) if response.streaming else response.content
+                    samples.append((time.perf_counter() - start) * 1000)
+        except Exception as exc:
+            return {'error': f'{type(exc).__name__}: {exc}'}
+
+        samples.sort()
+        return {
+            'method': 'POST' if method == 'json' else method.upper(),
+            'status': response.status_code,
+            'p50_ms': round(statistics.median(samples), 3),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+            'queries': len(queries),
+            'bytes': len(body),
+        }
+
+    def request_for(self, name):
+        """
+        Returns (method, url, params) for one view, using recent rows as
+        the objects it works on.
+        """
+        invoice = Invoice.objects.filter(items__isnull=False).order_by('-id').first()
+        customer = Customer.objects.filter(is_active=True).order_by('id').first()
+        # Sold on every repetition, so take the best-stocked medicine
+        medicine = Medicine.objects.order_by('-in_stock_total').first()
+        return_invoice = ReturnInvoice.objects.order_by('-id').first()
+        objects = {
+            'edit_customer': customer,
+            'delete_customer': customer,
+            'reactivate_customer': customer,
+            # A customer with purchases
+            'customer_history': invoice.customer if invoice else None,
+            'invoice_detail': invoice,
+            'invoice_pdf': invoice,
+            'add_invoice_item': invoice,
+            'scan_barcode': invoice,
+            'apply_discount': invoice,
+            'process_return': invoice,
+            'send_invoice_email': invoice,
+            'add_stock': medicine,
+            'return_receipt_detail': return_invoice,
+            'return_pdf': return_invoice,
+            'update_custom_order_status': CustomOrder.objects.order_by('-id').first(),
+        }
+        if name in objects and objects[name] is None:
+            raise LookupError('no rows to use')
+
+        params = {}
+        if name == 'add_invoice_item':
+            params = {'medicine': medicine.id, 'quantity': 1}
+        elif name == 'scan_barcode':
+            barcode = MedicineBarcode.objects.order_by('-medicine__in_stock_total').first()
+            if barcode is None:
+                raise LookupError('no barcodes')
+            params = {'code': barcode.code}
+        elif name == 'apply_discount':
+            params = {'discount': '5'}
+        elif name == 'add_stock':
+            params = {'additional_stock': 5}
+        elif name == 'process_return':
+            params = {f'return_qty_{invoice.items.order_by("id").first().id}': 1}
+        elif name == 'update_custom_order_status':
+            params = {'status': 'Ordered'}
+        elif name in ('medicine_list', 'medicine_autocomplete'):
+            params = {'q': 'para'}
+        elif name == 'customer_autocomplete':
+            params = {'q': customer.phone_number[:4]}
+        elif name == 'api_find_or_create_customer':
+            params = {'phone_number': customer.phone_number}
+        elif name == 'api_create_invoice':
+            # A 15-line bill from the best-stocked medicines
+            lines = Medicine.objects.order_by('-in_stock_total').values_list('id', flat=True)[:15]
+            params = {'customer': customer.id, 'lines': [{'medicine': line, 'quantity': 1} for line in lines]}
+
+        method = 'json' if name in JSON_VIEWS else 'post' if name in POST_VIEWS else 'get'
+        args = [objects[name].id] if name in objects else []
+        return method, reverse(name, args=args), params
+
+    def compare(self, path):
+        try:
+            with open(path) as handle:
+                baseline = json.load(handle)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read {path}: {exc}')
+        previous = {run['scale']: run['views'] for run in baseline.get('runs', [])}
+        self.stdout.write(f"{'scale':>6} {'view':<28} {'before':>10} {'after':>10} {'change':>8}")
+        for run in self.runs:
+            for name, result in run['views'].items():
+                before = previous.get(run['scale'], {}).get(name, {}).get('p50_ms')
+                after = result.get('p50_ms')
+                if before and after:
+                    self.stdout.write(
+                        f"{run['scale'] or '-':>6} {name:<28} {before:>10.2f} {after:>10.2f} "
+                        f"{(after - before) / before:>+8.0%}"
+                    )
@@ -0,0 +1,49 @@
+import sys
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventory.exports import export_stream
+from inventory.kpis import day_range
+from inventory.models import Invoice
+
+
+class Command(BaseCommand):
+    help = 'Streams invoices and their items for a period to a file or stdout as CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First day to include (YYYY-MM-DD).')
+        parser.add_argument('--to', dest='date_to', help='Last day to include (YYYY-MM-DD).')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--output', '-o', help='File to write; defaults to stdout.')
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.all()
+        if options['date_from']:
+            invoices = invoices.filter(invoice_date__gte=day_range(self.parse(options['date_from']))[0])
+        if options['date_to']:
+            last_day = self.parse(options['date_to'])
+            invoices = invoices.filter(invoice_date__lt=day_range(last_day + timedelta(days=1))[0])
+
+        stream = export_stream(invoices, options['format'], options['gzip'])
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in stream:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+        if options['output']:
+            self.stderr.write(f'Wrote {written} bytes to {options["output"]}.')
+
+    def parse(self, value):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid date: {value}')
+        return day
@@ -0,0 +1,217 @@
+import csv
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from inventory.models import Medicine, MedicineBarcode, StockMovement, Supplier, normalize_code, normalize_name
+from inventory.signals import catalog_changed
+
+REQUIRED_COLUMNS = {'name', 'supplier', 'mrp'}
+
+
+class RowError(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams a CSV price list into the catalog. Suppliers are matched by name (and created '
+        'when missing); medicines are matched by supplier and name and inserted or updated in batches. '
+        'An optional barcodes column holds codes separated by "|"; a code already in use moves to this medicine.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk write and transaction.')
+        parser.add_argument('--add-stock', action='store_true', help='Add in_stock_total to existing stock instead of replacing it.')
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        if settings.OFFLINE_STORE:
+            # Pulled medicines keep their central ids; new ones here would collide
+            raise CommandError(
+                'This is an offline store: import the catalog on the central database, then run sync_central --pull.'
+            )
+        self.add_stock = options['add_stock']
+        self.suppliers = {
+            normalize_name(name): supplier_id
+            for supplier_id, name in Supplier.objects.values_list('id', 'name')
+        }
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'suppliers_created': 0}
+        batch_size = options['batch_size']
+        start = time.perf_counter()
+
+        try:
+            handle = open(options['path'], newline='', encoding=options['encoding'])
+        except OSError as exc:
+            raise CommandError(f'Cannot open {options["path"]}: {exc}')
+
+        with handle:
+            reader = csv.DictReader(handle, delimiter=options['delimiter'])
+            missing = REQUIRED_COLUMNS - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f'Missing required column(s): {", ".join(sorted(missing))}')
+
+            # Only one batch of rows is held in memory at a time
+            chunk = []
+            for row in reader:
+                chunk.append((reader.line_num, row))
+                if len(chunk) >= batch_size:
+                    self.import_chunk(chunk)
+                    self.report_progress(start)
+                    chunk = []
+            if chunk:
+                self.import_chunk(chunk)
+                self.report_progress(start)
+
+        catalog_changed.send(sender=Medicine)
+        stats = self.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['rows']} rows in {time.perf_counter() - start:.1f}s: "
+            f"{stats['created']} medicines created, {stats['updated']} updated, "
+            f"{stats['suppliers_created']} suppliers created, {stats['skipped']} rows skipped."
+        ))
+
+    def parse_row(self, line, row):
+        name = (row.get('name') or '').strip()
+        supplier = (row.get('supplier') or '').strip()
+        if not name or not supplier:
+            raise RowError(f'line {line}: name and supplier are required')
+        try:
+            mrp = Decimal((row.get('mrp') or '').strip())
+            stock = int((row.get('in_stock_total') or '0').strip() or 0)
+            if not mrp.is_finite():
+                raise RowError(f'line {line}: mrp must be a number')
+        except (InvalidOperation, ValueError):
+            raise RowError(f'line {line}: invalid mrp or in_stock_total')
+        if mrp < 0 or stock < 0:
+            raise RowError(f'line {line}: mrp and in_stock_total must not be negative')
+        barcodes = [normalize_code(code) for code in (row.get('barcodes') or '').split('|') if code.strip()]
+        if any(len(code) > 64 for code in barcodes):
+            raise RowError(f'line {line}: barcodes are at most 64 characters')
+        return {
+            'name': name[:100],
+            'name_normalized': normalize_name(name)[:100],
+            'supplier': supplier,
+            'mrp': mrp,
+            'in_stock_total': stock,
+            'barcodes': barcodes,
+            'description': row.get('description'),
+            'contact_person': (row.get('contact_person') or '').strip(),
+            'supplier_phone': (row.get('supplier_phone') or '').strip(),
+            'supplier_address': (row.get('supplier_address') or '').strip(),
+        }
+
+    def resolve_supplier(self, record, created):
+        key = normalize_name(record['supplier'])
+        supplier_id = self.suppliers.get(key) or created.get(key)
+        if supplier_id is None:
+            supplier_id = Supplier.objects.create(
+                name=record['supplier'][:100],
+                contact_person=record['contact_person'][:100],
+                phone_number=record['supplier_phone'][:15],
+                address=record['supplier_address'],
+            ).id
+            created[key] = supplier_id
+        return supplier_id
+
+    def import_chunk(self, chunk):
+        created = {}
+        self.write_chunk(chunk, created)
+        # Only suppliers of a committed batch exist for the batches after it
+        self.suppliers.update(created)
+        self.stats['suppliers_created'] += len(created)
+
+    @transaction.atomic
+    def write_chunk(self, chunk, created):
+        records = {}
+        for line, row in chunk:
+            self.stats['rows'] += 1
+            try:
+                record = self.parse_row(line, row)
+            except RowError as exc:
+                self.stats['skipped'] += 1
+                self.stderr.write(str(exc))
+                continue
+            key = (self.resolve_supplier(record, created), record['name_normalized'])
+            if key in records:
+                record['barcodes'] = records[key]['barcodes'] + record['barcodes']
+                if self.add_stock:
+                    # Repeated lines within a batch add up, as they would across batches
+                    record['in_stock_total'] += records[key]['in_stock_total']
+            records[key] = record
+
+        if not records:
+            return
+
+        # One query on the name index finds every medicine of this batch that
+        # already exists; the supplier is matched here so the planner cannot
+        # pick the far less selective supplier index instead. The rows stay
+        # locked until the batch commits, so a sale cannot change the stock a
+        # replaced level's ledger entry is worked out from.
+        existing = {
+            (medicine.supplier_id, medicine.name_normalized): medicine
+            for medicine in Medicine.objects.select_for_update().filter(
+                name_normalized__in={name for _, name in records},
+            ).order_by('id').only('id', 'supplier_id', 'name_normalized', 'in_stock_total', 'mrp', 'description')
+        }
+
+        to_create = []
+        to_update = []
+        movements = []
+        coded = []
+        for (supplier_id, name_normalized), record in records.items():
+            medicine = existing.get((supplier_id, name_normalized))
+            if medicine is None:
+                medicine = Medicine(
+                    name=record['name'],
+                    name_normalized=name_normalized,
+                    description=record['description'] or '',
+                    supplier_id=supplier_id,
+                    in_stock_total=record['in_stock_total'],
+                    mrp=record['mrp'],
+                )
+                to_create.append(medicine)
+                coded.append((medicine, record['barcodes']))
+                continue
+            coded.append((medicine, record['barcodes']))
+            medicine.mrp = record['mrp']
+            if self.add_stock:
+                change = record['in_stock_total']
+                # Applied in SQL so sales made during the import are not overwritten
+                medicine.in_stock_total = F('in_stock_total') + record['in_stock_total']
+            else:
+                change = record['in_stock_total'] - medicine.in_stock_total
+                medicine.in_stock_total = record['in_stock_total']
+            if change:
+                movements.append(StockMovement(medicine_id=medicine.id, quantity=change, reason='Import'))
+            if record['description'] is not None:
+                medicine.description = record['description']
+            to_update.append(medicine)
+
+        Medicine.objects.bulk_create(to_create)
+        Medicine.objects.bulk_update(to_update, ['mrp', 'in_stock_total', 'description'], batch_size=500)
+        # Every stock change goes into the ledger in the same transaction
+        movements += [
+            StockMovement(medicine_id=medicine.id, quantity=medicine.in_stock_total, reason='Import')
+            for medicine in to_create if medicine.in_stock_total
+        ]
+        StockMovement.objects.bulk_create(movements, batch_size=1000)
+        # Codes are unique; one that already exists is moved to this medicine
+        barcodes = {code: medicine.id for medicine, codes in coded for code in codes}
+        MedicineBarcode.objects.bulk_create(
+            [MedicineBarcode(medicine_id=medicine_id, code=code) for code, medicine_id in barcodes.items()],
+            update_conflicts=True, unique_fields=['code'], update_fields=['medicine'], batch_size=1000,
+        )
+        self.stats['created'] += len(to_create)
+        self.stats['updated'] += len(to_update)
+
+    def report_progress(self, start):
+        elapsed = time.perf_counter() - start
+        rate = self.stats['rows'] / elapsed if elapsed else 0
+        self.stdout.write(f"{self.stats['rows']} rows processed ({rate:.0f} rows/s)")
@@ -0,0 +1,125 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter per cold start: imports the WSGI module, then
+# sends one request straight to the WSGI callable
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_store.settings')
+module_name, attribute = sys.argv[1].rsplit('.', 1)
+module = __import__(module_name, fromlist=[attribute])
+application = getattr(module, attribute)
+loaded = time.perf_counter()
+
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+environ = {'PATH_INFO': sys.argv[2], 'HTTP_HOST': '127.0.0.1', 'SERVER_NAME': '127.0.0.1', 'wsgi.input': BytesIO()}
+setup_testing_defaults(environ)
+statuses = []
+body = b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (loaded - start) * 1000,
+    'first_response_ms': (done - loaded) * 1000,
+    'status': statuses[0],
+    'bytes': len(body),
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """
+    Returns {module: (self_us, cumulative_us)} from `python -X importtime`
+    output.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts the WSGI application in fresh processes, as a serverless cold start does, and reports the '
+        'time to import it, the time to the first response, and import time per module and per package.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='URL of the first request (default: the dashboard).')
+        parser.add_argument('--runs', type=int, default=5, help='Cold starts to average over.')
+        parser.add_argument('--top', type=int, default=20, help='Slowest modules to list.')
+        parser.add_argument(
+            '--serverless', choices=['on', 'off'], help='Force SERVERLESS on or off in the started processes.'
+        )
+        parser.add_argument('-o', '--output', help='Also write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        if options['serverless']:
+            env['SERVERLESS'] = '1' if options['serverless'] == 'on' else '0'
+        command = [sys.executable, '-X', 'importtime', '-c', CHILD, settings.WSGI_APPLICATION, options['path']]
+
+        runs = []
+        totals = defaultdict(lambda: [0, 0])
+        for _ in range(options['runs']):
+            start = time.perf_counter()
+            child = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            elapsed = (time.perf_counter() - start) * 1000
+            if child.returncode:
+                raise CommandError(f'The application did not start:\n{child.stderr[-2000:]}')
+            run = json.loads(child.stdout.strip().splitlines()[-1])
+            run['process_ms'] = elapsed
+            runs.append(run)
+            for name, (own, cumulative) in parse_importtime(child.stderr).items():
+                totals[name][0] += own
+                totals[name][1] += cumulative
+
+        count = len(runs)
+        modules = {name: (own / count / 1000, cumulative / count / 1000) for name, (own, cumulative) in totals.items()}
+        packages = defaultdict(float)
+        for name, (own, _) in modules.items():
+            packages[name.split('.')[0]] += own
+        summary = {
+            key: round(statistics.median(run[key] for run in runs), 1)
+            for key in ('import_ms', 'first_response_ms', 'process_ms')
+        }
+
+        self.stdout.write(
+            f"{count} cold starts of {settings.WSGI_APPLICATION}, first request {options['path']} "
+            f"(status {runs[-1]['status']}), medians:"
+        )
+        self.stdout.write(f"  import application   {summary['import_ms']:>8.1f} ms")
+        self.stdout.write(f"  first response       {summary['first_response_ms']:>8.1f} ms")
+        self.stdout.write(f"  whole process        {summary['process_ms']:>8.1f} ms")
+        self.stdout.write('\nImport time by package (own time of its modules):')
+        for name, own in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {name:<40} {own:>8.1f} ms')
+        self.stdout.write('\nSlowest modules (including what they import):')
+        for name, (own, cumulative) in sorted(modules.items(), key=lambda item: -item[1][1])[:options['top']]:
+            self.stdout.write(f'  {name:<56} {cumulative:>8.1f} ms  (own {own:.1f} ms)')
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump({
+                    'wsgi': settings.WSGI_APPLICATION,
+                    'path': options['path'],
+                    'serverless': options['serverless'],
+                    'runs': runs,
+                    'median': summary,
+                    'packages_ms': {name: round(own, 2) for name, own in packages.items()},
+                    'modules_ms': {name: [round(own, 2), round(cumulative, 2)] for name, (own, cumulative) in modules.items()},
+                }, handle, indent=2)
+                handle.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from inventory import kpis
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the cached dashboard counters from the database, e.g. after they drift.'
+
+    def handle(self, *args, **options):
+        for key, value in kpis.rebuild().items():
+            self.stdout.write(f'{key} = {value}')
+        self.stdout.write(self.style.SUCCESS('Dashboard counters rebuilt.'))
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from inventory.models import Invoice
+from inventory.totals import compute_totals, save_repaired_totals, totals_match
+
+
+class Command(BaseCommand):
+    help = 'Verifies stored invoice totals against their line items in bulk, optionally repairing them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite the totals of invoices that do not match.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        money = DecimalField(max_digits=12, decimal_places=2)
+        # One grouped query computes every invoice's item total
+        invoices = Invoice.objects.annotate(
+            items_total=Coalesce(
+                Sum(F('items__quantity') * F('items__rate'), output_field=money),
+                Value(Decimal('0.00')),
+                output_field=money,
+            )
+        ).order_by('id')
+
+        checked = 0
+        mismatched = []
+        for invoice in invoices.iterator(chunk_size=batch_size):
+            checked += 1
+            expected = compute_totals(
+                Decimal(invoice.items_total),
+                Decimal(invoice.discount_percentage),
+                Decimal(invoice.cgst_percentage),
+                Decimal(invoice.sgst_percentage),
+            )
+            if totals_match(invoice, expected):
+                continue
+            self.stdout.write(
+                f'Invoice #{invoice.id}: stored grand total {invoice.grand_total}, '
+                f'expected {expected["grand_total"].quantize(Decimal("0.01"))}'
+            )
+            mismatched.append(invoice)
+
+        if mismatched and options['fix']:
+            # One save per invoice rather than a bulk update: repairs are
+            # rare, and the save signals keep the dashboard counters, purchase
+            # histories and cached PDFs in step
+            with transaction.atomic():
+                for invoice in mismatched:
+                    save_repaired_totals(invoice, Decimal(invoice.items_total))
+            self.stdout.write(self.style.SUCCESS(f'Checked {checked} invoices, repaired {len(mismatched)}.'))
+        elif mismatched:
+            raise CommandError(f'Checked {checked} invoices, {len(mismatched)} have stale totals. Re-run with --fix.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Checked {checked} invoices, all totals match.'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory.ledger import ledger_mismatches
+from inventory.models import Medicine, StockMovement
+
+
+class Command(BaseCommand):
+    help = (
+        'Verifies every in_stock_total against the stock ledger in one query. With --fix, records '
+        'an Adjustment movement for each difference so the ledger matches the stock on hand.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Record adjustments for the differences.')
+        parser.add_argument('--note', default='Reconciled against in_stock_total')
+
+    def handle(self, *args, **options):
+        checked = Medicine.objects.count()
+        mismatched = list(ledger_mismatches())
+        for row in mismatched:
+            self.stdout.write(
+                f"Medicine #{row['id']} {row['name']}: stock {row['in_stock_total']}, "
+                f"ledger {row['ledger_total']} ({row['in_stock_total'] - row['ledger_total']:+d})"
+            )
+
+        if mismatched and options['fix']:
+            with transaction.atomic():
+                StockMovement.objects.bulk_create(
+                    [
+                        StockMovement(
+                            medicine_id=row['id'],
+                            quantity=row['in_stock_total'] - row['ledger_total'],
+                            reason='Adjustment',
+                            note=options['note'],
+                        )
+                        for row in mismatched
+                    ],
+                    batch_size=1000,
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'Checked {checked} medicines, recorded {len(mismatched)} adjustments.'
+            ))
+        elif mismatched:
+            raise CommandError(
+                f'Checked {checked} medicines, {len(mismatched)} differ from the ledger. Re-run with --fix.'
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Checked {checked} medicines, stock matches the ledger.'))
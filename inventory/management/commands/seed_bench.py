@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.seeding import BASE_VOLUMES, seed, volumes
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with synthetic suppliers, medicines, customers, invoices, returns and custom orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1, help='Multiplies every default volume.')
+        for key, count in BASE_VOLUMES.items():
+            parser.add_argument(
+                f"--{key.replace('_', '-')}", type=int, dest=key, help=f'Rows to create (default {count} x scale).'
+            )
+        parser.add_argument('--days', type=int, default=365, help='Spread invoices over this many past days.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for repeatable data.')
+
+    def handle(self, *args, **options):
+        counts = volumes(options['scale'], **{key: options[key] for key in BASE_VOLUMES})
+        start = time.perf_counter()
+        written = seed(counts, days=options['days'], random_seed=options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded in {time.perf_counter() - start:.1f}s: '
+            + ', '.join(f'{count} {key.replace("_", " ")}' for key, count in written.items())
+        ))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.outbox import send_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Delivers queued emails, one SMTP connection per batch. Failed messages are retried '
+        'with exponential backoff. Run it from cron, or with --loop as a long-running worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new messages.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to wait when the outbox is empty.')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_batch(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Batch: {sent} sent, {failed} failed.')
+            if sent + failed >= options['batch_size']:
+                # There may be more due right away
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'{total_sent} sent, {total_failed} failed.'))
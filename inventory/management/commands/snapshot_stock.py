@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from inventory.ledger import SNAPSHOT_MARGIN, latest_snapshot_allowed, take_snapshot
+from inventory.rollups import start_of_day
+
+
+class Command(BaseCommand):
+    help = (
+        'Stores the stock of every medicine as of the start of a day (default: today), so '
+        'stock-at-date lookups only replay the ledger since then. Run it nightly or weekly, at least '
+        f'{SNAPSHOT_MARGIN.seconds // 60} minutes after midnight so every movement of the day before has committed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Snapshot as of the start of this day (YYYY-MM-DD).')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            day = parse_date(options['date'])
+            if day is None:
+                raise CommandError(f"Invalid date: {options['date']}")
+            at = start_of_day(day)
+        else:
+            at = start_of_day(timezone.localdate())
+        if at > latest_snapshot_allowed():
+            raise CommandError(
+                f'{at:%Y-%m-%d %H:%M} is less than {SNAPSHOT_MARGIN.seconds // 60} minutes ago; '
+                'movements dated before it may still be committing. Run it later.'
+            )
+        start = time.perf_counter()
+        rows = take_snapshot(at)
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshot at {at:%Y-%m-%d %H:%M}: {rows} medicines in stock, {time.perf_counter() - start:.2f}s.'
+        ))
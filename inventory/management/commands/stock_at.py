@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventory.ledger import stock_at
+from inventory.models import Medicine
+from inventory.rollups import start_of_day
+
+
+class Command(BaseCommand):
+    help = 'Prints the stock on hand at the end of a given day, from the latest snapshot and the ledger.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('date', help='YYYY-MM-DD')
+        parser.add_argument('--medicine', type=int, nargs='*', help='Only these medicine ids.')
+
+    def handle(self, *args, **options):
+        day = parse_date(options['date'])
+        if day is None:
+            raise CommandError(f"Invalid date: {options['date']}")
+        # The last instant of the day
+        when = start_of_day(day + timedelta(days=1)) - timedelta(microseconds=1)
+        stock = stock_at(when, options['medicine'])
+        names = dict(Medicine.objects.filter(id__in=stock).values_list('id', 'name'))
+        for medicine_id in sorted(stock, key=lambda medicine_id: names.get(medicine_id, '')):
+            self.stdout.write(f'{stock[medicine_id]:>8}  {names.get(medicine_id, medicine_id)}')
+        self.stdout.write(self.style.SUCCESS(f'{len(stock)} medicines in stock at the end of {day}.'))
@@ -0,0 +1,131 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models import Sum
+
+from inventory.models import Customer, Invoice, InvoiceItem, Medicine, Supplier
+from inventory.stock import InsufficientStock, record_opening_balance, sell_medicine
+from inventory.totals import items_sub_total
+
+
+class Command(BaseCommand):
+    help = (
+        'Sells one medicine from many threads at once and checks that stock never goes '
+        'negative and no sale is lost. Creates its own data and removes it afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--sales', type=int, default=100, help='Sale attempts per worker.')
+        parser.add_argument('--stock', type=int, default=500, help='Starting stock of the contended medicine.')
+        parser.add_argument('--max-quantity', type=int, default=3)
+        parser.add_argument('--keep', action='store_true', help='Leave the generated rows in the database.')
+
+    def handle(self, *args, **options):
+        supplier = Supplier.objects.create(
+            name='Stress Supplier', contact_person='Stress', phone_number='0000000000', address='-'
+        )
+        medicine = Medicine.objects.create(
+            name='Stress Test Medicine', description='', supplier=supplier,
+            in_stock_total=options['stock'], mrp='10.00',
+        )
+        record_opening_balance(medicine)
+        customer = Customer.objects.create(name='Stress Customer', phone_number=f'stress-{medicine.id}')
+        invoices = [Invoice.objects.create(customer=customer) for _ in range(options['workers'])]
+
+        try:
+            stats = self.run_workers(medicine, invoices, options)
+            self.verify(medicine, invoices, options['stock'], stats)
+        finally:
+            if not options['keep']:
+                InvoiceItem.objects.filter(invoice__in=invoices).delete()
+                Invoice.objects.filter(id__in=[invoice.id for invoice in invoices]).delete()
+                medicine.delete()
+                customer.delete()
+                supplier.delete()
+
+    def run_workers(self, medicine, invoices, options):
+        stats = {'sold': 0, 'rejected': 0, 'retries': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(invoices))
+        errors = []
+
+        def worker(invoice, seed):
+            rng = random.Random(seed)
+            sold = rejected = retries = 0
+            try:
+                barrier.wait()
+                for _ in range(options['sales']):
+                    quantity = rng.randint(1, options['max_quantity'])
+                    while True:
+                        try:
+                            sell_medicine(invoice.id, medicine.id, quantity)
+                            sold += quantity
+                        except InsufficientStock:
+                            rejected += 1
+                        except OperationalError:
+                            # SQLite reports lock contention instead of waiting
+                            retries += 1
+                            time.sleep(0.001)
+                            continue
+                        break
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+            with lock:
+                stats['sold'] += sold
+                stats['rejected'] += rejected
+                stats['retries'] += retries
+
+        threads = [
+            threading.Thread(target=worker, args=(invoice, seed))
+            for seed, invoice in enumerate(invoices)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats['elapsed'] = time.perf_counter() - start
+        stats['attempts'] = options['sales']
+        close_old_connections()
+        if errors:
+            raise CommandError(f'{len(errors)} workers failed, first error: {errors[0]!r}')
+        return stats
+
+    def verify(self, medicine, invoices, initial_stock, stats):
+        medicine.refresh_from_db()
+        recorded = InvoiceItem.objects.filter(invoice__in=invoices).aggregate(total=Sum('quantity'))['total'] or 0
+        self.stdout.write(
+            f"{len(invoices)} workers, {stats['sold']} units sold, {stats['rejected']} sales rejected, "
+            f"{stats['retries']} lock retries in {stats['elapsed']:.2f}s "
+            f"({len(invoices) * stats['attempts'] / stats['elapsed']:.0f} checkouts/s)"
+        )
+
+        problems = []
+        if medicine.in_stock_total < 0:
+            problems.append(f'stock went negative: {medicine.in_stock_total}')
+        if initial_stock - medicine.in_stock_total != recorded:
+            problems.append(
+                f'stock dropped by {initial_stock - medicine.in_stock_total} but {recorded} units were invoiced'
+            )
+        ledger = medicine.movements.aggregate(total=Sum('quantity'))['total'] or 0
+        if ledger != medicine.in_stock_total:
+            problems.append(f'stock ledger sums to {ledger} but stock is {medicine.in_stock_total}')
+        if recorded != stats['sold']:
+            problems.append(f'{stats["sold"]} units reported sold but {recorded} invoiced')
+        stale = [
+            invoice.id for invoice in Invoice.objects.filter(id__in=[i.id for i in invoices])
+            if invoice.sub_total != items_sub_total(invoice)
+        ]
+        if stale:
+            problems.append(f'invoice totals lost updates on {stale}')
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS(
+            f'OK: final stock {medicine.in_stock_total}, no oversell, no lost updates.'
+        ))
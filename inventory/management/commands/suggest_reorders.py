@@ -0,0 +1,82 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.reorder import ReorderSettings, suggest_reorders
+
+
+class Command(BaseCommand):
+    help = (
+        'Forecasts demand for the whole catalog from net daily sales and prints draft purchase '
+        'orders, grouped by supplier, for medicines that will run out within the lead time. Needs NumPy: '
+        'pip install -r requirements-tools.txt.'
+    )
+
+    def add_arguments(self, parser):
+        defaults = ReorderSettings()
+        parser.add_argument('--window', type=int, default=defaults.window, help='Days of sales history to use.')
+        parser.add_argument('--short-window', type=int, default=defaults.short_window)
+        parser.add_argument('--half-life', type=float, default=defaults.half_life)
+        parser.add_argument('--lead-time', type=int, default=defaults.lead_time, help='Days until ordered stock arrives.')
+        parser.add_argument('--cover-days', type=int, default=defaults.cover_days, help='Days of demand an order should cover.')
+        parser.add_argument('--service-z', type=float, default=defaults.service_z, help='Safety stock in standard deviations.')
+        parser.add_argument('--format', choices=['text', 'csv', 'json'], default='text')
+        parser.add_argument(
+            '--skip-rollup-update', action='store_true',
+            help='Use the sales rollup as it is, e.g. when update_sales_rollups already runs from cron.',
+        )
+
+    def handle(self, *args, **options):
+        settings = ReorderSettings(**{
+            name: options[name]
+            for name in ('window', 'short_window', 'half_life', 'lead_time', 'cover_days', 'service_z')
+        })
+        start = time.perf_counter()
+        try:
+            groups = suggest_reorders(settings, update_rollups=not options['skip_rollup_update'])
+        except ImportError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - start
+
+        getattr(self, f"write_{options['format']}")(groups)
+        lines = sum(len(group) for _, group in groups)
+        self.stderr.write(f'{lines} medicine(s) to reorder from {len(groups)} supplier(s), computed in {elapsed:.2f}s.')
+
+    def write_text(self, groups):
+        for supplier, lines in groups:
+            total = sum(line['value'] for line in lines)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{supplier.name} ({supplier.phone_number}) - est. Rs. {total:.2f}'))
+            for line in lines:
+                self.stdout.write(
+                    f"  {line['quantity']:>6} x {line['medicine'].name:<50} "
+                    f"stock {line['in_stock']:>5}, {line['daily_demand']:.1f}/day, "
+                    f"{line['days_of_cover']:.1f} days of cover"
+                )
+
+    def rows(self, groups):
+        for supplier, lines in groups:
+            for line in lines:
+                yield {
+                    'supplier_id': supplier.id,
+                    'supplier': supplier.name,
+                    'medicine_id': line['medicine'].id,
+                    'medicine': line['medicine'].name,
+                    'in_stock': line['in_stock'],
+                    'daily_demand': round(line['daily_demand'], 2),
+                    'days_of_cover': round(line['days_of_cover'], 1),
+                    'quantity': line['quantity'],
+                    'estimated_value': str(line['value']),
+                }
+
+    def write_csv(self, groups):
+        writer = None
+        for row in self.rows(groups):
+            if writer is None:
+                writer = csv.DictWriter(self.stdout, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+
+    def write_json(self, groups):
+        self.stdout.write(json.dumps(list(self.rows(groups)), indent=2))
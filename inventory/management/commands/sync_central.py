@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from inventory.sync import BATCH_SIZE, CENTRAL, SyncError, pending, pull, push
+
+
+class Command(BaseCommand):
+    help = (
+        'Pushes the bills, returns and stock movements this offline store recorded to the central database in '
+        'batches. A run that is cut off is simply repeated; nothing is applied twice. --pull then refreshes the '
+        'catalog and customers from the central database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per central transaction.')
+        parser.add_argument('--pull', action='store_true', help='Also copy the catalog and customers from central.')
+        parser.add_argument('--status', action='store_true', help='Only show how many rows are waiting to be pushed.')
+
+    def handle(self, *args, **options):
+        if CENTRAL not in settings.DATABASES:
+            raise CommandError(
+                'Not an offline store: set OFFLINE_STORE=1 and point DATABASE_URL at the central database.'
+            )
+        if options['status']:
+            for name, count in pending().items():
+                self.stdout.write(f'  {name:<16} {count:>8} waiting')
+            return
+
+        try:
+            start = time.perf_counter()
+            sent = push(options['batch_size'])
+            elapsed = time.perf_counter() - start
+            oversold = sent.pop('oversold')
+            rows = sum(sent.values())
+            self.stdout.write(self.style.SUCCESS(
+                f'Pushed {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s): '
+                + ', '.join(f'{count} {name.replace("_", " ")}' for name, count in sent.items())
+            ))
+            for medicine_id, units in oversold.items():
+                self.stdout.write(self.style.WARNING(
+                    f'  Medicine #{medicine_id}: sold {units} more than the central stock; '
+                    f'stock set to 0 and the difference recorded as an Adjustment'
+                ))
+            if options['pull']:
+                start = time.perf_counter()
+                copied = pull(options['batch_size'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'Pulled in {time.perf_counter() - start:.2f}s: '
+                    + ', '.join(f'{copied[name]} {name}' for name in ('suppliers', 'medicines', 'barcodes', 'customers'))
+                    + ('' if copied['stock'] else ' (stock kept: movements are still waiting to be pushed)')
+                ))
+        except SyncError as exc:
+            raise CommandError(str(exc))
+        except DatabaseError as exc:
+            # Every committed batch is recorded; the next run carries on from there
+            raise CommandError(f'Sync stopped, run it again once the central database is reachable: {exc}')
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventory.rollups import update_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Incrementally updates the daily sales rollup tables used by the sales report.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', help='Re-aggregate from this date (YYYY-MM-DD), e.g. after back-dated corrections.'
+        )
+        parser.add_argument('--rebuild', action='store_true', help='Re-aggregate all history.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid date: {options['since']}")
+
+        start = time.perf_counter()
+        first_day, days = update_sales_rollups(since=since, rebuild=options['rebuild'])
+        elapsed = time.perf_counter() - start
+        if first_day is None:
+            self.stdout.write('No invoices or returns to roll up.')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {days} day(s) from {first_day} in {elapsed:.2f}s.'
+        ))
@@ -0,0 +1,273 @@
+# inventory/metrics.py
+import atexit
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+# Request metrics in the Prometheus text format.
+#
+# Every worker process counts into its own in-memory registry (a dict update
+# under a lock per request) and writes a snapshot of it to
+# METRICS_DIR/<pid>.json at most once every FLUSH_INTERVAL seconds. /metrics
+# adds up the snapshots of all workers, so any gunicorn worker can answer a
+# scrape with the totals of all of them. Snapshots of processes that have
+# exited are deleted while adding up, so restarts do not pile them up.
+
+FLUSH_INTERVAL = 1.0
+
+# Where a process cannot be probed for being alive, a snapshot not written
+# for this many seconds is taken to belong to one that has exited
+STALE_AFTER = 24 * 60 * 60
+
+# Seconds; the upper bounds of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name: (type, help)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by URL name, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Time from the first to the last middleware, by URL name.'),
+    'db_queries_total': ('counter', 'SQL queries run while handling requests, by URL name.'),
+    'db_query_seconds_total': ('counter', 'Time spent in SQL queries, by URL name.'),
+    'template_render_seconds_total': ('counter', 'Time spent rendering templates, by URL name.'),
+    'fragment_cache_requests_total': ('counter', 'Cached template fragment lookups, by fragment and hit or miss.'),
+}
+
+
+class Registry:
+    """
+    Counters keyed by (metric name, label pairs). A histogram is kept as its
+    cumulative `_bucket` counters plus `_sum` and `_count`, so the snapshots
+    of several processes can simply be added up.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)
+        self.pid = os.getpid()
+        self.last_flush = 0.0
+
+    def _check_fork(self):
+        # A forked worker starts with a copy of its parent's counts
+        if os.getpid() != self.pid:
+            self.values = defaultdict(float)
+            self.pid = os.getpid()
+            self.last_flush = 0.0
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            self._check_fork()
+            self.values[(name, labels)] += amount
+
+    def observe(self, name, labels, seconds):
+        with self.lock:
+            self._check_fork()
+            # Every bucket is written, even at zero, as scrapers expect
+            for bound in BUCKETS:
+                self.values[(f'{name}_bucket', labels + (('le', str(bound)),))] += seconds <= bound
+            self.values[(f'{name}_bucket', labels + (('le', '+Inf'),))] += 1
+            self.values[(f'{name}_sum', labels)] += seconds
+            self.values[(f'{name}_count', labels)] += 1
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes this process's snapshot; a failure only costs freshness.
+        """
+        if not self.directory:
+            return
+        with self.lock:
+            self._check_fork()
+            self.last_flush = time.monotonic()
+            rows = [[name, list(labels), value] for (name, labels), value in self.values.items()]
+        if not rows:
+            # Management commands and idle workers have nothing to add up
+            return
+        try:
+            directory = Path(self.directory)
+            directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(rows, handle)
+            os.replace(tmp_path, directory / f'{self.pid}.json')
+        except OSError:
+            pass
+
+    def collect(self):
+        """
+        Returns the totals of every process: {(name, labels): value}.
+        """
+        if not self.directory:
+            with self.lock:
+                return dict(self.values)
+        self.flush()
+        totals = defaultdict(float)
+        for path in Path(self.directory).glob('*.json'):
+            try:
+                if _is_stale(path):
+                    path.unlink()
+                    continue
+                rows = json.loads(path.read_text())
+            except (OSError, ValueError):
+                # Being replaced right now, or left half-written by a crash
+                continue
+            for name, labels, value in rows:
+                totals[(name, tuple(tuple(pair) for pair in labels))] += value
+        return totals
+
+
+def _is_stale(path):
+    try:
+        pid = int(path.stem)
+    except ValueError:
+        return False
+    if os.name != 'posix':
+        # os.kill() would signal the process rather than probe it
+        return time.time() - path.stat().st_mtime > STALE_AFTER
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        # Alive, but run by another user
+        pass
+    return False
+
+
+def _base_name(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def render(values):
+    """
+    Formats collected values in the Prometheus text exposition format.
+    """
+    grouped = defaultdict(list)
+    for (name, labels), value in values.items():
+        grouped[_base_name(name)].append((name, labels, value))
+    lines = []
+    for base in sorted(grouped):
+        kind, help_text = METRICS.get(base, ('untyped', ''))
+        lines.append(f'# HELP {base} {help_text}')
+        lines.append(f'# TYPE {base} {kind}')
+        for name, labels, value in sorted(grouped[base], key=_sort_key):
+            lines.append(f'{name}{_format_labels(labels)} {value:.6g}')
+    return '\n'.join(lines) + '\n'
+
+
+def _sort_key(row):
+    name, labels, _ = row
+    # A histogram's buckets in order of their upper bound, then _sum and _count
+    le = [float(value) for key, value in labels if key == 'le']
+    rank = ('_bucket', '_sum', '_count').index(name[name.rindex('_'):]) if name not in METRICS else 0
+    return [pair for pair in labels if pair[0] != 'le'], rank, le
+
+
+registry = Registry(getattr(settings, 'METRICS_DIR', None))
+atexit.register(registry.flush)
+
+
+# --- Per-request timings ---
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class _RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db_seconds += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """
+    Records count, latency, SQL and template time of every request under
+    its URL name. Goes first in MIDDLEWARE so the latency covers the rest.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = _RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_time_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = (match.view_name if match else '') or 'unmatched'
+        registry.inc('http_requests_total', (('view', view), ('method', request.method), ('status', str(response.status_code))))
+        registry.observe('http_request_duration_seconds', (('view', view),), elapsed)
+        registry.inc('db_queries_total', (('view', view),), timings.queries)
+        registry.inc('db_query_seconds_total', (('view', view),), timings.db_seconds)
+        registry.inc('template_render_seconds_total', (('view', view),), timings.template_seconds)
+        registry.maybe_flush()
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_seconds += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, with render time added to the request's
+    metrics. Includes are part of the template that includes them, so they
+    are not counted twice.
+    """
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+def backfill_name_normalized(apps, schema_editor):
+    Medicine = apps.get_model("inventory", "Medicine")
+    batch = []
+    for medicine in Medicine.objects.only("id", "name").iterator(chunk_size=2000):
+        medicine.name_normalized = " ".join(medicine.name.lower().split())
+        batch.append(medicine)
+        if len(batch) >= 2000:
+            Medicine.objects.bulk_update(batch, ["name_normalized"])
+            batch = []
+    if batch:
+        Medicine.objects.bulk_update(batch, ["name_normalized"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0006_customer_email"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="medicine",
+            name="name_normalized",
+            field=models.CharField(default="", editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name="medicine",
+            index=models.Index(
+                fields=["name_normalized", "id"], name="medicine_search_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="medicine",
+            index=models.Index(
+                fields=["name_normalized"],
+                name="medicine_name_prefix_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        migrations.RunPython(backfill_name_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+
+def backfill_customer_name_normalized(apps, schema_editor):
+    Customer = apps.get_model("inventory", "Customer")
+    batch = []
+    for customer in Customer.objects.only("id", "name").iterator(chunk_size=2000):
+        customer.name_normalized = " ".join(customer.name.lower().split())
+        batch.append(customer)
+        if len(batch) >= 2000:
+            Customer.objects.bulk_update(batch, ["name_normalized"])
+            batch = []
+    if batch:
+        Customer.objects.bulk_update(batch, ["name_normalized"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0007_medicine_name_normalized"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="name_normalized",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=100
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(fields=["invoice_date", "id"], name="invoice_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["customer", "invoice_date", "id"],
+                name="invoice_customer_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(fields=["grand_total"], name="invoice_grand_total_idx"),
+        ),
+        migrations.RunPython(
+            backfill_customer_name_normalized, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0008_invoice_list_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="medicine",
+            index=models.Index(fields=["in_stock_total"], name="medicine_stock_idx"),
+        ),
+    ]
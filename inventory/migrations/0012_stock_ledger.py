@@ -0,0 +1,137 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    # Starts the ledger from the stock on hand, so it sums to in_stock_total
+    Medicine = apps.get_model("inventory", "Medicine")
+    StockMovement = apps.get_model("inventory", "StockMovement")
+    now = django.utils.timezone.now()
+    batch = []
+    stock = Medicine.objects.exclude(in_stock_total=0).values_list(
+        "id", "in_stock_total"
+    )
+    for medicine_id, quantity in stock.iterator(chunk_size=2000):
+        batch.append(
+            StockMovement(
+                medicine_id=medicine_id,
+                quantity=quantity,
+                reason="Opening",
+                created_at=now,
+            )
+        )
+        if len(batch) >= 2000:
+            StockMovement.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        StockMovement.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0011_email_outbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockMovement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.IntegerField()),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[
+                            ("Opening", "Opening balance"),
+                            ("Sale", "Sale"),
+                            ("Return", "Customer return"),
+                            ("Receipt", "Stock received"),
+                            ("Import", "Catalog import"),
+                            ("Adjustment", "Adjustment"),
+                        ],
+                        max_length=12,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("note", models.CharField(blank=True, max_length=200)),
+                (
+                    "invoice_item",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="inventory.invoiceitem",
+                    ),
+                ),
+                (
+                    "medicine",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="movements",
+                        to="inventory.medicine",
+                    ),
+                ),
+                (
+                    "return_invoice",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="inventory.returninvoice",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["medicine", "created_at"],
+                        name="stock_movement_medicine_idx",
+                    ),
+                    models.Index(fields=["created_at"], name="stock_movement_date_idx"),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="StockSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("taken_at", models.DateTimeField()),
+                ("quantity", models.IntegerField()),
+                (
+                    "medicine",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.medicine",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("taken_at", "medicine"), name="stock_snapshot_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
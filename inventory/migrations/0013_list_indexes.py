@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0012_stock_ledger"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["is_active", "name_normalized"], name="customer_active_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customorder",
+            index=models.Index(
+                fields=["status", "order_date"], name="custom_order_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customorder",
+            index=models.Index(fields=["order_date"], name="custom_order_date_idx"),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0013_list_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MedicineBarcode",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("code", models.CharField(max_length=64, unique=True)),
+                (
+                    "medicine",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="barcodes",
+                        to="inventory.medicine",
+                    ),
+                ),
+            ],
+        ),
+    ]
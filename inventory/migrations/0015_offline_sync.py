@@ -0,0 +1,115 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:20
+
+import uuid
+from django.db import migrations, models
+
+SYNCED_MODELS = [
+    "Invoice",
+    "InvoiceItem",
+    "ReturnInvoice",
+    "ReturnItem",
+    "StockMovement",
+]
+
+
+def backfill_sync_ids(apps, schema_editor):
+    for model_name in SYNCED_MODELS:
+        model = apps.get_model("inventory", model_name)
+        batch = []
+        for row in model.objects.only("id").iterator(chunk_size=2000):
+            row.sync_id = uuid.uuid4()
+            batch.append(row)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, ["sync_id"])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ["sync_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0014_medicine_barcode"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("last_id", models.BigIntegerField(default=0)),
+                ("last_changed_at", models.DateTimeField(blank=True, null=True)),
+                ("synced_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="invoice",
+            name="sync_id",
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="invoice",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="invoiceitem",
+            name="sync_id",
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="returninvoice",
+            name="sync_id",
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="returnitem",
+            name="sync_id",
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="stockmovement",
+            name="sync_id",
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        # Existing rows get their own ids before the column becomes unique
+        migrations.RunPython(backfill_sync_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="invoice",
+            name="sync_id",
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="invoiceitem",
+            name="sync_id",
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="returninvoice",
+            name="sync_id",
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="returnitem",
+            name="sync_id",
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="stockmovement",
+            name="sync_id",
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(fields=["updated_at", "id"], name="invoice_updated_idx"),
+        ),
+    ]
@@ -1,7 +1,41 @@
 # inventory/models.py
+import uuid
+
 from django.db import models
 from django.utils import timezone
 
+
+def normalize_name(name):
+    """
+    Lower-cases a name and collapses runs of whitespace so that searches can
+    use a plain prefix match against an indexed column.
+    """
+    return ' '.join((name or '').lower().split())
+
+
+def normalize_code(code):
+    """
+    Barcodes and SKUs are matched without surrounding whitespace and case,
+    whatever the scanner or the price list sends.
+    """
+    return (code or '').strip().upper()
+
+
+def prefix_filter(field, prefix):
+    """
+    Returns a Q object matching rows whose `field` starts with `prefix`.
+
+    The LIKE test alone is not index-friendly everywhere (SQLite never uses an
+    index for it, PostgreSQL only with a pattern_ops index), so it is paired
+    with an equivalent range condition that any B-tree index can serve.
+    """
+    return models.Q(**{
+        f'{field}__gte': prefix,
+        f'{field}__lt': prefix + '\U0010ffff',
+        f'{field}__startswith': prefix,
+    })
+
+
 class Supplier(models.Model):
     name = models.CharField(max_length=100)
     contact_person = models.CharField(max_length=100)
@@ -13,15 +47,53 @@ class Supplier(models.Model):
 
 class Medicine(models.Model):
     name = models.CharField(max_length=100)
+    # Search key for medicine_list, kept in sync with `name` in save()
+    name_normalized = models.CharField(max_length=100, editable=False, default='')
     description = models.TextField()
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
     in_stock_total = models.PositiveIntegerField(default=0)
     mrp = models.DecimalField(max_digits=10, decimal_places=2)
     added_on = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination walks (name_normalized, id) in order
+            models.Index(fields=['name_normalized', 'id'], name='medicine_search_idx'),
+            # Prefix search (LIKE 'abc%') on PostgreSQL needs a pattern_ops
+            # index under non-C collations; other databases ignore opclasses
+            models.Index(
+                fields=['name_normalized'],
+                name='medicine_name_prefix_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+            # Low-stock counts on the dashboard
+            models.Index(fields=['in_stock_total'], name='medicine_stock_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.name_normalized = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'name_normalized'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
+
+class MedicineBarcode(models.Model):
+    # A medicine can carry several codes (pack sizes, old and new packaging,
+    # an in-house SKU); each code belongs to exactly one medicine
+    medicine = models.ForeignKey(Medicine, related_name='barcodes', on_delete=models.CASCADE)
+    code = models.CharField(max_length=64, unique=True)
+
+    def save(self, *args, **kwargs):
+        self.code = normalize_code(self.code)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.code
+
 # inventory/models.py
 
 class Customer(models.Model):
@@ -31,13 +103,32 @@ class Customer(models.Model):
     email = models.EmailField(max_length=100, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Search key for customer lookups, kept in sync with `name` in save()
+    name_normalized = models.CharField(max_length=100, editable=False, default='', db_index=True)
+
+    class Meta:
+        indexes = [
+            # Active / inactive customer lists, in name order
+            models.Index(fields=['is_active', 'name_normalized'], name='customer_active_name_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.name_normalized = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'name_normalized'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 class Invoice(models.Model):
+    # Identifies the bill on every database it is synced to (see inventory/sync.py)
+    sync_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
     invoice_date = models.DateTimeField(default=timezone.now)
+    # Set on every save, including the totals updates as lines are added
+    updated_at = models.DateTimeField(auto_now=True)
     
     # RENAMED: This is now the pre-discount, pre-tax total
     sub_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
@@ -56,10 +147,28 @@ class Invoice(models.Model):
     
     grand_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
 
+    class Meta:
+        indexes = [
+            # invoice_list pages newest-first over (invoice_date, id)
+            models.Index(fields=['invoice_date', 'id'], name='invoice_date_idx'),
+            # Filtering one customer's invoices keeps the same ordering
+            models.Index(fields=['customer', 'invoice_date', 'id'], name='invoice_customer_date_idx'),
+            models.Index(fields=['grand_total'], name='invoice_grand_total_idx'),
+            # The offline store pushes changed invoices in this order
+            models.Index(fields=['updated_at', 'id'], name='invoice_updated_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'updated_at'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Invoice {self.id} for {self.customer.name}"
 
 class InvoiceItem(models.Model):
+    sync_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     invoice = models.ForeignKey(Invoice, related_name='items', on_delete=models.CASCADE)
     medicine = models.ForeignKey(Medicine, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField()
@@ -72,6 +181,7 @@ class InvoiceItem(models.Model):
 
 # ADD THESE TWO NEW MODELS
 class ReturnInvoice(models.Model):
+    sync_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     original_invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE)
     return_date = models.DateTimeField(default=timezone.now)
     total_refund_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
@@ -80,6 +190,7 @@ class ReturnInvoice(models.Model):
         return f"Return for Invoice #{self.original_invoice.id}"
 
 class ReturnItem(models.Model):
+    sync_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     return_invoice = models.ForeignKey(ReturnInvoice, related_name='items', on_delete=models.CASCADE)
     medicine = models.ForeignKey(Medicine, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField()
@@ -105,5 +216,156 @@ class CustomOrder(models.Model):
     order_date = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'order_date'], name='custom_order_status_idx'),
+            models.Index(fields=['order_date'], name='custom_order_date_idx'),
+        ]
+
     def __str__(self):
         return f"Order for {self.quantity}x {self.medicine_name} for {self.customer.name}"
+
+
+# --- Reporting rollups (maintained by `manage.py update_sales_rollups`) ---
+
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    invoice_count = models.PositiveIntegerField(default=0)
+    sub_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    taxable_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cgst_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sgst_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    grand_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Returns are counted on the day they were processed
+    return_count = models.PositiveIntegerField(default=0)
+    refund_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    @property
+    def net_total(self):
+        return self.grand_total - self.refund_amount
+
+    def __str__(self):
+        return f"Sales on {self.date}"
+
+class DailyMedicineSales(models.Model):
+    date = models.DateField()
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE)
+    quantity_sold = models.PositiveIntegerField(default=0)
+    # Line amounts (quantity x rate), before invoice-level discount and tax
+    sales_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity_returned = models.PositiveIntegerField(default=0)
+    refund_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'medicine'], name='daily_medicine_sales_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['medicine', 'date'], name='daily_medicine_sales_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.medicine} on {self.date}"
+
+class RollupState(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    # Everything dated before the day of this timestamp is already rolled up,
+    # except invoices changed (updated_at) after it
+    high_water_mark = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+# --- Stock ledger ---
+
+class StockMovement(models.Model):
+    REASON_CHOICES = [
+        ('Opening', 'Opening balance'),
+        ('Sale', 'Sale'),
+        ('Return', 'Customer return'),
+        ('Receipt', 'Stock received'),
+        ('Import', 'Catalog import'),
+        ('Adjustment', 'Adjustment'),
+    ]
+
+    sync_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    medicine = models.ForeignKey(Medicine, related_name='movements', on_delete=models.CASCADE)
+    # Signed: sales are negative, returns and receipts positive
+    quantity = models.IntegerField()
+    reason = models.CharField(max_length=12, choices=REASON_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+    invoice_item = models.ForeignKey(InvoiceItem, on_delete=models.SET_NULL, null=True, blank=True)
+    return_invoice = models.ForeignKey(ReturnInvoice, on_delete=models.SET_NULL, null=True, blank=True)
+    note = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['medicine', 'created_at'], name='stock_movement_medicine_idx'),
+            models.Index(fields=['created_at'], name='stock_movement_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity:+d} x {self.medicine} ({self.reason})"
+
+class StockSnapshot(models.Model):
+    # Stock of every medicine as of `taken_at` (`manage.py snapshot_stock`);
+    # medicines with no stock at that time have no row
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE)
+    taken_at = models.DateTimeField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['taken_at', 'medicine'], name='stock_snapshot_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.medicine} at {self.taken_at}: {self.quantity}"
+
+# --- Outgoing email (drained by `manage.py send_outbox`) ---
+
+class EmailOutbox(models.Model):
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Sent', 'Sent'),
+        ('Failed', 'Failed'),
+    ]
+
+    invoice = models.ForeignKey(Invoice, on_delete=models.SET_NULL, null=True, blank=True)
+    to_email = models.EmailField(max_length=100)
+    subject = models.CharField(max_length=200)
+    html_body = models.TextField()
+    attach_invoice_pdf = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # Earliest time the worker may (re)try; also pushed forward while a
+    # worker holds the message so no other worker picks it up
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='email_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
+
+
+# --- Offline store sync (`manage.py sync_central`) ---
+
+class SyncState(models.Model):
+    # On an offline store, one row per pushed table: everything up to
+    # (last_changed_at, last_id) is on the central database. On the central
+    # database, one row per store ('store:<name>'), locked while it pushes.
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    last_changed_at = models.DateTimeField(null=True, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
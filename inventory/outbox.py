@@ -0,0 +1,164 @@
+# inventory/outbox.py
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .documents import invoice_pdf
+from .models import EmailOutbox, Invoice
+
+MAX_ATTEMPTS = 6
+BASE_DELAY = timedelta(minutes=1)
+MAX_DELAY = timedelta(hours=2)
+
+# How long a worker may hold a claimed message before another worker is
+# allowed to take it over (e.g. after a crash mid-batch)
+LEASE = timedelta(minutes=10)
+
+
+def enqueue_invoice_email(invoice):
+    """
+    Queues the invoice email for the worker; nothing is sent here. The
+    body is rendered now so the mail shows the invoice as it was when the
+    cashier pressed send.
+    """
+    # The body lists every item with its medicine
+    prefetch_related_objects([invoice], 'items__medicine')
+    return EmailOutbox.objects.create(
+        invoice=invoice,
+        to_email=invoice.customer.email,
+        subject=f"Your Invoice #{invoice.id} from Medical Store",
+        html_body=render_to_string('inventory/invoice_email.html', {'invoice': invoice}),
+        attach_invoice_pdf=True,
+    )
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff: 1, 2, 4, 8... minutes after each failed attempt.
+    """
+    return min(BASE_DELAY * 2 ** (attempts - 1), MAX_DELAY)
+
+
+def claim_batch(batch_size, now=None):
+    """
+    Takes up to batch_size due messages and leases them to this worker.
+    Rows locked by another worker are skipped where the database supports it.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = EmailOutbox.objects.filter(status='Pending', next_attempt_at__lte=now).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+        EmailOutbox.objects.filter(id__in=[message.id for message in batch]).update(next_attempt_at=now + LEASE)
+    return batch
+
+
+def build_message(message, smtp):
+    email = EmailMessage(
+        message.subject,
+        message.html_body,
+        settings.EMAIL_HOST_USER or None,
+        [message.to_email],
+        connection=smtp,
+    )
+    email.content_subtype = 'html'
+    if message.attach_invoice_pdf and message.invoice_id:
+        invoice = Invoice.objects.select_related('customer').get(id=message.invoice_id)
+        data, _ = invoice_pdf(invoice)
+        email.attach(f'invoice-{invoice.id}.pdf', data, 'application/pdf')
+    return email
+
+
+def record_failure(message, error, now):
+    message.attempts += 1
+    message.last_error = f'{type(error).__name__}: {error}'[:2000]
+    if message.attempts >= MAX_ATTEMPTS:
+        message.status = 'Failed'
+    else:
+        message.next_attempt_at = now + retry_delay(message.attempts)
+
+
+def deliver(batch):
+    """
+    Sends claimed messages over a single SMTP connection and records the
+    outcome of each. Returns (sent, failed) counts.
+    """
+    sent = failed = 0
+    smtp = get_connection(fail_silently=False)
+    try:
+        smtp.open()
+    except Exception as error:
+        # The server could not be reached; every message waits for a retry
+        now = timezone.now()
+        for message in batch:
+            record_failure(message, error, now)
+        failed = len(batch)
+    else:
+        try:
+            for message in batch:
+                try:
+                    build_message(message, smtp).send()
+                except Exception as error:
+                    record_failure(message, error, timezone.now())
+                    failed += 1
+                else:
+                    message.attempts += 1
+                    message.status = 'Sent'
+                    message.sent_at = timezone.now()
+                    message.last_error = ''
+                    sent += 1
+        finally:
+            smtp.close()
+
+    EmailOutbox.objects.bulk_update(
+        batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'], batch_size=500
+    )
+    return sent, failed
+
+
+def send_batch(batch_size=50):
+    """
+    Delivers one batch of due messages. Returns (sent, failed) counts.
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+    return deliver(batch)
+
+
+def send_due(batch_size=50, seconds=8):
+    """
+    Delivers batches until nothing is due or `seconds` have passed, for a
+    scheduler that calls in every few minutes. Returns (sent, failed).
+    """
+    deadline = time.monotonic() + seconds
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_batch(batch_size)
+        total_sent += sent
+        total_failed += failed
+        if sent + failed < batch_size or time.monotonic() >= deadline:
+            return total_sent, total_failed
+
+
+def send_now(message):
+    """
+    Delivers one queued message straight away, for development setups
+    where nothing runs the outbox (settings.EMAIL_SEND_IMMEDIATELY). A
+    failure is recorded as a worker would, so the message is retried once
+    one runs. Returns True if it was sent.
+    """
+    now = timezone.now()
+    # Leased like a claimed batch, so a worker cannot send it as well
+    claimed = EmailOutbox.objects.filter(id=message.id, status='Pending').update(next_attempt_at=now + LEASE)
+    if not claimed:
+        return False
+    sent, _ = deliver([message])
+    return bool(sent)
@@ -0,0 +1,105 @@
+# inventory/pagination.py
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def encode_cursor(values):
+    """
+    Packs the ordering values of the last row on a page into a URL-safe token.
+    """
+    raw = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """
+    Returns the list of values stored in a cursor token, or None if the token
+    is missing or is not a list of `size` values.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def keyset_filter(fields, values, descending=False):
+    """
+    Builds the "row comes after the cursor" condition for a composite key,
+    e.g. a >= x AND ((a > x) OR (a = x AND b > y)) for fields ['a', 'b'].
+    The redundant leading bound lets the database seek the index instead of
+    evaluating the OR for every row.
+    """
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for position, field in enumerate(fields):
+        term = Q(**{f'{field}__{lookup}': values[position]})
+        for previous, value in zip(fields[:position], values[:position]):
+            term &= Q(**{previous: value})
+        condition |= term
+    return Q(**{f'{fields[0]}__{lookup}e': values[0]}) & condition
+
+
+def cursor_values(model, fields, token):
+    """
+    Decodes a cursor token and converts each value with its field, so the
+    values can be compared with the columns. Returns None if the token is
+    missing or tampered with, including values of the wrong type.
+    """
+    values = decode_cursor(token, len(fields))
+    if values is None:
+        return None
+    try:
+        return [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset.
+    """
+    def __init__(self, items, next_cursor, is_first):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.has_next = next_cursor is not None
+        self.is_first = is_first
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(queryset, fields, cursor=None, page_size=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    Returns a KeysetPage of `queryset` ordered by `fields`.
+
+    Unlike OFFSET pagination, every page is a bounded index range scan that
+    starts right after the previous page's last row, so page 1000 costs the
+    same as page 1. The last field must be unique (normally 'id').
+    """
+    values = cursor_values(queryset.model, fields, cursor)
+    if values is not None:
+        queryset = queryset.filter(keyset_filter(fields, values, descending))
+
+    ordering = [f'-{field}' if descending else field for field in fields]
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, field) for field in fields])
+    return KeysetPage(rows, next_cursor, is_first=values is None)
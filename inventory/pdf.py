@@ -0,0 +1,128 @@
+# inventory/pdf.py
+import zlib
+
+# A small PDF writer for printable documents (invoices, credit notes).
+# It only uses the standard Helvetica fonts every PDF reader ships with, so
+# nothing is embedded and a one-page invoice comes out at a few KB.
+
+PAGE_WIDTH = 595   # A4 in points
+PAGE_HEIGHT = 842
+
+FONTS = {'regular': ('F1', 'Helvetica'), 'bold': ('F2', 'Helvetica-Bold')}
+
+# Advance widths (per 1000 units of font size) of the printable ASCII
+# characters 32..126, from the Adobe core font metrics
+_WIDTHS = {
+    'regular': [
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+        1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+        333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+        556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+    ],
+    'bold': [
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+        975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+        333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+        611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+    ],
+}
+
+
+def text_width(text, size, font='regular'):
+    widths = _WIDTHS[font]
+    units = sum(widths[ord(ch) - 32] if 32 <= ord(ch) <= 126 else 556 for ch in text)
+    return units * size / 1000
+
+
+def fit_text(text, width, size, font='regular'):
+    """
+    Shortens text with an ellipsis so it fits in the given width.
+    """
+    if text_width(text, size, font) <= width:
+        return text
+    while text and text_width(text + '...', size, font) > width:
+        text = text[:-1]
+    return text + '...'
+
+
+def _escape(text):
+    data = text.encode('cp1252', errors='replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class Document:
+    """
+    Collects drawing operations page by page and serialises them with
+    render(). Coordinates are in points from the bottom-left corner.
+    """
+    def __init__(self, title=''):
+        self.title = title
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self.ops = []
+        self.pages.append(self.ops)
+
+    def text(self, x, y, text, size=10, font='regular', align='left'):
+        if align == 'right':
+            x -= text_width(text, size, font)
+        elif align == 'center':
+            x -= text_width(text, size, font) / 2
+        name = FONTS[font][0]
+        self.ops.append(b'BT /%s %.1f Tf %.2f %.2f Td (%s) Tj ET' % (
+            name.encode(), size, x, y, _escape(text),
+        ))
+
+    def line(self, x1, y1, x2, y2, width=0.5, gray=0):
+        self.ops.append(b'%.2f G %.2f w %.2f %.2f m %.2f %.2f l S' % (gray, width, x1, y1, x2, y2))
+
+    def rect(self, x, y, width, height, gray=0.9):
+        self.ops.append(b'%.2f g %.2f %.2f %.2f %.2f re f 0 g' % (gray, x, y, width, height))
+
+    def render(self):
+        # Objects: 1 catalog, 2 page tree, 3-4 fonts, 5 info, then a page
+        # object and a content stream for every page
+        objects = [None] * 5
+        page_ids = []
+        for ops in self.pages:
+            stream = zlib.compress(b'\n'.join(ops))
+            objects.append(
+                b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream)
+            )
+            content_id = len(objects)
+            objects.append(
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+                % (PAGE_WIDTH, PAGE_HEIGHT, content_id)
+            )
+            page_ids.append(len(objects))
+
+        objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+        objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(b'%d 0 R' % page_id for page_id in page_ids), len(page_ids),
+        )
+        for index, (_, base_font) in enumerate(FONTS.values()):
+            objects[2 + index] = (
+                b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>'
+                % base_font.encode()
+            )
+        objects[4] = b'<< /Title (%s) /Producer (Medical Store) >>' % _escape(self.title)
+
+        out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        for offset in offsets:
+            out += b'%010d 00000 n \n' % offset
+        out += b'trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+            len(objects) + 1, xref,
+        )
+        return bytes(out)
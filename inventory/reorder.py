@@ -0,0 +1,176 @@
+# inventory/reorder.py
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DailyMedicineSales, Medicine, Supplier
+from .rollups import update_sales_rollups
+
+# NumPy is only needed here, so it is imported when the engine runs rather
+# than being a hard dependency of the web app (the Vercel bundle is small).
+# It is listed in requirements-tools.txt.
+
+# Rollup rows turned into arrays at a time
+LOAD_CHUNK_SIZE = 20000
+
+
+def require_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('The reorder engine needs NumPy: pip install -r requirements-tools.txt')
+    return numpy
+
+
+class ReorderSettings:
+    window = 365         # days of history loaded
+    short_window = 7     # days in the recent moving average
+    half_life = 28       # days; how fast older history fades from the baseline
+    lead_time = 7        # days between ordering and the stock arriving
+    cover_days = 14      # days of demand an order should cover once it arrives
+    service_z = 1.65     # safety stock in standard deviations (~95% service level)
+
+    def __init__(self, **options):
+        for name, value in options.items():
+            if not hasattr(self, name):
+                raise TypeError(f'Unknown reorder setting: {name}')
+            setattr(self, name, value)
+
+
+# --- Loading ---
+
+def load_demand(window, end=None):
+    """
+    Returns (medicine_ids, supplier_ids, stock, demand) where demand is a
+    (medicines x days) array of units sold net of returns, one column per
+    day, ending with `end` (default: yesterday, the last complete day).
+
+    Daily figures come from DailyMedicineSales, the per-medicine rollup of
+    InvoiceItem and ReturnItem, so this reads one row per medicine and day
+    instead of every invoice line. Bring the rollup up to date first.
+    """
+    np = require_numpy()
+    end = end or timezone.localdate() - timedelta(days=1)
+    first = end - timedelta(days=window - 1)
+
+    catalog = np.array(
+        list(Medicine.objects.order_by('id').values_list('id', 'supplier_id', 'in_stock_total')),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    medicine_ids, supplier_ids, stock = catalog.T
+    # float32 halves the memory of a year of history for a large catalog
+    demand = np.zeros((len(medicine_ids), window), dtype=np.float32)
+
+    # Net units are worked out by the database, and rows are streamed into
+    # the array a chunk at a time, so only one chunk is ever held as tuples.
+    # Medicines added after the catalog was read are left out.
+    rows = (
+        DailyMedicineSales.objects.filter(
+            date__gte=first, date__lte=end, medicine_id__lte=int(medicine_ids.max(initial=0))
+        )
+        .values_list('medicine_id', 'date', F('quantity_sold') - F('quantity_returned'))
+        .iterator(chunk_size=LOAD_CHUNK_SIZE)
+    )
+    while chunk := list(islice(rows, LOAD_CHUNK_SIZE)):
+        ids, days, net = zip(*chunk)
+        # Medicine ids are sorted, so row positions come from one searchsorted
+        row_index = np.searchsorted(medicine_ids, np.array(ids, dtype=np.int64))
+        day_index = np.fromiter((day.toordinal() for day in days), dtype=np.int64, count=len(days)) - first.toordinal()
+        demand[row_index, day_index] = np.array(net, dtype=np.float32)
+
+    # Returns are counted on the day they were processed; one of something
+    # sold on an earlier day must not make that day's demand negative
+    np.clip(demand, 0, None, out=demand)
+    return medicine_ids, supplier_ids, stock, demand
+
+
+# --- Forecast ---
+
+def decay_weights(days, half_life):
+    """
+    Exponentially decaying weights over `days` columns (newest last) that
+    sum to one; a day `half_life` days old counts half as much as today.
+    """
+    np = require_numpy()
+    weights = 0.5 ** (np.arange(days - 1, -1, -1) / half_life)
+    return (weights / weights.sum()).astype(np.float32)
+
+
+def forecast(stock, demand, settings):
+    """
+    Computes demand, days of cover and suggested order quantities for the
+    whole catalog at once. Returns a dict of arrays, one entry per medicine.
+    """
+    np = require_numpy()
+    # Recent moving average, and an exponentially weighted baseline over the
+    # whole history; the baseline and its spread are matrix-vector products,
+    # so the cost grows with the data and not with Python loops
+    short = demand[:, -settings.short_window:].mean(axis=1)
+    weights = decay_weights(demand.shape[1], settings.half_life)
+    baseline = demand @ weights
+    spread = np.sqrt(np.maximum(np.square(demand) @ weights - baseline ** 2, 0))
+    # Recent and baseline demand weigh equally, so a spike raises the order
+    # without one quiet week dropping it to nothing
+    daily = ((short + baseline) / 2).astype(np.float64)
+
+    stock = stock.astype(np.float64)
+    days_of_cover = np.divide(stock, daily, out=np.full(len(stock), np.inf), where=daily > 0)
+    safety = settings.service_z * spread * np.sqrt(settings.lead_time)
+    reorder_point = daily * settings.lead_time + safety
+    target = daily * (settings.lead_time + settings.cover_days) + safety
+    needs_order = (daily > 0) & (stock <= reorder_point)
+    quantity = np.where(needs_order, np.ceil(target - stock), 0).clip(min=0).astype(np.int64)
+    return {
+        'daily_demand': daily,
+        'short_average': short,
+        'baseline': baseline,
+        'days_of_cover': days_of_cover,
+        'reorder_point': reorder_point,
+        'quantity': quantity,
+    }
+
+
+# --- Suggestions ---
+
+def suggest_reorders(settings=None, end=None, update_rollups=False):
+    """
+    Returns draft purchase suggestions grouped by supplier:
+    [(supplier, [line, ...]), ...], most urgent lines first.
+
+    Demand is read from the sales rollup as it stands; update_rollups=True
+    brings it up to date first (incrementally) as part of the call.
+    """
+    np = require_numpy()
+    settings = settings or ReorderSettings()
+    window = max(settings.window, settings.short_window)
+    if update_rollups:
+        update_sales_rollups()
+    medicine_ids, supplier_ids, stock, demand = load_demand(window, end)
+    result = forecast(stock, demand, settings)
+
+    flagged = np.flatnonzero(result['quantity'] > 0)
+    # Only the flagged medicines are turned into Python objects
+    medicines = Medicine.objects.in_bulk(medicine_ids[flagged].tolist())
+    suppliers = Supplier.objects.in_bulk(np.unique(supplier_ids[flagged]).tolist())
+
+    grouped = defaultdict(list)
+    for index in flagged[np.argsort(result['days_of_cover'][flagged], kind='stable')]:
+        medicine = medicines.get(int(medicine_ids[index]))
+        if medicine is None:
+            # Deleted since the demand was loaded
+            continue
+        grouped[int(supplier_ids[index])].append({
+            'medicine': medicine,
+            'in_stock': int(stock[index]),
+            'daily_demand': float(result['daily_demand'][index]),
+            'days_of_cover': float(result['days_of_cover'][index]),
+            'quantity': int(result['quantity'][index]),
+            'value': medicine.mrp * int(result['quantity'][index]),
+        })
+    return sorted(
+        ((suppliers[supplier_id], lines) for supplier_id, lines in grouped.items() if supplier_id in suppliers),
+        key=lambda group: group[1][0]['days_of_cover'],
+    )
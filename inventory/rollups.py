@@ -0,0 +1,182 @@
+# inventory/rollups.py
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    DailyMedicineSales, DailySales, Invoice, InvoiceItem, ReturnInvoice, ReturnItem, RollupState,
+)
+
+STATE_NAME = 'sales'
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+INVOICE_SUMS = ['sub_total', 'discount_amount', 'taxable_total', 'cgst_amount', 'sgst_amount', 'grand_total']
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def first_activity_day():
+    first_invoice = Invoice.objects.aggregate(first=Min('invoice_date'))['first']
+    first_return = ReturnInvoice.objects.aggregate(first=Min('return_date'))['first']
+    dates = [value for value in (first_invoice, first_return) if value is not None]
+    return timezone.localdate(min(dates)) if dates else None
+
+
+def changed_days(since, state):
+    """
+    Days before `since` with invoices that changed after the last run: an
+    older bill that was still receiving items or got a discount. Changing
+    an invoice's lines or totals always saves its updated_at.
+    """
+    if state.high_water_mark is None:
+        return []
+    return sorted(
+        Invoice.objects.filter(updated_at__gte=state.high_water_mark, invoice_date__lt=start_of_day(since))
+        .annotate(day=TruncDate('invoice_date'))
+        .values_list('day', flat=True)
+        .distinct()
+    )
+
+
+def days_filter(field, since, days):
+    """
+    Matches `field` on or after `since`, or within any of `days`.
+    """
+    condition = Q(**{f'{field}__gte': start_of_day(since)})
+    for day in days:
+        condition |= Q(**{f'{field}__gte': start_of_day(day), f'{field}__lt': start_of_day(day + timedelta(days=1))})
+    return condition
+
+
+def update_sales_rollups(since=None, rebuild=False):
+    """
+    Brings DailySales and DailyMedicineSales up to date.
+
+    Only days from the high-water mark's day onwards are re-aggregated, plus
+    any earlier day with an invoice that changed since the last run. The
+    high-water mark's day is redone in full because invoices dated on it may
+    still have been receiving items. Returns (first_day, days_written), or
+    (None, 0) if there is nothing to roll up.
+    """
+    run_started = timezone.now()
+    state, _ = RollupState.objects.get_or_create(name=STATE_NAME)
+
+    if since is None and not rebuild and state.high_water_mark is not None:
+        since = timezone.localdate(state.high_water_mark)
+    if since is None:
+        since = first_activity_day()
+    if since is None:
+        return None, 0
+
+    extra_days = [] if rebuild else changed_days(since, state)
+    daily = defaultdict(dict)
+    per_medicine = defaultdict(dict)
+
+    # Invoice totals per day
+    invoice_days = (
+        Invoice.objects.filter(days_filter('invoice_date', since, extra_days))
+        .annotate(day=TruncDate('invoice_date'))
+        .values('day')
+        .annotate(invoice_count=Count('id'), **{field: Sum(field) for field in INVOICE_SUMS})
+    )
+    for row in invoice_days:
+        daily[row.pop('day')].update(row)
+
+    # Refunds per day, counted on the day of the return
+    return_days = (
+        ReturnInvoice.objects.filter(days_filter('return_date', since, extra_days))
+        .annotate(day=TruncDate('return_date'))
+        .values('day')
+        .annotate(return_count=Count('id'), refund_amount=Sum('total_refund_amount'))
+    )
+    for row in return_days:
+        daily[row.pop('day')].update(row)
+
+    # Units and line amounts per medicine per day
+    sold = (
+        InvoiceItem.objects.filter(days_filter('invoice__invoice_date', since, extra_days))
+        .annotate(day=TruncDate('invoice__invoice_date'))
+        .values('day', 'medicine_id')
+        .annotate(
+            quantity_sold=Sum('quantity'),
+            sales_amount=Sum(F('quantity') * F('rate'), output_field=MONEY),
+        )
+    )
+    for row in sold:
+        per_medicine[(row.pop('day'), row.pop('medicine_id'))].update(row)
+
+    returned = (
+        ReturnItem.objects.filter(days_filter('return_invoice__return_date', since, extra_days))
+        .annotate(day=TruncDate('return_invoice__return_date'))
+        .values('day', 'medicine_id')
+        .annotate(
+            quantity_returned=Sum('quantity'),
+            refund_amount=Sum(F('quantity') * F('rate'), output_field=MONEY),
+        )
+    )
+    for row in returned:
+        per_medicine[(row.pop('day'), row.pop('medicine_id'))].update(row)
+
+    with transaction.atomic():
+        redone = Q(date__gte=since) | Q(date__in=extra_days)
+        DailySales.objects.filter(redone).delete()
+        DailyMedicineSales.objects.filter(redone).delete()
+        DailySales.objects.bulk_create(
+            [DailySales(date=day, **_clean(values)) for day, values in sorted(daily.items())],
+            batch_size=1000,
+        )
+        DailyMedicineSales.objects.bulk_create(
+            [
+                DailyMedicineSales(date=day, medicine_id=medicine_id, **_clean(values))
+                for (day, medicine_id), values in sorted(per_medicine.items())
+            ],
+            batch_size=1000,
+        )
+        state.high_water_mark = run_started
+        state.save(update_fields=['high_water_mark'])
+    return min([since] + extra_days), len(daily)
+
+
+def _clean(values):
+    # SUM() over no rows is NULL; the rollup columns default to zero instead
+    return {key: value for key, value in values.items() if value is not None}
+
+
+def month_report(first_day, last_day):
+    """
+    Reads a period's figures from the rollup tables only.
+    """
+    days = DailySales.objects.filter(date__gte=first_day, date__lte=last_day).order_by('date')
+    totals = days.aggregate(
+        invoice_count=Sum('invoice_count'),
+        grand_total=Sum('grand_total'),
+        cgst_amount=Sum('cgst_amount'),
+        sgst_amount=Sum('sgst_amount'),
+        refund_amount=Sum('refund_amount'),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    totals['net_total'] = totals['grand_total'] - totals['refund_amount']
+
+    top_medicines = (
+        DailyMedicineSales.objects.filter(date__gte=first_day, date__lte=last_day)
+        .values('medicine_id', 'medicine__name')
+        .annotate(
+            quantity_sold=Sum('quantity_sold'),
+            quantity_returned=Sum('quantity_returned'),
+            sales_amount=Sum('sales_amount'),
+            refund_amount=Sum('refund_amount'),
+        )
+        .order_by('-quantity_sold')[:20]
+    )
+    return {'days': days, 'totals': totals, 'top_medicines': top_medicines}
+
+
+def last_updated():
+    return RollupState.objects.filter(name=STATE_NAME).values_list('high_water_mark', flat=True).first()
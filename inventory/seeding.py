@@ -0,0 +1,207 @@
+# inventory/seeding.py
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import kpis
+from .models import (
+    CustomOrder, Customer, Invoice, InvoiceItem, Medicine, MedicineBarcode, ReturnInvoice, ReturnItem, StockMovement,
+    Supplier,
+    normalize_name,
+)
+from .rollups import update_sales_rollups
+from .signals import after_commit, catalog_changed
+from .totals import apply_sub_total
+
+# Synthetic data for benchmarks. Everything is written with bulk_create in
+# batches, and stock, the stock ledger and invoice totals are kept consistent
+# with the line items, so the reconcile commands have nothing to fix.
+
+# Rows written at scale 1; every volume grows linearly with the scale
+BASE_VOLUMES = {
+    'suppliers': 20,
+    'medicines': 500,
+    'customers': 300,
+    'invoices': 2000,
+    'returns': 40,
+    'custom_orders': 100,
+}
+
+MAX_ITEMS_PER_INVOICE = 6
+BATCH_SIZE = 2000
+
+PREFIXES = ['Para', 'Amo', 'Cet', 'Azi', 'Met', 'Pan', 'Ome', 'Dol', 'Ibu', 'Lev']
+SUFFIXES = ['cetamol', 'xicillin', 'irizine', 'thromycin', 'formin', 'toprazole', 'prazole', 'o', 'profen', 'ocetirizine']
+FORMS = ['Tablet', 'Capsule', 'Syrup', 'Drops', 'Injection']
+FIRST_NAMES = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rahul', 'Meera']
+LAST_NAMES = ['Sharma', 'Verma', 'Patel', 'Gupta', 'Singh', 'Joshi', 'Yadav', 'Mehta', 'Rao', 'Nair']
+
+
+def volumes(scale=1, **overrides):
+    """
+    Row counts for a given scale; any count can be overridden.
+    """
+    counts = {key: max(1, round(count * scale)) for key, count in BASE_VOLUMES.items()}
+    counts.update({key: value for key, value in overrides.items() if value is not None})
+    return counts
+
+
+def _batches(rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+def seed(counts, days=365, random_seed=0):
+    """
+    Inserts synthetic suppliers, medicines, customers, invoices with their
+    items, returns and custom orders in the given volumes (see volumes()).
+    Invoices are spread evenly over the last `days` days. Returns the number
+    of rows written per model.
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    start = now - timedelta(days=days)
+    with transaction.atomic():
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(name=f'Bench Supplier {n}', contact_person='Bench', phone_number='0000000000', address='-')
+            for n in range(counts['suppliers'])
+        ])
+
+        medicines = []
+        for n in range(counts['medicines']):
+            name = f'{rng.choice(PREFIXES)}{rng.choice(SUFFIXES)} {rng.randint(5, 1000)}mg {rng.choice(FORMS)} {n}'
+            medicines.append(Medicine(
+                name=name,
+                name_normalized=normalize_name(name),
+                description='',
+                supplier=rng.choice(suppliers),
+                in_stock_total=rng.randint(200, 2000),
+                mrp=Decimal(rng.randint(100, 50000)) / 100,
+            ))
+        medicines = Medicine.objects.bulk_create(medicines, batch_size=BATCH_SIZE)
+        StockMovement.objects.bulk_create(
+            [StockMovement(medicine=medicine, quantity=medicine.in_stock_total, reason='Opening', created_at=start)
+             for medicine in medicines],
+            batch_size=BATCH_SIZE,
+        )
+        # One code per medicine; ids keep them unique across runs
+        MedicineBarcode.objects.bulk_create(
+            [MedicineBarcode(medicine=medicine, code=f'BENCH{medicine.id:08d}') for medicine in medicines],
+            batch_size=BATCH_SIZE,
+        )
+
+        # Phone numbers are unique; numbers past the highest customer id
+        # cannot clash with an earlier run
+        offset = Customer.objects.aggregate(last=Max('id'))['last'] or 0
+        customers = []
+        for n in range(counts['customers']):
+            name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {n}'
+            customers.append(Customer(
+                name=name,
+                name_normalized=normalize_name(name),
+                phone_number=f'0{offset + n + 1:09d}',
+                email=f'bench{offset + n + 1}@example.com' if n % 3 else None,
+                is_active=n % 10 != 0,
+            ))
+        customers = Customer.objects.bulk_create(customers, batch_size=BATCH_SIZE)
+
+        sold_items = []
+        item_count = 0
+        step = timedelta(days=days) / max(counts['invoices'], 1)
+        invoice_dates = [start + step * n for n in range(counts['invoices'])]
+        for dates in _batches(invoice_dates):
+            batch_items = _seed_invoices(rng, dates, customers, medicines)
+            item_count += len(batch_items)
+            sold_items.extend(rng.sample(batch_items, min(len(batch_items), counts['returns'])))
+
+        return_count = _seed_returns(rng, rng.sample(sold_items, min(len(sold_items), counts['returns'])), now)
+
+        CustomOrder.objects.bulk_create([
+            CustomOrder(
+                customer=rng.choice(customers),
+                supplier=rng.choice(suppliers),
+                medicine_name=f'Special order {n}',
+                quantity=rng.randint(1, 10),
+                status=rng.choice(CustomOrder.STATUS_CHOICES)[0],
+            )
+            for n in range(counts['custom_orders'])
+        ], batch_size=BATCH_SIZE)
+
+        # Stock was tracked on the instances while items were generated
+        Medicine.objects.bulk_update(medicines, ['in_stock_total'], batch_size=500)
+        update_sales_rollups(since=timezone.localdate(start))
+        catalog_changed.send(sender=Medicine)
+        after_commit(kpis.rebuild)
+
+    return {
+        'suppliers': len(suppliers),
+        'medicines': len(medicines),
+        'customers': len(customers),
+        'invoices': len(invoice_dates),
+        'items': item_count,
+        'returns': return_count,
+        'custom_orders': counts['custom_orders'],
+    }
+
+
+def _seed_invoices(rng, dates, customers, medicines):
+    invoices = []
+    lines = []
+    for invoice_date in dates:
+        invoice = Invoice(
+            customer=rng.choice(customers),
+            invoice_date=invoice_date,
+            discount_percentage=Decimal(rng.choice([0, 0, 0, 0, 5, 10])),
+        )
+        sub_total = Decimal('0.00')
+        for medicine in rng.sample(medicines, min(len(medicines), rng.randint(1, MAX_ITEMS_PER_INVOICE))):
+            quantity = rng.randint(1, 3)
+            if medicine.in_stock_total < quantity:
+                continue
+            medicine.in_stock_total -= quantity
+            lines.append((invoice, medicine, quantity))
+            sub_total += medicine.mrp * quantity
+        apply_sub_total(invoice, sub_total)
+        invoices.append(invoice)
+    Invoice.objects.bulk_create(invoices)
+
+    items = InvoiceItem.objects.bulk_create([
+        InvoiceItem(invoice=invoice, medicine=medicine, quantity=quantity, rate=medicine.mrp)
+        for invoice, medicine, quantity in lines
+    ])
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            medicine=item.medicine, quantity=-item.quantity, reason='Sale', invoice_item=item,
+            created_at=item.invoice.invoice_date,
+        )
+        for item in items
+    ])
+    return items
+
+
+def _seed_returns(rng, items, now):
+    """
+    Returns one unit of each given line a few days after the sale.
+    """
+    returns = []
+    for item in items:
+        return_date = min(item.invoice.invoice_date + timedelta(days=rng.randint(0, 5)), now)
+        returns.append(ReturnInvoice(original_invoice=item.invoice, return_date=return_date, total_refund_amount=item.rate))
+    returns = ReturnInvoice.objects.bulk_create(returns, batch_size=BATCH_SIZE)
+    ReturnItem.objects.bulk_create(
+        [ReturnItem(return_invoice=ret, medicine=item.medicine, quantity=1, rate=item.rate)
+         for ret, item in zip(returns, items)],
+        batch_size=BATCH_SIZE,
+    )
+    StockMovement.objects.bulk_create(
+        [StockMovement(medicine=item.medicine, quantity=1, reason='Return', return_invoice=ret, created_at=ret.return_date)
+         for ret, item in zip(returns, items)],
+        batch_size=BATCH_SIZE,
+    )
+    for item in items:
+        item.medicine.in_stock_total += 1
+    return len(returns)
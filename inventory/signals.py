@@ -0,0 +1,190 @@
+# inventory/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import documents, fragments, history, kpis
+from .autocomplete import medicine_index
+from .barcodes import barcode_cache
+from .models import CustomOrder, Customer, Invoice, Medicine, MedicineBarcode, ReturnInvoice, Supplier
+
+# Sent with `medicine_ids` after stock is changed through queryset.update(),
+# which bypasses post_save, and with `levels`, {medicine_id: (stock before,
+# stock after)}, when the sender read them anyway
+stock_changed = Signal()
+
+# Sent with `invoice` and `grand_total_delta` whenever a line or discount
+# changes an invoice's stored totals
+invoice_totals_changed = Signal()
+
+# Sent after bulk writes to Medicine or Supplier (e.g. a catalog import)
+# that bypass post_save altogether
+catalog_changed = Signal()
+
+
+def after_commit(func):
+    """
+    Runs a cache or counter update once the change is committed, so a
+    rolled-back sale never shows up in them. A failing update is logged
+    rather than raised: the change itself is already committed, and an error
+    here would make the caller report (and retry) it as failed.
+    """
+    transaction.on_commit(func, robust=True)
+
+
+# --- Fragment cache versions ---
+# Cached list fragments include the version of every model they show, so a
+# bump makes them re-render on the next request. Stock is filled in when a
+# fragment is served ({% live_stock %}), so stock changes bump nothing
+
+FRAGMENT_MODELS = [Medicine, Supplier, Customer, CustomOrder]
+
+
+def fragment_model_changed(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'in_stock_total'}:
+        return
+    model_name = sender._meta.model_name
+    after_commit(lambda: fragments.bump(model_name))
+
+
+for model in FRAGMENT_MODELS:
+    post_save.connect(fragment_model_changed, sender=model)
+    post_delete.connect(fragment_model_changed, sender=model)
+
+
+@receiver(catalog_changed)
+def fragment_catalog_changed(sender, **kwargs):
+    after_commit(lambda: fragments.bump('medicine', 'supplier'))
+
+
+# --- Barcode lookups ---
+# Scans cache the medicine id and name; stock is always read at sale time
+
+def barcodes_changed(sender, **kwargs):
+    after_commit(barcode_cache.invalidate)
+
+
+for model in [MedicineBarcode, Medicine]:
+    post_save.connect(barcodes_changed, sender=model)
+    post_delete.connect(barcodes_changed, sender=model)
+catalog_changed.connect(barcodes_changed)
+
+
+# --- Customer purchase history ---
+# Lines and discounts save the invoice's totals, so post_save covers them
+
+def history_invoice_changed(sender, instance, **kwargs):
+    customer_id = instance.customer_id
+    after_commit(lambda: history.invalidate(customer_id))
+
+
+def history_return_changed(sender, instance, **kwargs):
+    invoice_id = instance.original_invoice_id
+    after_commit(lambda: history.invalidate_for_invoice(invoice_id))
+
+
+post_save.connect(history_invoice_changed, sender=Invoice)
+post_delete.connect(history_invoice_changed, sender=Invoice)
+post_save.connect(history_return_changed, sender=ReturnInvoice)
+post_delete.connect(history_return_changed, sender=ReturnInvoice)
+
+
+# --- Counters and the search index ---
+
+@receiver(post_save, sender=Medicine)
+def medicine_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Stock-only saves are not catalog changes: other processes keep their index
+    if update_fields is None or set(update_fields) - {'in_stock_total'}:
+        after_commit(lambda: medicine_index.upsert([instance]))
+    else:
+        after_commit(lambda: medicine_index.set_stock({instance.id: instance.in_stock_total}))
+    if created:
+        after_commit(lambda: kpis.adjust(kpis.MEDICINES, 1))
+    after_commit(lambda: kpis.invalidate(kpis.LOW_STOCK))
+
+
+@receiver(post_delete, sender=Medicine)
+def medicine_deleted(sender, instance, **kwargs):
+    medicine_id = instance.id
+    after_commit(lambda: medicine_index.remove([medicine_id]))
+    after_commit(lambda: kpis.adjust(kpis.MEDICINES, -1))
+    after_commit(lambda: kpis.invalidate(kpis.LOW_STOCK))
+
+
+@receiver(stock_changed)
+def medicine_stock_changed(sender, medicine_ids, levels=None, **kwargs):
+    if levels is None:
+        medicine_ids = list(medicine_ids)
+        after_commit(lambda: medicine_index.refresh_stock(medicine_ids))
+        after_commit(lambda: kpis.invalidate(kpis.LOW_STOCK))
+        return
+    after_commit(lambda: medicine_index.set_stock({medicine_id: after for medicine_id, (_, after) in levels.items()}))
+    # Most sales leave the count alone: only rows crossing the threshold move it
+    delta = kpis.low_stock_delta(levels.values())
+    after_commit(lambda: kpis.adjust(kpis.LOW_STOCK, delta))
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance, created, **kwargs):
+    if created and instance.is_active:
+        after_commit(lambda: kpis.adjust(kpis.CUSTOMERS, 1))
+    elif not created:
+        # Deactivation and reactivation are plain saves; recount next time
+        after_commit(lambda: kpis.invalidate(kpis.CUSTOMERS))
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    after_commit(lambda: kpis.invalidate(kpis.CUSTOMERS))
+
+
+@receiver(post_save, sender=Supplier)
+def supplier_saved(sender, instance, created, **kwargs):
+    if created:
+        after_commit(lambda: kpis.adjust(kpis.SUPPLIERS, 1))
+
+
+@receiver(post_delete, sender=Supplier)
+def supplier_deleted(sender, instance, **kwargs):
+    after_commit(lambda: kpis.adjust(kpis.SUPPLIERS, -1))
+
+
+@receiver(post_save, sender=Invoice)
+def invoice_saved(sender, instance, created, **kwargs):
+    if created:
+        day = timezone.localdate(instance.invoice_date)
+        after_commit(lambda: kpis.adjust(kpis.invoices_key(day), 1))
+
+
+@receiver(post_delete, sender=Invoice)
+def invoice_deleted(sender, instance, **kwargs):
+    day = timezone.localdate(instance.invoice_date)
+    invoice_id = instance.id
+    after_commit(lambda: kpis.invalidate(kpis.sales_key(day), kpis.invoices_key(day)))
+    after_commit(lambda: documents.discard('invoice', invoice_id))
+
+
+@receiver(invoice_totals_changed)
+def invoice_total_changed(sender, invoice, grand_total_delta, **kwargs):
+    day = timezone.localdate(invoice.invoice_date)
+    paise = int(grand_total_delta * 100)
+    after_commit(lambda: kpis.adjust(kpis.sales_key(day), paise))
+    # The cached PDF would not be served again anyway (its key is a hash of
+    # the contents); this just frees the disk space early
+    after_commit(lambda: documents.discard('invoice', invoice.id))
+
+
+@receiver(post_save, sender=ReturnInvoice)
+def return_saved(sender, instance, **kwargs):
+    # The invoice PDF lists its credit notes
+    invoice_id = instance.original_invoice_id
+    return_id = instance.id
+    after_commit(lambda: documents.discard('invoice', invoice_id))
+    after_commit(lambda: documents.discard('return', return_id))
+
+
+@receiver(catalog_changed)
+def catalog_bulk_changed(sender, **kwargs):
+    after_commit(medicine_index.invalidate)
+    after_commit(lambda: kpis.invalidate(kpis.MEDICINES, kpis.SUPPLIERS, kpis.LOW_STOCK))
@@ -0,0 +1,218 @@
+# inventory/stock.py
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Sum, Value, When
+
+from .models import Invoice, InvoiceItem, Medicine, ReturnInvoice, ReturnItem, StockMovement
+from .signals import stock_changed
+from .totals import add_to_invoice, lock_invoice, save_new_invoice
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+class ReturnExceedsSale(Exception):
+    pass
+
+
+def sell_medicine(invoice_id, medicine_id, quantity):
+    """
+    Adds a line to an invoice and takes the quantity out of stock.
+
+    The stock check and the decrement are one conditional UPDATE, so two
+    counters selling the same medicine can never oversell it, and only the
+    stock column is written. The line, the ledger entry and the invoice
+    totals are saved in the same transaction.
+    """
+    with transaction.atomic():
+        updated = Medicine.objects.filter(
+            pk=medicine_id, in_stock_total__gte=quantity
+        ).update(in_stock_total=F('in_stock_total') - quantity)
+        if not updated:
+            raise InsufficientStock(medicine_id)
+
+        # The row is locked by the UPDATE above until we commit
+        rate, stock = Medicine.objects.values_list('mrp', 'in_stock_total').get(pk=medicine_id)
+        item = InvoiceItem.objects.create(
+            invoice_id=invoice_id,
+            medicine_id=medicine_id,
+            quantity=quantity,
+            rate=rate,
+        )
+        StockMovement.objects.create(medicine_id=medicine_id, quantity=-quantity, reason='Sale', invoice_item=item)
+        add_to_invoice(invoice_id, rate * quantity)
+        stock_changed.send(sender=Medicine, medicine_ids=[medicine_id], levels={medicine_id: (stock + quantity, stock)})
+    return item
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=medicine_id, then=Value(quantity)) for medicine_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def create_sale(customer_id, quantities, discount_percentage=Decimal('0.00')):
+    """
+    Creates a finished invoice from {medicine_id: quantity} in one
+    transaction and a fixed number of queries, however many lines it has.
+
+    Stock for every line is checked and taken with a single conditional
+    UPDATE: it only touches rows that still have enough stock, so if fewer
+    rows changed than there are medicines, another counter got there first
+    and the whole sale is rolled back. Raises Medicine.DoesNotExist for an
+    unknown medicine and InsufficientStock with the ids that are short.
+    """
+    try:
+        with transaction.atomic():
+            enough = Q()
+            for medicine_id, quantity in quantities.items():
+                enough |= Q(pk=medicine_id, in_stock_total__gte=quantity)
+            updated = Medicine.objects.filter(enough).update(in_stock_total=F('in_stock_total') - _quantity_case(quantities))
+            if updated != len(quantities):
+                raise InsufficientStock()
+            # The rows are locked by the UPDATE above until we commit
+            rates = {}
+            levels = {}
+            rows = Medicine.objects.filter(pk__in=quantities).values_list('id', 'mrp', 'in_stock_total')
+            for medicine_id, mrp, stock in rows:
+                rates[medicine_id] = mrp
+                levels[medicine_id] = (stock + quantities[medicine_id], stock)
+
+            invoice = save_new_invoice(
+                Invoice(customer_id=customer_id, discount_percentage=discount_percentage),
+                sum((rates[medicine_id] * quantity for medicine_id, quantity in quantities.items()), Decimal('0.00')),
+            )
+            items = InvoiceItem.objects.bulk_create([
+                InvoiceItem(invoice=invoice, medicine_id=medicine_id, quantity=quantity, rate=rates[medicine_id])
+                for medicine_id, quantity in quantities.items()
+            ])
+            StockMovement.objects.bulk_create([
+                StockMovement(medicine_id=item.medicine_id, quantity=-item.quantity, reason='Sale', invoice_item=item)
+                for item in items
+            ])
+            stock_changed.send(sender=Medicine, medicine_ids=list(quantities), levels=levels)
+    except InsufficientStock:
+        # Rolled back; read stock again to report unknown or short lines
+        stock = dict(Medicine.objects.filter(pk__in=quantities).values_list('id', 'in_stock_total'))
+        unknown = [medicine_id for medicine_id in quantities if medicine_id not in stock]
+        if unknown:
+            raise Medicine.DoesNotExist(f'Unknown medicine id(s): {", ".join(map(str, unknown))}')
+        raise InsufficientStock(*[medicine_id for medicine_id, available in stock.items() if available < quantities[medicine_id]])
+    return invoice, items
+
+
+def increment_stock(quantities):
+    """
+    Adds {medicine_id: quantity} to stock with a single UPDATE ... CASE.
+    """
+    if not quantities:
+        return
+    Medicine.objects.filter(pk__in=quantities).update(in_stock_total=F('in_stock_total') + _quantity_case(quantities))
+
+
+def receive_stock(medicine_id, quantity, reason='Receipt', note=''):
+    """
+    Adds delivered stock and records it in the ledger. The increment is
+    applied in SQL so it cannot overwrite a sale made at the same moment.
+    """
+    with transaction.atomic():
+        Medicine.objects.filter(pk=medicine_id).update(in_stock_total=F('in_stock_total') + quantity)
+        # Locked by the UPDATE above until we commit
+        stock = Medicine.objects.values_list('in_stock_total', flat=True).get(pk=medicine_id)
+        StockMovement.objects.create(medicine_id=medicine_id, quantity=quantity, reason=reason, note=note)
+        stock_changed.send(sender=Medicine, medicine_ids=[medicine_id], levels={medicine_id: (stock - quantity, stock)})
+
+
+def record_opening_balance(medicine):
+    """
+    Starts the ledger of a newly created medicine with its initial stock.
+    Call it in the transaction that created the medicine.
+    """
+    if medicine.in_stock_total:
+        StockMovement.objects.create(medicine=medicine, quantity=medicine.in_stock_total, reason='Opening')
+
+
+def return_invoice_items(invoice_id, quantities):
+    """
+    Records a return of {invoice_item_id: quantity} against an invoice and
+    puts the stock back, all in one transaction.
+
+    A medicine can only be returned up to what was sold on the invoice less
+    what earlier returns already took back; asking for more raises
+    ReturnExceedsSale and records nothing. Locks are taken in the same order
+    as a sale, medicines then the invoice, so a return and a sale on the
+    same bill cannot deadlock.
+
+    The number of queries does not depend on how many lines are returned:
+    the items are read once, the ReturnItems are bulk-inserted and every
+    stock increment goes out in one UPDATE. Returns the ReturnInvoice, or
+    None if nothing was returned.
+    """
+    with transaction.atomic():
+        # Lines are never changed once sold, so they can be read before locking
+        items = list(InvoiceItem.objects.filter(invoice_id=invoice_id).only('id', 'medicine_id', 'quantity', 'rate'))
+        requested = {item.id: quantities[item.id] for item in items if quantities.get(item.id, 0) > 0}
+        if not requested:
+            return None
+        medicine_ids = {item.medicine_id for item in items if item.id in requested}
+        locked = Medicine.objects.select_for_update().filter(pk__in=medicine_ids).order_by('pk')
+        stock = dict(locked.values_list('pk', 'in_stock_total'))
+        lock_invoice(invoice_id)
+
+        # What is left to return of each medicine on this invoice
+        remaining = {}
+        for item in items:
+            if item.medicine_id in medicine_ids:
+                remaining[item.medicine_id] = remaining.get(item.medicine_id, 0) + item.quantity
+        returned = (
+            ReturnItem.objects.filter(return_invoice__original_invoice_id=invoice_id, medicine_id__in=medicine_ids)
+            .values_list('medicine_id')
+            .annotate(total=Sum('quantity'))
+        )
+        for medicine_id, total in returned:
+            remaining[medicine_id] -= total
+
+        lines = []
+        increments = {}
+        total_refund = Decimal('0.00')
+        for item in items:
+            quantity = requested.get(item.id)
+            if quantity is None:
+                continue
+            lines.append(ReturnItem(medicine_id=item.medicine_id, quantity=quantity, rate=item.rate))
+            increments[item.medicine_id] = increments.get(item.medicine_id, 0) + quantity
+            total_refund += item.rate * quantity # Use the original sale price for the refund
+
+        over = [
+            item.id for item in items
+            if item.id in requested
+            and (requested[item.id] > item.quantity or increments[item.medicine_id] > remaining[item.medicine_id])
+        ]
+        if over:
+            raise ReturnExceedsSale(*over)
+
+        return_invoice = ReturnInvoice.objects.create(
+            original_invoice_id=invoice_id,
+            total_refund_amount=total_refund,
+        )
+        for line in lines:
+            line.return_invoice = return_invoice
+        ReturnItem.objects.bulk_create(lines)
+        increment_stock(increments)
+        StockMovement.objects.bulk_create([
+            StockMovement(medicine_id=medicine_id, quantity=quantity, reason='Return', return_invoice=return_invoice)
+            for medicine_id, quantity in increments.items()
+        ])
+        stock_changed.send(
+            sender=Medicine,
+            medicine_ids=list(increments),
+            levels={
+                medicine_id: (stock[medicine_id], stock[medicine_id] + quantity)
+                for medicine_id, quantity in increments.items()
+            },
+        )
+    return return_invoice
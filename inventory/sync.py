@@ -0,0 +1,379 @@
+# inventory/sync.py
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import fragments, kpis
+from .models import (
+    Customer, Invoice, InvoiceItem, Medicine, MedicineBarcode, ReturnInvoice, ReturnItem, StockMovement, Supplier,
+    SyncState,
+)
+from .autocomplete import bump_version
+from .signals import after_commit, catalog_changed
+from .totals import TOTAL_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Pushes what an offline store (settings.OFFLINE_STORE) recorded to the
+# central database, and pulls the catalog and customers from it.
+#
+# Bills, returns and stock movements are identified by their sync_id on
+# both sides; the central database gives them its own ids. Every table is
+# sent in batches, each committed on the central database in one
+# transaction, and a SyncState row per table keeps the position of the last
+# committed batch. If the connection drops before the position is saved,
+# the batch is sent again and the rows the central database already has are
+# left alone, so stock is never moved twice.
+#
+# Writes to the SQLite store are serialized, so ids (and invoices'
+# updated_at) grow in the order rows were committed and a position never
+# skips a row that was still being written.
+
+CENTRAL = 'central'
+
+# The central site's caches, when settings.CACHES can reach them
+CENTRAL_CACHE = 'central'
+CENTRAL_FRAGMENT_CACHE = 'central_fragments'
+
+BATCH_SIZE = 500
+
+INVOICE_FIELDS = ['invoice_date', 'discount_percentage', 'cgst_percentage', 'sgst_percentage'] + TOTAL_FIELDS
+
+# Rows that are only ever inserted, parents first:
+# (state name, model, columns copied as they are, foreign keys to synced models)
+TABLES = [
+    ('invoice_items', InvoiceItem, ['medicine_id', 'quantity', 'rate'], {'invoice': Invoice}),
+    ('returns', ReturnInvoice, ['return_date', 'total_refund_amount'], {'original_invoice': Invoice}),
+    ('return_items', ReturnItem, ['medicine_id', 'quantity', 'rate'], {'return_invoice': ReturnInvoice}),
+    (
+        'stock_movements', StockMovement, ['medicine_id', 'quantity', 'reason', 'created_at', 'note'],
+        {'invoice_item': InvoiceItem, 'return_invoice': ReturnInvoice},
+    ),
+]
+
+CUSTOMER_FIELDS = ['name', 'name_normalized', 'phone_number', 'email', 'address', 'is_active']
+
+
+class SyncError(Exception):
+    pass
+
+
+def _state(name):
+    state, _ = SyncState.objects.get_or_create(name=name)
+    return state
+
+
+def _advance(state, last_id, last_changed_at=None):
+    state.last_id = last_id
+    state.last_changed_at = last_changed_at
+    state.synced_at = timezone.now()
+    state.save(update_fields=['last_id', 'last_changed_at', 'synced_at'])
+
+
+def _lock_store(central):
+    """
+    Serializes pushes from this store, so two runs can never both decide a
+    row is new. Must be called inside a transaction on `central`.
+    """
+    store, _ = SyncState.objects.using(central).select_for_update().get_or_create(
+        name=f'store:{settings.OFFLINE_STORE_NAME}'
+    )
+    store.synced_at = timezone.now()
+    store.save(update_fields=['synced_at'])
+
+
+def _central_ids(model, sync_ids, central):
+    return dict(model.objects.using(central).filter(sync_id__in=sync_ids).values_list('sync_id', 'id'))
+
+
+def _central_customers(customer_ids, central):
+    """
+    Maps local customer ids to central ones by phone number, adding the
+    customers the central database does not know yet.
+    """
+    local = {row['id']: row for row in Customer.objects.filter(id__in=customer_ids).values('id', *CUSTOMER_FIELDS)}
+    phones = {row['phone_number'] for row in local.values()}
+    known = dict(Customer.objects.using(central).filter(phone_number__in=phones).values_list('phone_number', 'id'))
+    missing = [row for row in local.values() if row['phone_number'] not in known]
+    if missing:
+        Customer.objects.using(central).bulk_create(
+            [Customer(**{field: row[field] for field in CUSTOMER_FIELDS}) for row in missing], ignore_conflicts=True
+        )
+        known = dict(Customer.objects.using(central).filter(phone_number__in=phones).values_list('phone_number', 'id'))
+    return {customer_id: known[row['phone_number']] for customer_id, row in local.items()}
+
+
+def _pending_invoices(state):
+    pending = Invoice.objects.order_by('updated_at', 'id')
+    if state.last_changed_at is not None:
+        pending = pending.filter(
+            Q(updated_at__gt=state.last_changed_at) | Q(updated_at=state.last_changed_at, id__gt=state.last_id)
+        )
+    return pending
+
+
+def push_invoices(batch_size=BATCH_SIZE, central=CENTRAL):
+    """
+    Sends new invoices and those whose totals changed since the last push,
+    oldest change first. Returns the number of invoices sent.
+    """
+    state = _state('invoices')
+    sent = 0
+    while True:
+        rows = list(
+            _pending_invoices(state).values('id', 'sync_id', 'customer_id', 'updated_at', *INVOICE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            break
+        with transaction.atomic(using=central):
+            _lock_store(central)
+            customers = _central_customers({row['customer_id'] for row in rows}, central)
+            Invoice.objects.using(central).bulk_create(
+                [
+                    Invoice(
+                        sync_id=row['sync_id'],
+                        customer_id=customers[row['customer_id']],
+                        **{field: row[field] for field in INVOICE_FIELDS},
+                    )
+                    for row in rows
+                ],
+                update_conflicts=True,
+                unique_fields=['sync_id'],
+                update_fields=['customer', 'updated_at'] + INVOICE_FIELDS,
+            )
+        _advance(state, rows[-1]['id'], rows[-1]['updated_at'])
+        sent += len(rows)
+        if len(rows) < batch_size:
+            break
+    return sent
+
+
+def _apply_stock(deltas, central):
+    """
+    Adds {medicine_id: signed quantity} to the central stock. The store may
+    have sold units that were also sold centrally while it was offline, and
+    stock cannot go below zero: the units it would have gone below by are
+    recorded as an Adjustment movement, so the stock still equals the sum
+    of its ledger. Returns {medicine_id: units oversold}.
+    """
+    # Locked, in id order like a sale, until the batch commits
+    stock = dict(
+        Medicine.objects.using(central).select_for_update().filter(pk__in=deltas).order_by('pk')
+        .values_list('id', 'in_stock_total')
+    )
+    oversold = {
+        medicine_id: -(stock[medicine_id] + delta)
+        for medicine_id, delta in deltas.items()
+        if medicine_id in stock and stock[medicine_id] + delta < 0
+    }
+    change = Case(
+        *[When(pk=medicine_id, then=Value(delta)) for medicine_id, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    Medicine.objects.using(central).filter(pk__in=deltas).update(
+        in_stock_total=Greatest(F('in_stock_total') + change, Value(0))
+    )
+    StockMovement.objects.using(central).bulk_create([
+        StockMovement(
+            medicine_id=medicine_id, quantity=units, reason='Adjustment',
+            note=f'Oversold while offline at {settings.OFFLINE_STORE_NAME}',
+        )
+        for medicine_id, units in oversold.items()
+    ])
+    return oversold
+
+
+def push_table(name, model, fields, parents, limit, batch_size=BATCH_SIZE, central=CENTRAL):
+    """
+    Sends the rows of an insert-only table added since the last push, up to
+    id `limit`. Returns (rows sent, rows the central database did not have,
+    {medicine_id: units oversold}).
+    """
+    state = _state(name)
+    sent = added = 0
+    oversold = {}
+    references = [f'{field}__sync_id' for field in parents]
+    while True:
+        rows = list(
+            model.objects.filter(id__gt=state.last_id, id__lte=limit)
+            .order_by('id')
+            .values('id', 'sync_id', *fields, *references)[:batch_size]
+        )
+        if not rows:
+            break
+        with transaction.atomic(using=central):
+            _lock_store(central)
+            known = set(
+                model.objects.using(central).filter(sync_id__in=[row['sync_id'] for row in rows])
+                .values_list('sync_id', flat=True)
+            )
+            new = [row for row in rows if row['sync_id'] not in known]
+            ids = {
+                field: _central_ids(
+                    parent, {row[f'{field}__sync_id'] for row in new} - {None}, central
+                )
+                for field, parent in parents.items()
+            }
+            objects = []
+            for row in new:
+                values = {column: row[column] for column in fields}
+                for field, parent in parents.items():
+                    parent_sync_id = row[f'{field}__sync_id']
+                    if parent_sync_id is not None and parent_sync_id not in ids[field]:
+                        raise SyncError(
+                            f'{model.__name__} {row["sync_id"]} refers to {parent.__name__} {parent_sync_id}, '
+                            f'which the central database does not have'
+                        )
+                    values[f'{field}_id'] = ids[field].get(parent_sync_id)
+                objects.append(model(sync_id=row['sync_id'], **values))
+            model.objects.using(central).bulk_create(objects)
+
+            if model is StockMovement and new:
+                deltas = {}
+                for row in new:
+                    deltas[row['medicine_id']] = deltas.get(row['medicine_id'], 0) + row['quantity']
+                for medicine_id, units in _apply_stock(deltas, central).items():
+                    oversold[medicine_id] = oversold.get(medicine_id, 0) + units
+        _advance(state, rows[-1]['id'])
+        sent += len(rows)
+        added += len(new)
+        if len(rows) < batch_size:
+            break
+    return sent, added, oversold
+
+
+def push(batch_size=BATCH_SIZE, central=CENTRAL):
+    """
+    Sends everything recorded since the last push. Returns
+    {table: rows sent}, plus 'oversold': {medicine_id: units} for the
+    medicines this store sold more of than the central database had.
+
+    The limits of the insert-only tables are read children first, before
+    anything is sent: every row below them was committed before its parent
+    was read, so by the time a table is sent its parents are already on the
+    central database. Rows added while the push runs wait for the next one.
+    """
+    limits = {
+        name: model.objects.aggregate(last=Max('id'))['last'] or 0
+        for name, model, _, _ in reversed(TABLES)
+    }
+    # Bills added while the push runs are today's
+    days = {timezone.localdate()} | {
+        timezone.localdate(day) for day in _pending_invoices(_state('invoices')).datetimes('invoice_date', 'day')
+    }
+    sent = {'invoices': push_invoices(batch_size, central)}
+    oversold = {}
+    for name, model, fields, parents in TABLES:
+        sent[name], _, table_oversold = push_table(name, model, fields, parents, limits[name], batch_size, central)
+        oversold.update(table_oversold)
+    if any(sent.values()):
+        refresh_central_caches(days)
+    return {**sent, 'oversold': oversold}
+
+
+def refresh_central_caches(days):
+    """
+    Drops the central site's dashboard counters that pushed bills and stock
+    change (customers, low stock, and sales and bills of `days`) and bumps its
+    autocomplete and customer fragment versions. Only the caches in settings.CACHES
+    can be reached. Everything is already on the central database, so a
+    cache that is down is only logged.
+    """
+    try:
+        if CENTRAL_CACHE in settings.CACHES:
+            keys = [kpis.CUSTOMERS, kpis.LOW_STOCK]
+            for day in days:
+                keys += [kpis.sales_key(day), kpis.invoices_key(day)]
+            kpis.invalidate(*keys, using=CENTRAL_CACHE)
+            bump_version(using=CENTRAL_CACHE)
+        if CENTRAL_FRAGMENT_CACHE in settings.CACHES:
+            fragments.bump('customer', using=CENTRAL_FRAGMENT_CACHE)
+    except Exception:
+        logger.warning('Could not refresh the central caches after a push', exc_info=True)
+
+
+def pending():
+    """
+    Rows recorded on this store that are not on the central database yet.
+    """
+    counts = {'invoices': _pending_invoices(_state('invoices')).count()}
+    for name, model, _, _ in TABLES:
+        counts[name] = model.objects.filter(id__gt=_state(name).last_id).count()
+    return counts
+
+
+def _central_rows(model, fields, batch_size, central):
+    last_id = 0
+    while True:
+        rows = list(
+            model.objects.using(central).filter(id__gt=last_id).order_by('id').values('id', *fields)[:batch_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+
+def pull(batch_size=BATCH_SIZE, central=CENTRAL):
+    """
+    Copies suppliers, medicines, barcodes and customers from the central
+    database, which wins where both have changed. Suppliers and medicines
+    keep their central ids, so a sale recorded here points at the same
+    medicine there; that is why an offline store cannot add medicines or
+    suppliers of its own (add them centrally). Customers are matched by phone
+    number. Stock is only copied when this store has no stock movements
+    left to push, since central stock already includes the pushed ones.
+    Returns {table: rows copied}.
+    """
+    copied = {}
+    with transaction.atomic():
+        take_stock = not StockMovement.objects.filter(id__gt=_state('stock_movements').last_id).exists()
+
+        supplier_fields = ['name', 'contact_person', 'phone_number', 'address']
+        copied['suppliers'] = 0
+        for rows in _central_rows(Supplier, supplier_fields, batch_size, central):
+            Supplier.objects.bulk_create(
+                [Supplier(**row) for row in rows], update_conflicts=True, unique_fields=['id'],
+                update_fields=supplier_fields,
+            )
+            copied['suppliers'] += len(rows)
+
+        medicine_fields = ['name', 'name_normalized', 'description', 'supplier_id', 'mrp', 'in_stock_total']
+        update_fields = ['name', 'name_normalized', 'description', 'supplier', 'mrp']
+        if take_stock:
+            update_fields.append('in_stock_total')
+        copied['medicines'] = 0
+        for rows in _central_rows(Medicine, medicine_fields, batch_size, central):
+            Medicine.objects.bulk_create(
+                [Medicine(**row) for row in rows], update_conflicts=True, unique_fields=['id'],
+                update_fields=update_fields,
+            )
+            copied['medicines'] += len(rows)
+
+        copied['barcodes'] = 0
+        for rows in _central_rows(MedicineBarcode, ['medicine_id', 'code'], batch_size, central):
+            MedicineBarcode.objects.bulk_create(
+                [MedicineBarcode(medicine_id=row['medicine_id'], code=row['code']) for row in rows],
+                update_conflicts=True, unique_fields=['code'], update_fields=['medicine'],
+            )
+            copied['barcodes'] += len(rows)
+
+        copied['customers'] = 0
+        for rows in _central_rows(Customer, CUSTOMER_FIELDS, batch_size, central):
+            Customer.objects.bulk_create(
+                [Customer(**{field: row[field] for field in CUSTOMER_FIELDS}) for row in rows],
+                update_conflicts=True, unique_fields=['phone_number'],
+                update_fields=[field for field in CUSTOMER_FIELDS if field != 'phone_number'],
+            )
+            copied['customers'] += len(rows)
+
+        catalog_changed.send(sender=Medicine)
+        after_commit(lambda: fragments.bump('customer'))
+        after_commit(lambda: kpis.invalidate(kpis.CUSTOMERS))
+    copied['stock'] = take_stock
+    return copied
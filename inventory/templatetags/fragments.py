@@ -0,0 +1,71 @@
+# inventory/templatetags/fragments.py
+from django import template
+from django.middleware.csrf import get_token
+from django.utils.safestring import mark_safe
+
+from inventory.fragments import CSRF_PLACEHOLDER, fill_live_stock, get_or_render, live_stock_marker
+
+register = template.Library()
+
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, name, models, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.models = models
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        models = self.models.resolve(context).split(',')
+        vary_on = [value.resolve(context) for value in self.vary_on]
+
+        # Stock levels the body was rendered with, so a miss reads none again
+        levels = {}
+
+        def render_body():
+            with context.push(csrf_token=CSRF_PLACEHOLDER, live_stock_levels=levels):
+                return self.nodelist.render(context)
+
+        html = get_or_render(name, models, vary_on, render_body)
+        request = context.get('request')
+        if request is not None and CSRF_PLACEHOLDER in html:
+            html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+        return mark_safe(fill_live_stock(html, levels))
+
+
+@register.tag
+def versioned_cache(parser, token):
+    """
+    Caches the enclosed template until one of the listed models changes:
+
+        {% versioned_cache "medicine_table" "medicine,supplier" query cursor %}
+            ...
+        {% endversioned_cache %}
+
+    The first argument names the fragment, the second lists the models it
+    shows, and any further arguments are values the output varies on.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and a list of models.")
+    nodelist = parser.parse(('endversioned_cache',))
+    parser.delete_first_token()
+    name, models, *vary_on = (parser.compile_filter(bit) for bit in bits[1:])
+    return VersionedCacheNode(nodelist, name, models, vary_on)
+
+
+@register.simple_tag(takes_context=True)
+def live_stock(context, medicine, part='badge'):
+    """
+    Shows a medicine's stock inside {% versioned_cache %} without caching it:
+
+        {% live_stock medicine %}          the In Stock / Out of Stock badge
+        {% live_stock medicine "count" %}  the number alone
+    """
+    if part not in ('badge', 'count'):
+        raise template.TemplateSyntaxError(f"'live_stock' shows a \"badge\" or a \"count\", not {part!r}.")
+    levels = context.get('live_stock_levels')
+    if levels is not None:
+        levels[medicine.pk] = medicine.in_stock_total
+    return mark_safe(live_stock_marker(medicine.pk, part))
@@ -0,0 +1,139 @@
+# inventory/totals.py
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import Invoice
+from .signals import invoice_totals_changed
+
+# Every money column derived from the invoice's line items
+TOTAL_FIELDS = ['sub_total', 'discount_amount', 'taxable_total', 'cgst_amount', 'sgst_amount', 'grand_total']
+
+CENT = Decimal('0.01')
+
+
+def compute_totals(sub_total, discount_percentage, cgst_percentage, sgst_percentage):
+    """
+    Returns the invoice money fields for a given pre-discount, pre-tax total.
+    """
+    discount_amount = (sub_total * discount_percentage) / 100
+    taxable_total = sub_total - discount_amount
+    cgst_amount = (taxable_total * cgst_percentage) / 100
+    sgst_amount = (taxable_total * sgst_percentage) / 100
+    return {
+        'sub_total': sub_total,
+        'discount_amount': discount_amount,
+        'taxable_total': taxable_total,
+        'cgst_amount': cgst_amount,
+        'sgst_amount': sgst_amount,
+        'grand_total': taxable_total + cgst_amount + sgst_amount,
+    }
+
+
+def apply_sub_total(invoice, sub_total):
+    """
+    Sets sub_total and every derived field on `invoice` without saving it.
+    """
+    totals = compute_totals(
+        Decimal(sub_total),
+        Decimal(invoice.discount_percentage),
+        Decimal(invoice.cgst_percentage),
+        Decimal(invoice.sgst_percentage),
+    )
+    for field, value in totals.items():
+        # Round the way the DecimalField columns do, so memory matches the row
+        setattr(invoice, field, value.quantize(CENT))
+
+
+def lock_invoice(invoice_id):
+    """
+    Re-reads an invoice with a row lock so concurrent counters updating the
+    same bill are serialized. Must be called inside a transaction.
+    """
+    return Invoice.objects.select_for_update().get(pk=invoice_id)
+
+
+def add_to_invoice(invoice_id, amount):
+    """
+    Adds `amount` (quantity x rate of a new line) to the stored totals.
+
+    The derived fields depend only on sub_total and the percentages, so the
+    result is identical to a full recalculation without reading the items.
+    """
+    with transaction.atomic():
+        invoice = lock_invoice(invoice_id)
+        previous_total = invoice.grand_total
+        apply_sub_total(invoice, invoice.sub_total + amount)
+        invoice.save(update_fields=TOTAL_FIELDS)
+        _send_totals_changed(invoice, previous_total)
+    return invoice
+
+
+def save_new_invoice(invoice, sub_total):
+    """
+    Saves a new invoice whose lines are written in the same transaction,
+    with its totals computed once from their sum.
+    """
+    apply_sub_total(invoice, sub_total)
+    invoice.save()
+    _send_totals_changed(invoice, Decimal('0.00'))
+    return invoice
+
+
+def set_discount(invoice_id, discount_percentage):
+    """
+    Changes the discount percentage and the totals that depend on it.
+    """
+    with transaction.atomic():
+        invoice = lock_invoice(invoice_id)
+        previous_total = invoice.grand_total
+        invoice.discount_percentage = discount_percentage
+        apply_sub_total(invoice, invoice.sub_total)
+        invoice.save(update_fields=['discount_percentage'] + TOTAL_FIELDS)
+        _send_totals_changed(invoice, previous_total)
+    return invoice
+
+
+def _send_totals_changed(invoice, previous_total):
+    invoice_totals_changed.send(
+        sender=Invoice,
+        invoice=invoice,
+        grand_total_delta=invoice.grand_total - previous_total,
+    )
+
+
+def items_sub_total(invoice):
+    return invoice.items.aggregate(
+        total=Sum(F('quantity') * F('rate'))
+    )['total'] or Decimal('0.00')
+
+
+def save_repaired_totals(invoice, sub_total):
+    """
+    Rewrites the totals of an invoice whose stored ones are wrong. Saved
+    like any other change (with updated_at, so an offline store pushes it
+    again) and announced, so counters and cached documents follow.
+    """
+    previous_total = invoice.grand_total
+    apply_sub_total(invoice, sub_total)
+    invoice.save(update_fields=TOTAL_FIELDS)
+    _send_totals_changed(invoice, previous_total)
+
+
+def recalculate_invoice(invoice):
+    """
+    Recalculates all financial fields for a given invoice from its items.
+    Only needed to repair totals; normal writes keep them up to date.
+    """
+    save_repaired_totals(invoice, items_sub_total(invoice))
+
+
+def totals_match(invoice, expected):
+    """
+    Compares stored totals with `expected` at the precision the columns keep.
+    """
+    return all(
+        Decimal(getattr(invoice, field)).quantize(CENT) == Decimal(value).quantize(CENT)
+        for field, value in expected.items()
+    )
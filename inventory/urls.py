@@ -19,19 +19,33 @@ urlpatterns = [
     
     path('customers/inactive/', views.inactive_customer_list, name='inactive_customer_list'),
     path('customers/<int:pk>/reactivate/', views.reactivate_customer, name='reactivate_customer'),
+    path('customers/<int:pk>/history/', views.customer_history, name='customer_history'),
     
     path('invoices/', views.invoice_list, name='invoice_list'),
     path('invoices/create/', views.create_invoice, name='create_invoice'),
+    path('invoices/export/', views.export_invoices, name='export_invoices'),
     path('invoices/<int:invoice_id>/', views.invoice_detail, name='invoice_detail'),
+    path('invoices/<int:invoice_id>/pdf/', views.invoice_pdf, name='invoice_pdf'),
     path('invoices/<int:invoice_id>/add_item/', views.add_invoice_item, name='add_invoice_item'),
     path('invoices/<int:invoice_id>/apply_discount/', views.apply_discount, name='apply_discount'),
+    path('invoices/<int:invoice_id>/scan/', views.scan_barcode, name='scan_barcode'),
     path('medicines/<int:pk>/add_stock/', views.add_stock, name='add_stock'),
+    path('api/medicines/autocomplete/', views.medicine_autocomplete, name='medicine_autocomplete'),
+    path('api/customers/autocomplete/', views.customer_autocomplete, name='customer_autocomplete'),
+    path('api/customers/', views.api_find_or_create_customer, name='api_find_or_create_customer'),
+    path('api/invoices/', views.api_create_invoice, name='api_create_invoice'),
     path('invoices/<int:invoice_id>/process_return/', views.process_return, name='process_return'),
     path('returns/<int:return_id>/', views.return_receipt_detail, name='return_receipt_detail'),
+    path('returns/<int:return_id>/pdf/', views.return_pdf, name='return_pdf'),
     
     path('invoices/<int:invoice_id>/send/', views.send_invoice_email, name='send_invoice_email'),
     path('custom-orders/', views.custom_order_list, name='custom_order_list'),
     path('custom-orders/add/', views.add_custom_order, name='add_custom_order'),
     path('custom-orders/<int:pk>/update/', views.update_custom_order_status, name='update_custom_order_status'),
 
+    path('reports/sales/', views.sales_report, name='sales_report'),
+
+    path('cron/send-outbox/', views.cron_send_outbox, name='cron_send_outbox'),
+    path('metrics', views.metrics, name='metrics'),
+
 ]
\ No newline at end of file
@@ -1,32 +1,49 @@
 # inventory/views.py
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Medicine, Supplier, Customer, Invoice, InvoiceItem , ReturnInvoice, ReturnItem , CustomOrder
-from django.db.models import F, Sum
-from .forms import CustomerForm
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from .models import Medicine, Supplier, Customer, Invoice, InvoiceItem , ReturnInvoice, ReturnItem , CustomOrder, normalize_name, prefix_filter
+from .autocomplete import CUSTOMER_FIELDS, medicine_index, search_customers
+from .history import MONEY, customer_summary
+from .barcodes import barcode_cache
+from .documents import invoice_pdf as render_invoice_pdf, return_pdf as render_return_pdf
+from .kpis import dashboard_kpis
+from .metrics import registry as metrics_registry, render as render_metrics
+from .pagination import keyset_paginate
+from .stock import (
+    InsufficientStock, ReturnExceedsSale, create_sale, receive_stock, record_opening_balance, return_invoice_items,
+    sell_medicine,
+)
+from .totals import set_discount
+from django.db import IntegrityError, transaction
+from django.db.models import ExpressionWrapper, F, Prefetch
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from .forms import CustomerForm, InvoiceFilterForm, SaleForm
+from datetime import datetime, time, timedelta
 from decimal import Decimal
-from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
+import json
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.contrib import messages
-import os
+from django.conf import settings
 
 # --- Dashboard ---
 def dashboard(request):
-    total_medicines = Medicine.objects.count()
-    total_customers = Customer.objects.filter(is_active=True).count()
-    total_suppliers = Supplier.objects.count()
-    context = {
-        'total_medicines': total_medicines,
-        'total_customers': total_customers,
-        'total_suppliers': total_suppliers,
-    }
+    # Counters are kept in the cache by signals; see inventory/kpis.py
+    context = dashboard_kpis()
     return render(request, 'inventory/dashboard.html', context)
 
 # --- Medicine Management ---
-def medicine_list(request):
-    medicines = Medicine.objects.all()
-    return render(request, 'inventory/medicine_list.html', {'medicines': medicines})
+# An offline store keeps the central ids of the medicines and suppliers it
+# pulls (see inventory/sync.py), so it cannot add its own
+OFFLINE_CATALOG_MESSAGE = (
+    'This is an offline store: add medicines and suppliers on the central site, then run '
+    '`manage.py sync_central --pull`.'
+)
 
 def add_medicine(request):
+    if settings.OFFLINE_STORE:
+        return HttpResponseForbidden(OFFLINE_CATALOG_MESSAGE)
     if request.method == 'POST':
         name = request.POST['name']
         description = request.POST['description']
@@ -36,13 +53,15 @@ def add_medicine(request):
         
         supplier = get_object_or_404(Supplier, id=supplier_id)
         
-        Medicine.objects.create(
-            name=name,
-            description=description,
-            supplier=supplier,
-            in_stock_total=in_stock_total,
-            mrp=mrp
-        )
+        with transaction.atomic():
+            medicine = Medicine.objects.create(
+                name=name,
+                description=description,
+                supplier=supplier,
+                in_stock_total=int(in_stock_total),
+                mrp=mrp
+            )
+            record_opening_balance(medicine)
         return redirect('medicine_list')
     
     suppliers = Supplier.objects.all()
@@ -50,7 +69,7 @@ def add_medicine(request):
 
 # --- Customer Management ---
 def customer_list(request):
-    customers = Customer.objects.filter(is_active=True)
+    customers = Customer.objects.filter(is_active=True).order_by('name_normalized')
     return render(request, 'inventory/customer_list.html', {'customers': customers})
 
 def add_customer(request):
@@ -72,6 +91,8 @@ def supplier_list(request):
     return render(request, 'inventory/supplier_list.html', {'suppliers': suppliers})
 
 def add_supplier(request):
+    if settings.OFFLINE_STORE:
+        return HttpResponseForbidden(OFFLINE_CATALOG_MESSAGE)
     if request.method == 'POST':
         name = request.POST['name']
         contact_person = request.POST['contact_person']
@@ -83,13 +104,84 @@ def add_supplier(request):
 
 # --- Invoice Management ---
 def invoice_list(request):
-    query = request.GET.get('q')
-    if query:
+    form = InvoiceFilterForm(request.GET)
+    invoices = filter_invoices(form)
+
+    # Cursor pagination newest-first over (invoice_date, id)
+    page = keyset_paginate(invoices, ['invoice_date', 'id'], cursor=request.GET.get('after'), descending=True)
+
+    # Keep the active filters on the "Next" link
+    params = request.GET.copy()
+    params.pop('after', None)
+    context = {
+        'invoices': page,
+        'page': page,
+        'form': form,
+        'query': request.GET.get('q'),
+        'filter_params': params.urlencode(),
+    }
+    return render(request, 'inventory/invoice_list.html', context)
+
+def filter_invoices(form):
+    """
+    Applies the invoice_list filters. Every condition is backed by an index on
+    Invoice or Customer; invalid input is simply left out of the query.
+    """
+    invoices = Invoice.objects.select_related('customer')
+    form.is_valid()  # fields that fail validation are left out of cleaned_data
+    data = form.cleaned_data
+
+    query = data.get('q', '').strip().lstrip('#')
+    if query.isdigit():
         # Search by invoice ID
-        invoices = Invoice.objects.filter(id=query)
-    else:
-        invoices = Invoice.objects.all().order_by('-invoice_date')
-    return render(request, 'inventory/invoice_list.html', {'invoices': invoices, 'query': query})
+        invoices = invoices.filter(id=int(query))
+    elif query:
+        invoices = invoices.filter(customer_filter(query))
+
+    if data.get('customer'):
+        invoices = invoices.filter(customer_filter(data['customer'].strip()))
+    if data.get('date_from'):
+        invoices = invoices.filter(invoice_date__gte=start_of_day(data['date_from']))
+    if data.get('date_to'):
+        invoices = invoices.filter(invoice_date__lt=start_of_day(data['date_to'] + timedelta(days=1)))
+    if data.get('min_total') is not None:
+        invoices = invoices.filter(grand_total__gte=data['min_total'])
+    if data.get('max_total') is not None:
+        invoices = invoices.filter(grand_total__lte=data['max_total'])
+    return invoices
+
+def export_invoices(request):
+    """
+    Streams every invoice matching the invoice_list filters with its items,
+    as CSV (default) or JSON Lines, optionally gzipped.
+    """
+    # Only this view uses it, so it stays out of a serverless cold start.
+    # Most modules imported at the top are loaded at startup by the signals
+    # anyway.
+    from .exports import export_stream
+
+    export_format = 'jsonl' if request.GET.get('format') == 'jsonl' else 'csv'
+    compress = request.GET.get('gzip') == '1'
+    invoices = filter_invoices(InvoiceFilterForm(request.GET))
+
+    filename = f'invoices.{export_format}' + ('.gz' if compress else '')
+    content_type = 'application/gzip' if compress else (
+        'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    )
+    response = StreamingHttpResponse(export_stream(invoices, export_format, compress), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def customer_filter(value):
+    """
+    Matches a customer by phone number prefix (digits) or by name prefix.
+    """
+    if value.isdigit():
+        return prefix_filter('customer__phone_number', value)
+    return prefix_filter('customer__name_normalized', normalize_name(value))
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
 
 def create_invoice(request):
     if request.method == 'POST':
@@ -98,94 +190,159 @@ def create_invoice(request):
         invoice = Invoice.objects.create(customer=customer)
         return redirect('invoice_detail', invoice_id=invoice.id)
     
-    customers = Customer.objects.filter(is_active=True)
-    return render(request, 'inventory/create_invoice.html', {'customers': customers})
-
-def recalculate_invoice(invoice):
-    """
-    Recalculates all financial fields for a given invoice.
-    """
-    # Calculate Sub Total
-    sub_total = invoice.items.aggregate(
-        total=Sum(F('quantity') * F('rate'))
-    )['total'] or Decimal('0.00')
-    invoice.sub_total = sub_total
-
-    # Calculate Discount
-    discount_percent = invoice.discount_percentage
-    discount_amount = (sub_total * discount_percent) / 100
-    invoice.discount_amount = discount_amount
-
-    # Calculate Taxable Total
-    taxable_total = sub_total - discount_amount
-    invoice.taxable_total = taxable_total
-
-    # Calculate CGST and SGST (assuming fixed rates from model)
-    cgst_percent = invoice.cgst_percentage
-    sgst_percent = invoice.sgst_percentage
-    
-    cgst_amount = (taxable_total * cgst_percent) / 100
-    sgst_amount = (taxable_total * sgst_percent) / 100
-    invoice.cgst_amount = cgst_amount
-    invoice.sgst_amount = sgst_amount
-
-    # Calculate Grand Total
-    grand_total = taxable_total + cgst_amount + sgst_amount
-    invoice.grand_total = grand_total
-    
-    invoice.save()
+    # Customers are picked through customer_autocomplete, not a full <select>
+    return render(request, 'inventory/create_invoice.html')
 
 def invoice_detail(request, invoice_id):
-    invoice = get_object_or_404(Invoice, id=invoice_id)
-    medicines = Medicine.objects.filter(in_stock_total__gt=0)
-    
-    # Always recalculate on page load to ensure data is fresh
-    recalculate_invoice(invoice)
-    
+    # Totals are maintained on every write, so viewing an invoice is read-only
+    invoice = get_object_or_404(
+        Invoice.objects.select_related('customer').prefetch_related(
+            Prefetch('items', queryset=InvoiceItem.objects.select_related('medicine').order_by('id'))
+        ),
+        id=invoice_id,
+    )
+    # Medicines are picked through medicine_autocomplete, not a full <select>
     context = {
         'invoice': invoice,
-        'medicines': medicines,
     }
     return render(request, 'inventory/invoice_detail.html', context)
 
 def add_invoice_item(request, invoice_id):
     invoice = get_object_or_404(Invoice, id=invoice_id)
     if request.method == 'POST':
-        medicine_id = request.POST['medicine']
+        medicine = get_object_or_404(Medicine, id=request.POST['medicine'])
         quantity = int(request.POST['quantity'])
-        medicine = get_object_or_404(Medicine, id=medicine_id)
         
-        if medicine.in_stock_total >= quantity:
-            InvoiceItem.objects.create(
-                invoice=invoice,
-                medicine=medicine,
-                quantity=quantity,
-                rate=medicine.mrp
-            )
-            medicine.in_stock_total -= quantity
-            medicine.save()
-            # Recalculate everything after adding a new item
-            recalculate_invoice(invoice)
+        if quantity <= 0:
+            messages.error(request, 'Quantity must be at least 1.')
+        else:
+            try:
+                # Checks stock, decrements it and updates the totals atomically
+                sell_medicine(invoice.id, medicine.id, quantity)
+            except InsufficientStock:
+                messages.error(request, f'Not enough stock of {medicine.name} for {quantity} units.')
     return redirect('invoice_detail', invoice_id=invoice.id)
 
+@require_POST
+def scan_barcode(request, invoice_id):
+    """
+    Adds the medicine with the scanned barcode or SKU to the invoice. A
+    scanner typing into the billing page gets a redirect back to it; a
+    client sending Accept: application/json gets the new line as JSON.
+    """
+    invoice = get_object_or_404(Invoice.objects.only('id'), id=invoice_id)
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+    code = request.POST.get('code', '')
+    try:
+        quantity = int(request.POST.get('quantity') or 1)
+    except ValueError:
+        quantity = 0
+
+    def fail(message, status):
+        if wants_json:
+            return JsonResponse({'error': message, 'code': code}, status=status)
+        messages.error(request, message)
+        return redirect('invoice_detail', invoice_id=invoice.id)
+
+    if quantity <= 0:
+        return fail('Quantity must be at least 1.', 400)
+    found = barcode_cache.lookup(code)
+    if found is None:
+        return fail(f'No medicine has the code "{code.strip()}".', 404)
+    medicine_id, name = found
+    try:
+        item = sell_medicine(invoice.id, medicine_id, quantity)
+    except InsufficientStock:
+        return fail(f'Not enough stock of {name} for {quantity} units.', 409)
+
+    if not wants_json:
+        return redirect('invoice_detail', invoice_id=invoice.id)
+    return JsonResponse({
+        'item': item.id,
+        'medicine': medicine_id,
+        'name': name,
+        'quantity': item.quantity,
+        'rate': f'{item.rate:.2f}',
+        'grand_total': f"{Invoice.objects.values_list('grand_total', flat=True).get(id=invoice.id):.2f}",
+    }, status=201)
+
 def apply_discount(request, invoice_id):
     invoice = get_object_or_404(Invoice, id=invoice_id)
     if request.method == 'POST':
         discount = Decimal(request.POST.get('discount', '0'))
-        invoice.discount_percentage = discount
-        recalculate_invoice(invoice)
+        set_discount(invoice.id, discount)
     return redirect('invoice_detail', invoice_id=invoice.id)
 
 def medicine_list(request):
     query = request.GET.get('q') # Get the search query from the URL
+    medicines = Medicine.objects.select_related('supplier')
     if query:
-        # Filter medicines where the name contains the search query (case-insensitive)
-        medicines = Medicine.objects.filter(name__icontains=query)
-    else:
-        # If no query, get all medicines
-        medicines = Medicine.objects.all()
-        
-    return render(request, 'inventory/medicine_list.html', {'medicines': medicines, 'query': query})
+        # Prefix match on the normalized name so the search can use an index
+        medicines = medicines.filter(prefix_filter('name_normalized', normalize_name(query)))
+
+    # Keyset pagination over (name_normalized, id): one bounded index scan per page.
+    # Lazy, so a page served from the fragment cache runs no query at all
+    cursor = request.GET.get('after')
+    page = SimpleLazyObject(lambda: keyset_paginate(medicines, ['name_normalized', 'id'], cursor=cursor))
+    context = {
+        'medicines': page,
+        'page': page,
+        'query': query,
+        'cursor': cursor,
+    }
+    return render(request, 'inventory/medicine_list.html', context)
+
+def medicine_autocomplete(request):
+    """
+    JSON lookup for the billing screen, served from the in-memory prefix index.
+    """
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        limit = 10
+    results = medicine_index.search(request.GET.get('q', ''), limit=limit)
+    return JsonResponse({'results': results})
+
+def customer_autocomplete(request):
+    """
+    JSON lookup of active customers by phone number or name prefix.
+    """
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        limit = 10
+    return JsonResponse({'results': search_customers(request.GET.get('q', ''), limit=limit)})
+
+@require_POST
+def api_find_or_create_customer(request):
+    """
+    Finds the customer with a phone number, or creates one, in one request.
+    Takes JSON {"phone_number": "...", "name": "...", "email": "...", "address": "..."};
+    the other fields are only used when creating. Returns the customer with
+    "created": false (200) or true (201), or the validation errors (400).
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'errors': {'__all__': ['The body must be JSON.']}}, status=400)
+    data = data if isinstance(data, dict) else {}
+    phone_number = str(data.get('phone_number') or '').strip()
+
+    customer = Customer.objects.filter(phone_number=phone_number).values(*CUSTOMER_FIELDS).first()
+    if customer is not None:
+        return JsonResponse({**customer, 'created': False})
+
+    form = CustomerForm({field: data.get(field) for field in CustomerForm.Meta.fields})
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        with transaction.atomic():
+            customer = form.save()
+    except IntegrityError:
+        # Created by a concurrent request since the lookup above
+        customer = Customer.objects.values(*CUSTOMER_FIELDS).get(phone_number=form.cleaned_data['phone_number'])
+        return JsonResponse({**customer, 'created': False})
+    return JsonResponse({**{field: getattr(customer, field) for field in CUSTOMER_FIELDS}, 'created': True}, status=201)
 
 def add_stock(request, pk):
     medicine = get_object_or_404(Medicine, pk=pk)
@@ -194,9 +351,8 @@ def add_stock(request, pk):
         additional_stock = int(request.POST.get('additional_stock', 0))
         
         if additional_stock > 0:
-            # Add to the existing stock and save
-            medicine.in_stock_total += additional_stock
-            medicine.save()
+            # Added in SQL and recorded in the stock ledger
+            receive_stock(medicine.id, additional_stock)
             
     return redirect('medicine_list')
 
@@ -224,7 +380,7 @@ def delete_customer(request, pk):
     return redirect('customer_list')
 
 def inactive_customer_list(request):
-    customers = Customer.objects.filter(is_active=False)
+    customers = Customer.objects.filter(is_active=False).order_by('name_normalized')
     return render(request, 'inventory/inactive_customer_list.html', {'customers': customers})
 
 # ADD THIS VIEW TO HANDLE THE REACTIVATION LOGIC
@@ -234,36 +390,47 @@ def reactivate_customer(request, pk):
     customer.save()
     return redirect('customer_list')
 
+def customer_history(request, pk):
+    """
+    A customer's lifetime figures, cached per customer, and every line they
+    bought, newest invoice first, one keyset page at a time.
+    """
+    customer = get_object_or_404(Customer, pk=pk)
+    lines = (
+        InvoiceItem.objects.filter(invoice__customer=customer)
+        .select_related('invoice', 'medicine')
+        .annotate(amount=ExpressionWrapper(F('rate') * F('quantity'), output_field=MONEY))
+    )
+    page = keyset_paginate(lines, ['invoice_id', 'id'], cursor=request.GET.get('after'), descending=True)
+    context = {
+        'customer': customer,
+        'summary': customer_summary(customer.id),
+        'page': page,
+    }
+    return render(request, 'inventory/customer_history.html', context)
+
 def process_return(request, invoice_id):
     original_invoice = get_object_or_404(Invoice, id=invoice_id)
     
     if request.method == 'POST':
-        # Create a new ReturnInvoice
-        return_invoice = ReturnInvoice.objects.create(original_invoice=original_invoice)
-        total_refund = Decimal('0.00')
-
-        # Loop through all items in the original invoice
-        for item in original_invoice.items.all():
-            return_qty_str = request.POST.get(f'return_qty_{item.id}', '0')
-            return_qty = int(return_qty_str)
-
-            if return_qty > 0:
-                # Add item back to stock
-                medicine = item.medicine
-                medicine.in_stock_total += return_qty
-                medicine.save()
-
-                # Create a ReturnItem record
-                ReturnItem.objects.create(
-                    return_invoice=return_invoice,
-                    medicine=medicine,
-                    quantity=return_qty,
-                    rate=item.rate # Use the original sale price for the refund
-                )
-                total_refund += (item.rate * return_qty)
-        
-        return_invoice.total_refund_amount = total_refund
-        return_invoice.save()
+        # Collect the return quantity posted for each line of the invoice
+        quantities = {}
+        for key, value in request.POST.items():
+            if key.startswith('return_qty_'):
+                try:
+                    quantities[int(key[len('return_qty_'):])] = int(value or 0)
+                except ValueError:
+                    continue
+
+        # One transaction: ReturnItems are bulk-inserted and stock restored in one UPDATE
+        try:
+            return_invoice = return_invoice_items(original_invoice.id, quantities)
+        except ReturnExceedsSale:
+            messages.error(request, 'You cannot return more than was sold and not yet returned.')
+            return redirect('invoice_detail', invoice_id=original_invoice.id)
+        if return_invoice is None:
+            messages.warning(request, 'Enter a return quantity for at least one item.')
+            return redirect('invoice_detail', invoice_id=original_invoice.id)
 
         # Redirect to the new return receipt
         return redirect('return_receipt_detail', return_id=return_invoice.id)
@@ -274,17 +441,58 @@ def process_return(request, invoice_id):
 
 # ADD THIS NEW VIEW for showing the return receipt
 def return_receipt_detail(request, return_id):
-    return_invoice = get_object_or_404(ReturnInvoice, id=return_id)
+    return_invoice = get_object_or_404(
+        ReturnInvoice.objects.select_related('original_invoice__customer').prefetch_related(
+            Prefetch('items', queryset=ReturnItem.objects.select_related('medicine').order_by('id'))
+        ),
+        id=return_id,
+    )
     context = {
         'return_invoice': return_invoice
     }
     return render(request, 'inventory/return_receipt_detail.html', context)
 
+# --- PDF downloads ---
+
+def pdf_response(request, data, digest, filename):
+    etag = f'"{digest}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(data, content_type='application/pdf')
+        disposition = 'inline' if request.GET.get('inline') else 'attachment'
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def invoice_pdf(request, invoice_id):
+    invoice = get_object_or_404(Invoice.objects.select_related('customer'), id=invoice_id)
+    data, digest = render_invoice_pdf(invoice)
+    return pdf_response(request, data, digest, f'invoice-{invoice.id}.pdf')
+
+def return_pdf(request, return_id):
+    return_invoice = get_object_or_404(
+        ReturnInvoice.objects.select_related('original_invoice__customer'), id=return_id
+    )
+    data, digest = render_return_pdf(return_invoice)
+    return pdf_response(request, data, digest, f'credit-note-{return_invoice.id}.pdf')
+
 # --- Custom Order Management ---
 
 def custom_order_list(request):
-    orders = CustomOrder.objects.all().order_by('-order_date')
-    return render(request, 'inventory/custom_order_list.html', {'orders': orders})
+    orders = CustomOrder.objects.select_related('customer').order_by('-order_date')
+    status = request.GET.get('status')
+    if status in dict(CustomOrder.STATUS_CHOICES):
+        orders = orders.filter(status=status)
+    else:
+        status = None
+    context = {
+        'orders': orders,
+        'status': status,
+        'status_choices': CustomOrder.STATUS_CHOICES,
+    }
+    return render(request, 'inventory/custom_order_list.html', context)
 
 def add_custom_order(request):
     if request.method == 'POST':
@@ -306,10 +514,10 @@ def add_custom_order(request):
         )
         return redirect('custom_order_list')
     
-    customers = Customer.objects.filter(is_active=True)
-    suppliers = Supplier.objects.all() # Assuming suppliers can't be inactive
+    # Customers are picked through customer_autocomplete; a store deals with
+    # few enough suppliers to list them all
+    suppliers = Supplier.objects.only('id', 'name').order_by('name')
     context = {
-        'customers': customers,
         'suppliers': suppliers,
     }
     return render(request, 'inventory/add_custom_order.html', context)
@@ -324,29 +532,135 @@ def update_custom_order_status(request, pk):
     return redirect('custom_order_list')
 
 def send_invoice_email(request, invoice_id):
-    invoice = get_object_or_404(Invoice, id=invoice_id)
+    invoice = get_object_or_404(Invoice.objects.select_related('customer'), id=invoice_id)
 
     if invoice.customer.email:
-        subject = f"Your Invoice #{invoice.id} from Medical Store"
+        from .outbox import enqueue_invoice_email, send_now
+
+        # Delivered by `manage.py send_outbox` or the cron job, so a slow or
+        # unreachable SMTP server never holds up the counter
+        message = enqueue_invoice_email(invoice)
+        if not settings.EMAIL_SEND_IMMEDIATELY:
+            messages.success(request, 'Invoice queued for delivery to the customer.')
+        elif send_now(message):
+            # Opted in for development, where nothing delivers the outbox
+            messages.success(request, 'Invoice successfully sent to the customer.')
+        else:
+            messages.error(request, f'Failed to send email. Error: {message.last_error}')
+    else:
+        messages.warning(request, 'This customer does not have an email address.')
 
-        # Render the HTML template to a string
-        html_message = render_to_string('inventory/invoice_email.html', {'invoice': invoice})
+    return redirect('invoice_detail', invoice_id=invoice.id)
+
+# --- Reports ---
+
+def sales_report(request):
+    """
+    Monthly sales summary, read entirely from the rollup tables that
+    `manage.py update_sales_rollups` maintains.
+    """
+    from .rollups import last_updated as rollups_last_updated, month_report
+
+    today = timezone.localdate()
+    try:
+        first_day = datetime.strptime(request.GET.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        first_day = today.replace(day=1)
+    next_month = (first_day + timedelta(days=32)).replace(day=1)
+    last_day = next_month - timedelta(days=1)
+
+    context = month_report(first_day, last_day)
+    context.update({
+        'month': first_day,
+        'previous_month': (first_day - timedelta(days=1)).replace(day=1),
+        'next_month': next_month,
+        'last_updated': rollups_last_updated(),
+    })
+    return render(request, 'inventory/sales_report.html', context)
+
+# --- POS API ---
+
+def sale_json(invoice, items, names):
+    return {
+        'id': invoice.id,
+        'customer': invoice.customer_id,
+        'invoice_date': invoice.invoice_date.isoformat(),
+        'lines': [
+            {
+                'medicine': item.medicine_id,
+                'name': names[item.medicine_id],
+                'quantity': item.quantity,
+                'rate': f'{item.rate:.2f}',
+                'amount': f'{item.rate * item.quantity:.2f}',
+            }
+            for item in items
+        ],
+        **{field: f'{getattr(invoice, field):.2f}' for field in (
+            'discount_percentage', 'sub_total', 'discount_amount', 'taxable_total', 'cgst_amount', 'sgst_amount',
+            'grand_total',
+        )},
+        'url': reverse('invoice_detail', args=[invoice.id]),
+    }
 
-        # Create the email message
-        email = EmailMessage(
-            subject,
-            html_message,
-            os.environ.get('EMAIL_HOST_USER'),  # Your "from" email
-            [invoice.customer.email],          # The customer's "to" email
+
+@require_POST
+def api_create_invoice(request):
+    """
+    Bills a whole sale in one request. Takes JSON
+    {"customer": id, "discount": "5", "lines": [{"medicine": id, "quantity": n}, ...]}
+    and returns the finished invoice (201), the validation errors (400), or
+    the medicines without enough stock (409), in which case nothing is saved.
+    Send the CSRF token in the X-CSRFToken header.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'errors': {'__all__': ['The body must be JSON.']}}, status=400)
+    form = SaleForm(data if isinstance(data, dict) else {})
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    quantities = form.cleaned_data['lines']
+    try:
+        invoice, items = create_sale(
+            form.cleaned_data['customer'].id, quantities, form.cleaned_data['discount'] or Decimal('0.00'),
         )
-        email.content_subtype = "html"  # This is crucial for sending HTML emails
+    except Medicine.DoesNotExist as exc:
+        return JsonResponse({'errors': {'lines': [str(exc)]}}, status=400)
+    except InsufficientStock as exc:
+        short = Medicine.objects.filter(pk__in=exc.args).values('id', 'name', 'in_stock_total')
+        return JsonResponse({'insufficient_stock': [
+            {'medicine': row['id'], 'name': row['name'], 'requested': quantities[row['id']], 'available': row['in_stock_total']}
+            for row in short
+        ]}, status=409)
 
-        try:
-            email.send()
-            messages.success(request, 'Invoice successfully sent to the customer.')
-        except Exception as e:
-            messages.error(request, f'Failed to send email. Error: {e}')
-    else:
-        messages.warning(request, 'This customer does not have an email address.')
+    names = dict(Medicine.objects.filter(pk__in=quantities).values_list('id', 'name'))
+    return JsonResponse(sale_json(invoice, items, names), status=201)
+
+# --- Scheduled jobs ---
+
+def cron_send_outbox(request):
+    """
+    Delivers due emails; called by the Vercel cron job in vercel.json, which
+    sends `Authorization: Bearer $CRON_SECRET`.
+    """
+    secret = settings.CRON_SECRET
+    if not secret or request.headers.get('Authorization') != f'Bearer {secret}':
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    from .outbox import send_due
+
+    sent, failed = send_due()
+    return JsonResponse({'sent': sent, 'failed': failed})
+
+# --- Monitoring ---
 
-    return redirect('invoice_detail', invoice_id=invoice.id)
\ No newline at end of file
+def metrics(request):
+    """
+    Request metrics of every worker in the Prometheus text format.
+    """
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(
+        render_metrics(metrics_registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -1,13 +1,28 @@
 from pathlib import Path
 import os
 import dj_database_url
-from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Load environment variables from .env file for local development
-load_dotenv(os.path.join(BASE_DIR, '.env'))
+# Load environment variables from .env file for local development (there is
+# none when deployed, so dotenv is not even imported there)
+if os.path.exists(os.path.join(BASE_DIR, '.env')):
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(BASE_DIR, '.env'))
+
+# --- SERVERLESS MODE ---
+# On Vercel every cold start pays for loading the whole app, so serverless
+# mode leaves out what a short-lived function instance does not use: the
+# per-process request metrics and warming the autocomplete index at import
+# time (it is built on the first lookup instead). On by default on Vercel;
+# SERVERLESS=0 or 1 overrides. The admin is served everywhere; DJANGO_ADMIN=0
+# leaves it (and WhiteNoise, which only serves the admin's static files) out
+# of a deployment that does not need it, for a faster cold start.
+SERVERLESS = os.environ.get('SERVERLESS', '1' if os.environ.get('VERCEL') else '0') == '1'
+ADMIN_ENABLED = os.environ.get('DJANGO_ADMIN', '1') == '1'
+METRICS_ENABLED = not SERVERLESS
 
 # --- SECURITY SETTINGS ---
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
@@ -26,8 +41,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'inventory',
 ]
+if not ADMIN_ENABLED:
+    INSTALLED_APPS.remove('django.contrib.admin')
+if SERVERLESS:
+    INSTALLED_APPS.remove('whitenoise.runserver_nostatic')
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    'inventory.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -37,12 +58,17 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+if not METRICS_ENABLED:
+    MIDDLEWARE.remove('inventory.metrics.MetricsMiddleware')
+if not ADMIN_ENABLED:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
 
 ROOT_URLCONF = 'medical_store.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, with render time counted in the request metrics
+        'BACKEND': 'inventory.metrics.TimedDjangoTemplates' if METRICS_ENABLED else 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -59,12 +85,162 @@ TEMPLATES = [
 WSGI_APPLICATION = 'medical_store.wsgi.app'
 
 # --- DATABASE ---
+# DB_CONNECTION_MODE picks how connections are kept:
+#   persistent   the default everywhere. One connection per worker thread,
+#                reused for DB_CONN_MAX_AGE seconds (default 600) and checked
+#                before reuse, so a gunicorn worker or a warm serverless
+#                instance keeps its connection across requests, and the
+#                export's server-side cursors keep it constant-memory. The
+#                cost: every idle or frozen serverless instance holds one
+#                server connection until it is reused or discarded.
+#   per_request  a new connection for every request, closed when it ends, so
+#                an idle instance holds none; for serverless deployments
+#                with more instances than the server takes connections.
+#                Point DATABASE_URL at a pooler (PgBouncer, or the provider's
+#                pooled URL) so connecting stays cheap, and set DB_POOLER=1
+#                if it pools per transaction (see below).
+#   pool         a psycopg 3 connection pool in each process (PostgreSQL
+#                only, needs `pip install -r requirements-pool.txt`). It keeps
+#                DB_POOL_MIN_SIZE to DB_POOL_MAX_SIZE connections, waits up to
+#                DB_POOL_TIMEOUT seconds for a free one, closes connections
+#                idle for DB_POOL_MAX_IDLE or older than DB_POOL_MAX_LIFETIME
+#                seconds, and checks each one as it is handed out unless
+#                DB_POOL_CHECK=0.
+DB_CONNECTION_MODES = ('persistent', 'per_request', 'pool')
+DB_CONNECTION_MODE = os.environ.get('DB_CONNECTION_MODE', 'persistent')
+if DB_CONNECTION_MODE not in DB_CONNECTION_MODES:
+    raise ImproperlyConfigured(f'DB_CONNECTION_MODE must be one of {", ".join(DB_CONNECTION_MODES)}')
+
 DATABASES = {
     'default': dj_database_url.config(
         default=os.environ.get('POSTGRES_URL'),
-        conn_max_age=600
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', '600')) if DB_CONNECTION_MODE == 'persistent' else 0,
+        # A kept connection is checked before reuse since the worker (or
+        # function instance) may have been idle or frozen since
+        conn_health_checks=DB_CONNECTION_MODE == 'persistent',
     )
 }
+# Transaction-mode poolers hand each transaction to any server connection,
+# which breaks the server-side cursors that queryset.iterator() uses on
+# PostgreSQL (the invoice export, the reorder engine, sync). DB_POOLER=1
+# turns them off behind such a pooler; iterator() then reads each query's
+# whole result at once, so the export is no longer constant-memory.
+DB_POOLER = os.environ.get('DB_POOLER') == '1'
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = DB_POOLER
+if DB_CONNECTION_MODE == 'pool':
+    if DATABASES['default'].get('ENGINE') != 'django.db.backends.postgresql':
+        raise ImproperlyConfigured('DB_CONNECTION_MODE=pool needs a PostgreSQL database')
+    try:
+        from psycopg_pool import ConnectionPool
+    except ImportError:
+        raise ImproperlyConfigured('DB_CONNECTION_MODE=pool needs psycopg 3: pip install -r requirements-pool.txt')
+    pool = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '300')),
+        'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', '3600')),
+    }
+    if os.environ.get('DB_POOL_CHECK', '1') == '1':
+        pool['check'] = ConnectionPool.check_connection
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = pool
+
+# --- OFFLINE STORE ---
+# OFFLINE_STORE=1 runs a store on a local SQLite file, so billing carries on
+# when the internet is down. DATABASE_URL (or POSTGRES_URL) then names the
+# central database, reachable as the 'central' alias: `manage.py
+# sync_central --pull` copies the catalog and customers from it, and
+# `manage.py sync_central` pushes bills, returns and stock movements to it
+# whenever the connection is back. Run `manage.py migrate` on both databases.
+#
+# The file is tuned for many small write transactions: WAL lets the pages be
+# read while a sale is written, synchronous=NORMAL only syncs at checkpoints
+# (a power cut can lose the last transactions but never corrupts the file)
+# and reads go through a 256 MB memory map. Transactions take the write lock
+# when they begin, so two counters wait for each other (up to 20 s) instead
+# of failing halfway through a sale.
+OFFLINE_STORE = os.environ.get('OFFLINE_STORE') == '1'
+OFFLINE_DB_PATH = os.environ.get('OFFLINE_DB_PATH') or os.path.join(BASE_DIR, 'var', 'offline-store.sqlite3')
+# Names this store on the central database
+OFFLINE_STORE_NAME = os.environ.get('OFFLINE_STORE_NAME', 'store')
+if OFFLINE_STORE:
+    os.makedirs(os.path.dirname(OFFLINE_DB_PATH), exist_ok=True)
+    DATABASES['central'] = DATABASES['default']
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': OFFLINE_DB_PATH,
+        'OPTIONS': {
+            'init_command': (
+                'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA mmap_size=268435456; '
+                'PRAGMA temp_store=MEMORY; PRAGMA cache_size=-32000'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    }
+
+# --- CACHE ---
+# Dashboard counters and the autocomplete version key live here. Point
+# CACHE_BACKEND at a shared backend (e.g. the database or file cache) when
+# running several worker processes.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'medical-store'),
+    },
+    # Rendered list fragments (see inventory/fragments.py). Use the file or
+    # database cache to share them between workers, e.g.
+    # FRAGMENT_CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache and
+    # FRAGMENT_CACHE_LOCATION=fragment_cache (then run createcachetable).
+    'fragments': {
+        'BACKEND': os.environ.get('FRAGMENT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_LOCATION', 'medical-store-fragments'),
+        'TIMEOUT': int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60)),
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+
+# Dashboard counters are kept up to date in the cache of the worker that
+# changed them. The local memory cache is per process, so there they are
+# recounted every KPI_CACHE_TIMEOUT seconds (default 60) to pick up other
+# workers' changes; a shared backend keeps them until they are invalidated.
+KPI_CACHE_TIMEOUT = int(os.environ['KPI_CACHE_TIMEOUT']) if os.environ.get('KPI_CACHE_TIMEOUT') else (
+    60 if CACHES['default']['BACKEND'].endswith('LocMemCache') else None
+)
+
+# An offline store's push changes what the central site has cached: its
+# dashboard counters, autocomplete version and list fragments. When the
+# central site uses shared backends, name them here and each push refreshes
+# them, e.g. CENTRAL_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# with CENTRAL_CACHE_LOCATION=redis://... (and CENTRAL_FRAGMENT_CACHE_* for
+# its fragment cache). Otherwise the central counters catch up after its
+# KPI_CACHE_TIMEOUT.
+if OFFLINE_STORE:
+    for alias, prefix in (('central', 'CENTRAL_CACHE'), ('central_fragments', 'CENTRAL_FRAGMENT_CACHE')):
+        if os.environ.get(f'{prefix}_BACKEND'):
+            CACHES[alias] = {
+                'BACKEND': os.environ[f'{prefix}_BACKEND'],
+                'LOCATION': os.environ.get(f'{prefix}_LOCATION', ''),
+            }
+
+# Medicines at or below this many units count as low stock on the dashboard
+LOW_STOCK_THRESHOLD = int(os.environ.get('LOW_STOCK_THRESHOLD', '10'))
+
+# Rendered invoice and credit note PDFs are cached here. Only /tmp is
+# writable on Vercel, so the cache lives there when deployed.
+INVOICE_PDF_CACHE_DIR = os.environ.get('INVOICE_PDF_CACHE_DIR') or (
+    '/tmp/invoice-pdfs' if os.environ.get('VERCEL') else os.path.join(BASE_DIR, 'var', 'invoice-pdfs')
+)
+
+# --- METRICS ---
+# Each worker process writes its request metrics here and /metrics adds
+# them up, deleting those of processes that have exited. Set METRICS_TOKEN
+# to require `Authorization: Bearer <token>` on /metrics.
+METRICS_DIR = os.environ.get('METRICS_DIR') or (
+    '/tmp/metrics' if os.environ.get('VERCEL') else os.path.join(BASE_DIR, 'var', 'metrics')
+)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
 # --- PASSWORD VALIDATION ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -85,6 +261,16 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Invoice emails are queued in the outbox. `manage.py send_outbox` (from cron,
+# or with --loop as a worker) delivers them, or on Vercel the cron job in
+# vercel.json, which calls /cron/send-outbox/ every five minutes with
+# `Authorization: Bearer $CRON_SECRET` (set CRON_SECRET in the project; it
+# needs a plan that allows such a schedule). The view only queues them.
+# EMAIL_SEND_IMMEDIATELY=1 also sends each one while the cashier waits, for
+# development setups that run neither.
+CRON_SECRET = os.environ.get('CRON_SECRET')
+EMAIL_SEND_IMMEDIATELY = os.environ.get('EMAIL_SEND_IMMEDIATELY') == '1'
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
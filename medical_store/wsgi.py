@@ -7,9 +7,26 @@ For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
 # medical_store/wsgi.py
+import gc
 import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_store.settings')
 
-app = get_wsgi_application()
\ No newline at end of file
+# Loading the app creates tens of thousands of objects that live as long as
+# the process; collecting garbage while they are created only costs time.
+# Frozen afterwards, later collections skip them too.
+gc.disable()
+app = get_wsgi_application()
+gc.freeze()
+gc.enable()
+
+# Build the billing autocomplete index before the first request arrives. A
+# serverless cold start should not wait for it; there it is built on the
+# first lookup.
+from django.conf import settings  # noqa: E402
+
+if not settings.SERVERLESS:
+    from inventory.autocomplete import warm_medicine_index
+
+    warm_medicine_index()